@@ -34,8 +34,23 @@ def show_splash_screen():
 
 if __name__ == '__main__':
 
-    app = get_app()
-    splash = show_splash_screen()
+    import time
 
-    from gui_template.gui import GUI
-    GUI(app, splash)
+    # used to measure the time until the GUI can be used
+    start_time = time.perf_counter()
+
+    # --profile-startup and --headless, this does not import PyQt5
+    from gui_template.startup import PROFILER, span
+    PROFILER.configure()
+
+    with span('get_app'):
+        app = get_app()
+
+    with span('show_splash_screen'):
+        splash = show_splash_screen()
+
+    # the GUI modules are imported after the splash screen is shown
+    with span('import gui_template.gui'):
+        from gui_template.gui import GUI
+
+    GUI(app, splash, start_time=start_time)
@@ -0,0 +1,446 @@
+import re
+import hashlib
+
+from gui_template.sql import quote_identifier
+
+
+# indexes are only proposed for tables with at least this many rows,
+# a full scan of a small table is fast enough
+MIN_TABLE_ROWS = 1000
+
+# maximum number of columns in a proposed index, the selected columns
+# are only added (covering index) in case the index is not larger than this
+MAX_INDEX_COLUMNS = 6
+
+# name prefix of the indexes that are created by IndexAdvisor.create
+AUTO_INDEX_PREFIX = 'auto_idx_'
+
+# identifier: "quoted", [quoted], `quoted` or plain
+IDENTIFIER = r'(?:"(?:[^"]|"")*"|\[[^\]]*\]|`[^`]*`|[A-Za-z_]\w*)'
+
+# column (optionally table.column) followed by a comparison operator
+PREDICATE = re.compile(rf'(?:({IDENTIFIER})\s*\.\s*)?({IDENTIFIER})\s*'
+                       r'(==|=|<=|>=|<|>|\bIS\b(?!\s+NOT\b)|\bIN\b|\bBETWEEN\b)',
+                       re.IGNORECASE)
+
+# tables in the FROM and JOIN clauses, with an optional alias
+TABLE_REFERENCE = re.compile(rf'\b(?:FROM|JOIN|UPDATE|INTO)\s+({IDENTIFIER})'
+                             rf'(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|INNER|LEFT|CROSS|NATURAL|ON|USING|'
+                             rf'SET|GROUP|ORDER|LIMIT|VALUES|SELECT)\b)({IDENTIFIER}))?',
+                             re.IGNORECASE)
+
+# the clauses of a statement that follow the WHERE clause
+WHERE_CLAUSE = re.compile(r'\bWHERE\b(.*?)(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\bHAVING\b|$)',
+                          re.IGNORECASE | re.DOTALL)
+
+ORDER_CLAUSE = re.compile(r'\bORDER\s+BY\b(.*?)(?=\bLIMIT\b|$)', re.IGNORECASE | re.DOTALL)
+
+SELECT_LIST = re.compile(r'^\s*SELECT\s+(?:DISTINCT\s+)?(.*?)\s+FROM\b', re.IGNORECASE | re.DOTALL)
+
+# lines from EXPLAIN QUERY PLAN, e.g. "SCAN data" or
+# "SEARCH data USING AUTOMATIC COVERING INDEX (id=?)"
+PLAN_SCAN = re.compile(rf'^\s*SCAN\s+(?:TABLE\s+)?({IDENTIFIER})(?:\s+AS\s+({IDENTIFIER}))?\s*$')
+PLAN_AUTOMATIC = re.compile(rf'^\s*SEARCH\s+(?:TABLE\s+)?({IDENTIFIER})(?:\s+AS\s+{IDENTIFIER})?'
+                            r'\s+USING\s+AUTOMATIC\s+(?:PARTIAL\s+)?(?:COVERING\s+)?INDEX\s+\((.*)\)')
+
+# tables without a rowid do not have a rowid alias column
+WITHOUT_ROWID = re.compile(r'\)\s*WITHOUT\s+ROWID\s*(?:,|;|$)', re.IGNORECASE)
+
+EQUALITY_OPERATORS = ('=', '==', 'IS', 'IN')
+RANGE_OPERATORS = ('<', '>', '<=', '>=', 'BETWEEN')
+
+
+def unquote_identifier(name: str) -> str:
+
+    if name[:1] in '"[`':
+
+        name = name[1:-1]
+
+        if name[:1] != '[':
+            name = name.replace('""', '"')
+
+    return name
+
+
+def get_index_name(table, columns) -> str:
+    """
+    returns the name of an automatically created index, e.g. auto_idx_data_id_name
+    """
+
+    name = '_'.join([table] + list(columns))
+    name = re.sub(r'\W', '_', name)
+
+    # keep the names readable, the hash makes them unique
+    if len(name) > 48:
+        name = f'{name[:40]}_{hashlib.sha1(name.encode("utf-8")).hexdigest()[:7]}'
+
+    return f'{AUTO_INDEX_PREFIX}{name}'
+
+
+def get_table_aliases(sql) -> dict:
+    """
+    returns {alias or table name (lowercase): table name} for the tables in sql
+    """
+
+    aliases = {}
+
+    for match in TABLE_REFERENCE.finditer(sql):
+
+        table = unquote_identifier(match.group(1))
+
+        aliases[table.lower()] = table
+
+        if match.group(2):
+            aliases[unquote_identifier(match.group(2)).lower()] = table
+
+    return aliases
+
+
+def get_index_columns(sql, table, columns, aliases) -> list:
+    """
+    returns the columns of an index for table that the statement sql can use
+    instead of scanning table, an empty list in case there is none
+
+    columns is a dict {lowercase name: name} of the columns of table, the index
+    contains the columns that are compared with = (or IN, IS) in the WHERE clause,
+    followed by one column that is compared with <, >, BETWEEN, or the columns
+    in ORDER BY. The columns in the SELECT list are added at the end in case the
+    index does not become too large (covering index, the table is not read at all)
+
+    NOTE: this does not parse the SQL properly, it is only meant for the
+    common SELECT ... FROM ... WHERE ... statements
+    """
+
+    def get_column(prefix, name):
+
+        # column of another table
+        if prefix is not None and aliases.get(unquote_identifier(prefix).lower()) != table:
+            return None
+
+        return columns.get(unquote_identifier(name).lower())
+
+    equal = []
+    ranges = []
+
+    match = WHERE_CLAUSE.search(sql)
+
+    if match is not None:
+
+        for prefix, name, operator in PREDICATE.findall(match.group(1)):
+
+            column = get_column(prefix or None, name)
+
+            if column is None:
+                continue
+
+            operator = operator.upper()
+
+            if operator in EQUALITY_OPERATORS and column not in equal:
+                equal.append(column)
+
+            elif operator in RANGE_OPERATORS and column not in ranges:
+                ranges.append(column)
+
+    index = list(equal)
+
+    # only the first range constraint can use the index
+    ranges = [n for n in ranges if n not in index]
+
+    if ranges:
+        index.append(ranges[0])
+
+    else:
+
+        match = ORDER_CLAUSE.search(sql)
+
+        if match is not None:
+
+            order = []
+
+            for term in match.group(1).split(','):
+
+                parts = re.match(rf'\s*(?:({IDENTIFIER})\s*\.\s*)?({IDENTIFIER})\s*(?:ASC|DESC)?\s*$',
+                                 term, re.IGNORECASE)
+
+                column = get_column(parts.group(1), parts.group(2)) if parts else None
+
+                # the index can only be used if all ORDER BY terms are columns of table
+                if column is None:
+                    order = []
+                    break
+
+                order.append(column)
+
+            if equal or order:
+                index.extend(n for n in order if n not in index)
+
+    if not index:
+        return []
+
+    match = SELECT_LIST.search(sql)
+
+    if match is not None:
+
+        selected = []
+
+        for term in match.group(1).split(','):
+
+            parts = re.match(rf'\s*(?:({IDENTIFIER})\s*\.\s*)?({IDENTIFIER})\s*$', term)
+            column = get_column(parts.group(1), parts.group(2)) if parts else None
+
+            # *, expressions or columns of other tables
+            if column is None:
+                selected = None
+                break
+
+            if column not in index:
+                selected.append(column)
+
+        if selected is not None and len(index) + len(selected) <= MAX_INDEX_COLUMNS:
+            index.extend(selected)
+
+    return index[:MAX_INDEX_COLUMNS]
+
+
+class IndexAdvisor:
+
+    def __init__(self, db, profiler):
+        """
+        proposes indexes for the in-memory database of db (io.DatabaseHandler) based
+        on the statements recorded by profiler (profiler.SQLProfiler)
+
+        the query plan (EXPLAIN QUERY PLAN) of each recorded statement is checked
+        for full table scans (and automatic indexes that SQLite creates for
+        each query), the columns of the index are taken from the WHERE and
+        ORDER BY clauses (see get_index_columns)
+
+        create adds the indexes to the in-memory database only,
+        the indexes are removed from the file when it is saved unless
+        db.keep_indexes is True (see io.DatabaseHandler.save)
+
+        usage:
+            advisor = IndexAdvisor(db, profiler)
+
+            for n in advisor.propose():
+                print(n['sql'], n['benefit'])
+
+            advisor.create()
+        """
+
+        self.db = db
+        self.profiler = profiler
+
+        # table: number of rows
+        self.table_rows = {}
+
+    def get_columns(self, table) -> dict:
+
+        rows = self.db.connection.execute(f'PRAGMA table_info({quote_identifier(table)})').fetchall()
+
+        return {n[1].lower(): n[1] for n in rows}
+
+    def get_rowid_alias(self, table):
+        """
+        returns the INTEGER PRIMARY KEY column of table (an alias of the rowid),
+        None in case there is none
+
+        every index already contains the rowid, so this column is not added
+        to the proposed indexes (it would only make the index larger)
+        """
+
+        rows = self.db.connection.execute(f'PRAGMA table_info({quote_identifier(table)})').fetchall()
+
+        # only a single-column primary key is an alias
+        keys = [n for n in rows if n[5] > 0]
+
+        if len(keys) != 1 or keys[0][2].upper() != 'INTEGER':
+            return None
+
+        row = self.db.connection.execute("SELECT sql FROM sqlite_master WHERE type = 'table' "
+                                         'AND name = ?', (table, )).fetchone()
+
+        if row is None or row[0] is None or WITHOUT_ROWID.search(row[0]):
+            return None
+
+        return keys[0][1]
+
+    def get_indexes(self, table) -> list:
+        """
+        returns the columns (tuple) of the existing indexes on table
+        """
+
+        connection = self.db.connection
+
+        indexes = []
+
+        for row in connection.execute(f'PRAGMA index_list({quote_identifier(table)})').fetchall():
+
+            info = connection.execute(f'PRAGMA index_info({quote_identifier(row[1])})').fetchall()
+            indexes.append(tuple(n[2] for n in sorted(info)))
+
+        return indexes
+
+    def get_table_rows(self, table) -> int:
+
+        if table not in self.table_rows:
+            self.table_rows[table] = self.db.connection.execute(
+                f'SELECT count(*) FROM {quote_identifier(table)}').fetchone()[0]
+
+        return self.table_rows[table]
+
+    def get_table(self, name, aliases):
+        """
+        returns the name of the table name (or alias) in the database, or None
+        """
+
+        name = aliases.get(unquote_identifier(name).lower(), unquote_identifier(name))
+
+        row = self.db.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                         'AND name = ? COLLATE NOCASE', (name, )).fetchone()
+
+        return row[0] if row is not None else None
+
+    def analyze(self, sql) -> list:
+        """
+        returns a list of (table, index columns) for the normalized statement
+        sql (recorded by the profiler)
+        """
+
+        plan = self.profiler.explain(self.db.connection, sql)
+        aliases = get_table_aliases(sql)
+
+        result = []
+
+        for line in plan:
+
+            scan = PLAN_SCAN.match(line)
+            automatic = PLAN_AUTOMATIC.match(line)
+
+            if scan is None and automatic is None:
+                continue
+
+            table = self.get_table((scan or automatic).group(1), aliases)
+
+            if table is None or self.get_table_rows(table) < MIN_TABLE_ROWS:
+                continue
+
+            columns = self.get_columns(table)
+
+            if automatic is not None:
+
+                # e.g. (id=? AND name>?)
+                index = [columns.get(unquote_identifier(n).lower())
+                         for n in re.findall(rf'({IDENTIFIER})\s*[=<>]', automatic.group(2))]
+
+                index = [n for n in index if n is not None]
+
+            else:
+                index = get_index_columns(sql, table, columns, aliases)
+
+            rowid = self.get_rowid_alias(table)
+            index = [n for n in index if n != rowid]
+
+            if index:
+                result.append((table, tuple(index)))
+
+        return result
+
+    def propose(self) -> list:
+        """
+        returns a list of proposed indexes, the most beneficial first
+
+        each proposal is a dict with
+            table, columns: the index
+            name: name of the index (see get_index_name)
+            sql: the CREATE INDEX statement
+            statements: the (normalized) statements that would use the index
+            benefit: total time (seconds) of these statements so far
+        """
+
+        self.table_rows = {}
+
+        proposals = {}
+
+        for row in self.profiler.report():
+
+            try:
+                candidates = self.analyze(row['sql'])
+
+            # e.g. the statement refers to a table that was dropped
+            except Exception:
+                continue
+
+            for table, columns in candidates:
+
+                key = (table, columns)
+
+                if key not in proposals:
+                    proposals[key] = {'statements': [], 'benefit': 0.0}
+
+                proposals[key]['statements'].append(row['sql'])
+                proposals[key]['benefit'] += row['total']
+
+        # an index on (a, b, c) can also be used instead of an index on (a, b)
+        for table, columns in sorted(proposals, key=lambda n: len(n[1])):
+
+            for other_table, other in list(proposals):
+
+                if (other_table == table and len(other) > len(columns)
+                        and other[:len(columns)] == columns and (table, columns) in proposals):
+
+                    merged = proposals.pop((table, columns))
+
+                    proposals[(table, other)]['statements'].extend(merged['statements'])
+                    proposals[(table, other)]['benefit'] += merged['benefit']
+
+        result = []
+
+        for (table, columns), proposal in proposals.items():
+
+            # an existing index already starts with these columns
+            if any(n[:len(columns)] == columns for n in self.get_indexes(table)):
+                continue
+
+            name = get_index_name(table, columns)
+
+            proposal.update({'table': table,
+                             'columns': columns,
+                             'name': name,
+                             'sql': f'CREATE INDEX IF NOT EXISTS {quote_identifier(name)} '
+                                    f'ON {quote_identifier(table)} '
+                                    f'({", ".join(quote_identifier(n) for n in columns)})'})
+
+            result.append(proposal)
+
+        return sorted(result, key=lambda n: n['benefit'], reverse=True)
+
+    def create(self, proposals=None) -> list:
+        """
+        creates the proposed indexes (default: all from propose) in the
+        in-memory database, returns the names of the indexes that were created
+        """
+
+        if self.db.lazy:
+            raise PermissionError(f'{self.db.path} is opened read-only (lazy=True)')
+
+        if proposals is None:
+            proposals = self.propose()
+
+        names = []
+
+        with self.db.lock:
+
+            for proposal in proposals:
+
+                self.db.connection.execute(proposal['sql'])
+                self.db.auto_indexes.add(proposal['name'])
+
+                names.append(proposal['name'])
+
+            self.db.connection.commit()
+
+        for proposal in proposals:
+            print(f'created index {proposal["name"]} ({proposal["benefit"]:.2f} sec in '
+                  f'{len(proposal["statements"])} statements)')
+
+        return names
@@ -0,0 +1,216 @@
+import os
+import glob
+import struct
+import hashlib
+
+from PyQt5.QtGui import QIcon, QPixmap, QPixmapCache, QPalette, QColor
+from PyQt5.QtCore import QResource, QSize, Qt, PYQT_VERSION_STR, QT_VERSION_STR
+
+from gui_template.cache import CACHE_PATH, get_file_signature
+from gui_template.settings import VERSION
+
+
+# icons and images (relative to the working directory, like data/)
+ASSETS_PATH = 'assets'
+
+# the processed stylesheet and its resources are stored here, see load_stylesheet
+STYLESHEET_CACHE_PATH = os.path.join(CACHE_PATH, 'assets')
+
+# header of a binary Qt resource file (.rcc): magic, version,
+# offsets of the tree, data and names
+RCC_HEADER = struct.Struct('>4sIIII')
+
+# QIcon objects cannot be stored in QPixmapCache
+ICONS = {}
+
+
+def get_asset_path(name) -> str:
+    return os.path.join(ASSETS_PATH, name)
+
+
+def get_pixmap(name, height=None) -> QPixmap:
+    """
+    returns the image name from the assets folder, scaled to height (pixels)
+
+    the scaled pixmap is kept in QPixmapCache, the file is only read
+    the first time (or in case the pixmap was removed from the cache)
+
+    returns a null pixmap in case the file does not exist
+    """
+
+    key = f'{name}@{height}'
+
+    pixmap = QPixmapCache.find(key)
+
+    if pixmap is not None and not pixmap.isNull():
+        return pixmap
+
+    pixmap = QPixmap(get_asset_path(name))
+
+    if pixmap.isNull():
+        print(f'could not load {get_asset_path(name)}')
+        return pixmap
+
+    if height is not None and pixmap.height() != height:
+        pixmap = pixmap.scaledToHeight(height, Qt.SmoothTransformation)
+
+    QPixmapCache.insert(key, pixmap)
+
+    return pixmap
+
+
+def get_icon(name, size=None) -> QIcon:
+    """
+    returns a QIcon for the image name from the assets folder,
+    the icon is created once
+    """
+
+    key = (name, size)
+
+    icon = ICONS.get(key)
+
+    if icon is None:
+
+        icon = QIcon()
+
+        if size is None:
+            icon.addFile(get_asset_path(name))
+        else:
+            icon.addFile(get_asset_path(name), QSize(size, size))
+
+        ICONS[key] = icon
+
+    return icon
+
+
+def get_stylesheet_key() -> str:
+    """
+    returns the key of the cached stylesheet, changes when the program,
+    PyQt5 or qdarkstyle is updated
+
+    qdarkstyle is not imported to get its version, the size and
+    modification time of its files are used instead
+    """
+
+    import importlib.util
+
+    spec = importlib.util.find_spec('qdarkstyle')
+
+    parts = [VERSION, PYQT_VERSION_STR, QT_VERSION_STR]
+
+    if spec is not None and spec.origin is not None:
+
+        folder = os.path.dirname(spec.origin)
+
+        for name in ('__init__.py', os.path.join('dark', 'darkstyle_rc.py')):
+
+            try:
+                parts.append(str(get_file_signature(os.path.join(folder, name))))
+
+            except OSError:
+                parts.append('')
+
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:20]
+
+
+def build_rcc(version, tree, names, data) -> bytes:
+    """
+    returns a binary Qt resource file (the same as rcc -binary) from the
+    arrays of a PyQt5 resource module (see pyrcc5), can be registered
+    with QResource.registerResource without importing the module
+    """
+
+    # the offsets are from the start of the file
+    data_offset = RCC_HEADER.size
+    names_offset = data_offset + len(data)
+    tree_offset = names_offset + len(names)
+
+    header = RCC_HEADER.pack(b'qres', version, tree_offset, data_offset, names_offset)
+
+    return header + data + names + tree
+
+
+def write_file(path, content) -> None:
+
+    tmp = f'{path}.tmp'
+
+    with open(tmp, 'wb') as f:
+        f.write(content)
+
+    os.replace(tmp, path)
+
+
+def load_stylesheet(app) -> str:
+    """
+    returns the qdarkstyle stylesheet for app and registers the resources
+    (icons) that it uses
+
+    qdarkstyle.load_stylesheet_pyqt5 imports qtpy, imports the resource module
+    and processes the stylesheet, this takes about 25 ms. The result is stored
+    in STYLESHEET_CACHE_PATH (key.qss, key.rcc and key.color, see
+    get_stylesheet_key), the next time only these files are read
+
+    the palette change that qdarkstyle makes (link color) is applied in both cases
+    """
+
+    key = get_stylesheet_key()
+
+    path = os.path.join(STYLESHEET_CACHE_PATH, key)
+
+    try:
+        with open(f'{path}.qss', 'r', encoding='utf-8') as f:
+            stylesheet = f.read()
+
+        with open(f'{path}.color', 'r', encoding='utf-8') as f:
+            color = f.read().strip()
+
+        if not QResource.registerResource(f'{path}.rcc'):
+            raise OSError(f'could not register {path}.rcc')
+
+    except OSError:
+        stylesheet, color = save_stylesheet(path)
+
+    palette = app.palette()
+    palette.setColor(QPalette.Normal, QPalette.Link, QColor(color))
+    app.setPalette(palette)
+
+    return stylesheet
+
+
+def save_stylesheet(path) -> tuple:
+    """
+    loads the stylesheet with qdarkstyle and writes it to the cache,
+    returns (stylesheet, link color)
+    """
+
+    import qdarkstyle
+
+    from qdarkstyle.dark import darkstyle_rc
+    from qdarkstyle.dark.palette import DarkPalette
+
+    stylesheet = qdarkstyle.load_stylesheet_pyqt5()
+    color = DarkPalette.COLOR_ACCENT_3
+
+    try:
+        os.makedirs(STYLESHEET_CACHE_PATH, exist_ok=True)
+
+        # files for other versions
+        for name in glob.glob(os.path.join(STYLESHEET_CACHE_PATH, '*.*')):
+            if not name.startswith(path):
+                os.remove(name)
+
+        write_file(f'{path}.rcc', build_rcc(darkstyle_rc.rcc_version,
+                                            darkstyle_rc.qt_resource_struct,
+                                            darkstyle_rc.qt_resource_name,
+                                            darkstyle_rc.qt_resource_data))
+
+        write_file(f'{path}.color', color.encode('utf-8'))
+
+        # written last, the cache is only used when this file exists
+        write_file(f'{path}.qss', stylesheet.encode('utf-8'))
+
+    except OSError as e:
+        print(f'could not cache the stylesheet in {STYLESHEET_CACHE_PATH}: {e}')
+
+    return stylesheet, color
+
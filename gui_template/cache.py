@@ -0,0 +1,481 @@
+import os
+import atexit
+import json
+import shutil
+import sqlite3
+import hashlib
+import threading
+import time
+
+from pathlib import Path
+from typing import Union
+
+
+# local copies of files (e.g. databases on network drives), see FileCache
+# (relative to the working directory, like the other paths in data/)
+CACHE_PATH = 'data/cache'
+
+# the least recently used files are removed when the cache is larger than this (bytes)
+CACHE_MAX_SIZE = 4 * 1024 ** 3
+
+# files are hashed in chunks of this size (bytes)
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+# each step of a transfer (a chunk in copy_file or a backup step in
+# io.DatabaseHandler) should take about this long (seconds), see AdaptiveStep
+STEP_INTERVAL = 0.1
+
+# measured throughput (bytes per second) for each folder, used to choose the
+# step size for transfers to or from this folder, see io.DatabaseHandler.backup
+TRANSFER_RATES = {}
+
+
+class AdaptiveStep:
+
+    def __init__(self, initial, minimum, maximum, interval=STEP_INTERVAL):
+        """
+        chooses the size of each step of a transfer (bytes or pages), so that
+        each step takes about interval seconds
+
+        the first step is small to get a quick first progress update, after
+        each step the size is changed based on the measured throughput,
+        but at most 4 times larger or smaller than the previous step
+
+        usage:
+            step = AdaptiveStep(256 * 1024, 64 * 1024, 64 * 1024 ** 2)
+
+            while ...:
+                n = transfer(step.size)
+                step.update(n)
+        """
+
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = interval
+
+        self.t0 = time.perf_counter()
+        self.t = self.t0
+
+        # units transferred so far
+        self.total = 0
+
+    def update(self, n) -> int:
+        """
+        n units were transferred since the last call, returns the next step size
+        """
+
+        t = time.perf_counter()
+        dt = t - self.t
+
+        self.t = t
+        self.total += n
+
+        if dt > 0 and n > 0:
+
+            target = n * self.interval / dt
+
+            self.size = int(min(max(target, self.size / 4, self.minimum),
+                                self.size * 4, self.maximum))
+
+        return self.size
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def rate(self, unit_size=1) -> float:
+        """
+        average throughput in MB/s, unit_size is the number of bytes per unit
+        """
+
+        return self.total * unit_size / max(self.elapsed, 1e-9) / 1e6
+
+
+def get_file_signature(path: Union[Path, str]) -> tuple:
+    """
+    returns (size, mtime_ns) of path, this changes when the file is modified
+    (unlike io.last_modified, this has nanosecond resolution)
+    """
+
+    st = os.stat(path)
+
+    return st.st_size, st.st_mtime_ns
+
+
+def copy_file(src, dst, progress=None, hash_content=False) -> Union[str, None]:
+    """
+    copies the file src to dst (including modification time)
+
+    the file is first copied to a temporary file next to dst, which
+    is renamed to dst when the copy is complete
+
+    the chunk size is chosen by AdaptiveStep, the first chunk is small
+    and the following chunks take about STEP_INTERVAL seconds each
+
+    progress is called after each chunk with the arguments status,
+    remaining bytes and total bytes (the same as for sqlite3.Connection.backup)
+
+    if hash_content is True, returns the blake2b hash (hex) of the content,
+    otherwise None
+
+    the temporary file is removed in case the copy fails or is cancelled
+    (progress raises, e.g. tasks.TaskCancelled)
+    """
+
+    tmp = f'{dst}.tmp'
+
+    total = os.path.getsize(src)
+    remaining = total
+
+    content_hash = hashlib.blake2b() if hash_content else None
+
+    step = AdaptiveStep(256 * 1024, 64 * 1024, 64 * 1024 ** 2)
+
+    try:
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+
+            while True:
+
+                chunk = fsrc.read(step.size)
+
+                if not chunk:
+                    break
+
+                fdst.write(chunk)
+
+                if content_hash is not None:
+                    content_hash.update(chunk)
+
+                step.update(len(chunk))
+                remaining = max(0, remaining - len(chunk))
+
+                if progress is not None:
+                    progress(sqlite3.SQLITE_OK, remaining, total)
+
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+
+    except BaseException:
+
+        try:
+            os.remove(tmp)
+
+        # e.g. the file could not be created, or is still open on Windows
+        except OSError:
+            pass
+
+        raise
+
+    # reading from the source folder is the slow part
+    if step.total:
+        TRANSFER_RATES[str(Path(src).absolute().parent)] = step.total / max(step.elapsed, 1e-9)
+
+    if content_hash is not None:
+        return content_hash.hexdigest()
+
+    return None
+
+
+def hash_file(path) -> str:
+    """
+    returns the blake2b hash (hex) of the content of path
+    """
+
+    content_hash = hashlib.blake2b()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            content_hash.update(chunk)
+
+    return content_hash.hexdigest()
+
+
+class FileCache:
+
+    def __init__(self, path=CACHE_PATH, max_size=CACHE_MAX_SIZE, hash_content=False):
+        """
+        keeps local copies of files, for example databases on network drives
+
+        the copies are keyed by the absolute path, size and modification time (ns)
+        of the source file, a file is copied again in case it has changed
+        (the old copy is removed). Checking whether the copy is up to date
+        only needs one os.stat call on the source file
+
+        the least recently used copies are removed when the total size is
+        larger than max_size (bytes)
+
+        if hash_content is True, the content hash of each file is stored when
+        it is copied, get(verify=True) checks the local copy against this hash
+
+        the index is stored as index.json in the cache folder
+        nothing is written to disk until a file is cached, the time a copy was
+        last used is only written with the next copy or by save
+
+        a relative path is relative to the working directory at the time the
+        cache is used (not when it is created), the same as the other paths
+        in data/, the paths of the local copies that are returned are absolute
+        """
+
+        self.path = Path(path)
+        self.max_size = max_size
+        self.hash_content = hash_content
+
+        self.index_path = self.path / 'index.json'
+
+        # key: {source, size, mtime_ns, hash, name, last_used}
+        self.index = None
+
+        # True in case last_used was changed since the index was written,
+        # cache hits only change the index in memory, see save
+        self.modified = False
+
+        # loads can run in several worker threads
+        self.lock = threading.Lock()
+
+    def get_key(self, path, signature) -> str:
+
+        size, mtime_ns = signature
+        key = f'{Path(path).absolute()}|{size}|{mtime_ns}'
+
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+    def load_index(self) -> dict:
+
+        if self.index is not None:
+            return self.index
+
+        self.index = {}
+
+        if os.path.isfile(self.index_path):
+
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self.index = json.load(f)
+
+            # the index will be recreated, old copies are removed by evict
+            except Exception:
+                print(f'could not read {self.index_path}')
+
+        return self.index
+
+    def save_index(self) -> None:
+
+        os.makedirs(self.path, exist_ok=True)
+
+        tmp = f'{self.index_path}.tmp'
+
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+
+        os.replace(tmp, self.index_path)
+
+        self.modified = False
+
+    def save(self) -> None:
+        """
+        writes the index in case it was changed by cache hits (the time
+        the copies were last used), called when the program exits
+        """
+
+        with self.lock:
+
+            if self.modified:
+
+                try:
+                    self.save_index()
+
+                except OSError as e:
+                    print(f'could not save {self.index_path}: {e}')
+
+    def get(self, path, progress=None, verify=False) -> tuple:
+        """
+        returns the path to an up-to-date local copy of path, and the
+        signature (size, mtime_ns) of the source file that was copied
+
+        copies the file in case there is no local copy of this version,
+        progress is passed to copy_file
+
+        the lock is only held while the index is read and changed, the file
+        is copied without it (to a file with a name for this thread, which is
+        renamed when the copy is complete), other files can be used meanwhile
+        """
+
+        path = Path(path).absolute()
+
+        signature = get_file_signature(path)
+        key = self.get_key(path, signature)
+
+        name = f'{key}{path.suffix}'
+        local = (self.path / name).absolute()
+
+        with self.lock:
+
+            local_hit = self.get_entry(key, verify)
+
+            if local_hit is not None:
+                return local_hit, signature
+
+            # older versions of this file are not needed anymore
+            self.remove_source(path, keep=key)
+
+            os.makedirs(self.path, exist_ok=True)
+
+        tmp = local.with_name(f'{name}.{threading.get_ident()}')
+
+        content_hash = copy_file(path, tmp, progress=progress,
+                                 hash_content=self.hash_content)
+
+        with self.lock:
+
+            # another thread copied the same version in the meantime
+            local_hit = self.get_entry(key)
+
+            if local_hit is not None:
+                os.remove(tmp)
+                return local_hit, signature
+
+            os.replace(tmp, local)
+
+            # in case the file was modified while it was copied, the copy
+            # is stored with the signature from before the copy started
+            # and will be copied again the next time
+            self.index[key] = {'source': str(path),
+                               'size': signature[0],
+                               'mtime_ns': signature[1],
+                               'hash': content_hash,
+                               'name': name,
+                               'last_used': time.time()}
+
+            self.evict(keep=key)
+            self.save_index()
+
+            return local, signature
+
+    def get_entry(self, key, verify=False) -> Union[Path, None]:
+        """
+        returns the path to the local copy with key in case it is valid (and
+        marks it as used), otherwise None, must be called with the lock held
+        """
+
+        entry = self.load_index().get(key)
+
+        if entry is None:
+            return None
+
+        local = (self.path / entry['name']).absolute()
+
+        valid = os.path.isfile(local) and os.path.getsize(local) == entry['size']
+
+        if valid and verify and entry['hash'] is not None:
+            valid = hash_file(local) == entry['hash']
+
+        if not valid:
+            return None
+
+        # the index is written when a file is copied, or by save
+        entry['last_used'] = time.time()
+        self.modified = True
+
+        return local
+
+    def update(self, path, local) -> tuple:
+        """
+        registers local (the local copy of path) as up-to-date, use this in case
+        both the source file and the local copy have been modified in the same way
+
+        returns the new path of the local copy and the new signature of path
+        """
+
+        path = Path(path).absolute()
+
+        with self.lock:
+
+            index = self.load_index()
+
+            signature = get_file_signature(path)
+            key = self.get_key(path, signature)
+
+            name = f'{key}{path.suffix}'
+
+            # remove_source removes the files of the old entries (including local)
+            tmp = self.path / f'{name}.update'
+            os.replace(local, tmp)
+
+            self.remove_source(path)
+            os.replace(tmp, self.path / name)
+
+            index[key] = {'source': str(path),
+                          'size': signature[0],
+                          'mtime_ns': signature[1],
+                          'hash': hash_file(self.path / name) if self.hash_content else None,
+                          'name': name,
+                          'last_used': time.time()}
+
+            self.save_index()
+
+            return (self.path / name).absolute(), signature
+
+    def discard(self, path) -> None:
+        """
+        removes all local copies of path
+        """
+
+        with self.lock:
+            self.load_index()
+            self.remove_source(Path(path).absolute())
+            self.save_index()
+
+    def remove_source(self, path, keep=None) -> None:
+        """
+        removes the local copies of path, except the one with key keep
+        """
+
+        for key in [k for k, n in self.index.items() if n['source'] == str(path) and k != keep]:
+            self.remove(key)
+
+    def remove(self, key) -> bool:
+        """
+        removes the local copy, returns False in case the file could not be
+        removed (e.g. it is opened by DatabaseHandler(lazy=True) on Windows)
+        """
+
+        try:
+            local = self.path / self.index[key]['name']
+
+            if os.path.isfile(local):
+                os.remove(local)
+
+        except OSError:
+            return False
+
+        del self.index[key]
+
+        return True
+
+    def evict(self, keep=None) -> None:
+        """
+        removes the least recently used copies until the total size is
+        at most max_size, the copy with key keep is not removed
+        """
+
+        total = sum(n['size'] for n in self.index.values())
+
+        for key in sorted(self.index, key=lambda k: self.index[k]['last_used']):
+
+            if total <= self.max_size:
+                break
+
+            if key == keep:
+                continue
+
+            size = self.index[key]['size']
+
+            if self.remove(key):
+                total -= size
+
+
+# used by io.DatabaseHandler
+FILE_CACHE = FileCache()
+
+atexit.register(FILE_CACHE.save)
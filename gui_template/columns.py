@@ -0,0 +1,527 @@
+import re
+import datetime
+import operator
+import functools
+
+from array import array
+from itertools import chain
+
+from gui_template.misc import get_table_value
+
+# numpy is optional, it is only used to speed up conversions
+# all data is stored in array.array objects that can be used without numpy
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# the builtin float function only accepts strings that start with
+# (optional sign) a digit, a decimal point or inf/infinity/nan
+# this is used to skip the try/except for strings that are clearly not numeric
+NUMERIC_START = re.compile(r'[+-]?(\d|\.\d|inf|nan)', re.IGNORECASE)
+
+# integers outside of this range cannot be stored in array('q')
+INT_MIN = -2 ** 63
+INT_MAX = 2 ** 63 - 1
+
+# floats can represent all integers in this range exactly
+FLOAT_INT_MAX = 2 ** 53
+
+is_none = functools.partial(operator.is_, None)
+
+
+class Column:
+
+    def __init__(self, kind, values, null, keys=None):
+        """
+        a single table column with converted values and a null mask
+
+        create instances of this class with convert_column
+
+        kind is one of
+            int: values is array('q')
+            float: values is array('d')
+            datetime: values is a list of datetime.datetime, keys is array('d') with timestamps
+            timedelta: values is a list of datetime.timedelta, keys is array('d') with seconds
+            text: values is a list of str (stripped)
+            mixed: values is a list of (display str, sort key) tuples
+            null: all values are null, values is an empty list
+
+        null is a bytearray with 1 for each cell that is empty
+
+        text and key return the same values as misc.get_table_value
+        """
+
+        self.kind = kind
+        self.values = values
+        self.null = null
+        self.keys = keys
+
+        # sort ranks, created the first time the column is sorted
+        self._rank = None
+
+    def __len__(self):
+        return len(self.null)
+
+    @property
+    def n_null(self) -> int:
+        return self.null.count(1)
+
+    def text(self, i):
+        """
+        returns the display string for row i, None if the cell is empty
+        """
+
+        if self.null[i]:
+            return None
+
+        kind = self.kind
+        val = self.values[i]
+
+        if kind == 'float':
+
+            # same as convert_to_numeric, integer values are displayed without decimals
+            if val.is_integer():
+                return str(int(val))
+
+            return str(val)
+
+        if kind == 'datetime':
+            return val.strftime('%d-%m-%Y %H:%M:%S')
+
+        if kind == 'mixed':
+            return val[0]
+
+        return str(val)
+
+    def key(self, i):
+        """
+        returns the sort key for row i, None if the cell is empty
+        """
+
+        if self.null[i]:
+            return None
+
+        if self.keys is not None:
+            return self.keys[i]
+
+        if self.kind == 'mixed':
+            return self.values[i][1]
+
+        return self.values[i]
+
+    def extend(self, other) -> None:
+        """
+        appends the rows in other (a Column) to this column
+
+        the kind is changed to mixed in case the kinds are different,
+        except for int and float (changed to float) and null (which can
+        be combined with any kind)
+        """
+
+        if self.kind != other.kind:
+
+            if other.kind == 'null':
+                other = empty_column(self.kind, len(other))
+
+            elif self.kind == 'null':
+                empty = empty_column(other.kind, len(self))
+                self.kind, self.values, self.keys = empty.kind, empty.values, empty.keys
+
+            elif {self.kind, other.kind} == {'int', 'float'} and \
+                    max(map(abs, chain(self.values, other.values)), default=0) <= FLOAT_INT_MAX:
+
+                self.kind = 'float'
+                self.values = array('d', self.values)
+                other = Column('float', array('d', other.values), other.null)
+
+            else:
+                self.values = self.to_mixed()
+                self.kind = 'mixed'
+                self.keys = None
+
+                other = Column('mixed', other.to_mixed(), other.null)
+
+        self.values.extend(other.values)
+
+        if self.keys is not None:
+            self.keys.extend(other.keys)
+
+        self.null.extend(other.null)
+
+        # the ranks must be computed again
+        self._rank = None
+
+    def to_mixed(self) -> list:
+        """
+        returns a list of (display str, sort key) tuples, None for empty rows
+        """
+
+        return [None if n else (self.text(i), self.key(i))
+                for i, n in enumerate(self.null)]
+
+    def rank(self) -> array:
+        """
+        returns array('q') with the sort rank of each row, rows with
+        equal values have equal rank and empty rows have rank -1
+
+        numbers are sorted before text, text is sorted as str
+        (SortableTableItem compares the text in case the values are not both numbers)
+
+        the ranks are computed once and reused each time the column is sorted
+        """
+
+        if self._rank is not None:
+            return self._rank
+
+        kind = self.kind
+
+        if kind == 'null':
+            rank = array('q', [-1]) * len(self)
+
+        elif kind in ('int', 'float', 'datetime', 'timedelta') and np is not None:
+
+            # the inverse of np.unique is the index in the sorted unique values
+            _, inverse = np.unique(self.to_numpy(), return_inverse=True)
+
+            inverse = inverse.astype(np.int64).ravel()
+            inverse[self.null_mask()] = -1
+
+            rank = array('q', inverse.tobytes())
+
+        else:
+
+            if kind == 'text':
+                keys = self.values
+
+            # numbers before text
+            elif kind == 'mixed':
+                keys = [(isinstance(v[1], str), v[1]) if v is not None else None
+                        for v in self.values]
+
+            else:
+                keys = self.keys if self.keys is not None else self.values
+
+            null = self.null
+            unique = sorted(set(k for k, n in zip(keys, null) if not n))
+            index = {k: i for i, k in enumerate(unique)}
+
+            rank = array('q', [-1 if n else index[k] for k, n in zip(keys, null)])
+
+        self._rank = rank
+
+        return rank
+
+    def null_mask(self):
+        """
+        returns the null mask as a boolean numpy array (without copying)
+        or the bytearray in case numpy is not installed
+        """
+
+        if np is None:
+            return self.null
+
+        return np.frombuffer(self.null, dtype=np.bool_)
+
+    def to_numpy(self):
+        """
+        returns the values (or keys for datetime and timedelta) as a numpy array,
+        numerical kinds are not copied
+        """
+
+        data = self.keys if self.keys is not None else self.values
+
+        if isinstance(data, array):
+            return np.frombuffer(data, dtype=np.int64 if data.typecode == 'q' else np.float64)
+
+        return np.array(data, dtype=object)
+
+
+def convert_column(values) -> Column:
+    """
+    converts all values in a column (list, tuple or numpy array) at once
+    and infers the column type
+
+    this gives the same result as calling misc.get_table_value for each value,
+    but avoids the per-cell type checks and try/except in convert_to_numeric
+    for columns that only contain a single type
+
+    NOTE: float NaN and inf are kept as floats, convert_to_numeric raises for these
+    """
+
+    if np is not None and isinstance(values, np.ndarray):
+
+        if values.dtype.kind in 'iub':
+            return Column('int', array('q', values.astype(np.int64).tobytes()),
+                          bytearray(len(values)))
+
+        if values.dtype.kind == 'f':
+            return from_floats(array('d', values.astype(np.float64).tobytes()),
+                               bytearray(len(values)))
+
+        values = values.tolist()
+
+    types = set(map(type, values))
+    types.discard(type(None))
+
+    if not types:
+        return Column('null', [], bytearray(b'\x01' * len(values)))
+
+    if len(types) == 1:
+
+        kind = types.pop()
+
+        if kind is str:
+            return from_strings(values)
+
+        if kind in (int, bool):
+            return from_ints(values)
+
+        if kind is float:
+            null = get_null(values)
+            return from_floats(array('d', fill_null(values, null, 0.0)), null)
+
+        if kind is datetime.datetime:
+            null = get_null(values)
+            keys = array('d', [0.0 if n else v.timestamp() for v, n in zip(values, null)])
+            return Column('datetime', list(values), null, keys=keys)
+
+        if kind is datetime.timedelta:
+            null = get_null(values)
+            keys = array('d', [0.0 if n else v.total_seconds() for v, n in zip(values, null)])
+            return Column('timedelta', list(values), null, keys=keys)
+
+    elif types <= {int, float, bool}:
+
+        null = get_null(values)
+        vals = fill_null(values, null, 0)
+
+        # large integers cannot be represented exactly as float
+        if all(abs(v) <= FLOAT_INT_MAX for v in vals if type(v) is not float):
+            return from_floats(array('d', vals), null)
+
+    return from_values(values)
+
+
+def sort_rows(columns, keys, rows=None):
+    """
+    returns the row order that sorts columns by keys
+
+    keys is a list of (column, descending) tuples, the first key is
+    the primary sort key. The sort is stable, rows with equal keys keep
+    their order in rows (default range(len(columns[0])))
+
+    sorting by a single key and passing the current order as rows is the
+    same as adding a new primary key to the previous keys
+
+    empty rows are always placed last, for both sort directions
+
+    uses numpy.lexsort if numpy is installed, otherwise list.sort
+    returns array('q') with row indices
+    """
+
+    if not keys:
+        return rows
+
+    ranks = [directed_rank(columns[j].rank(), descending) for j, descending in keys]
+
+    if np is not None:
+
+        if rows is None:
+            # np.lexsort uses the last key as the primary key
+            return array('q', np.lexsort(ranks[::-1]).astype(np.int64).tobytes())
+
+        rows = np.frombuffer(rows, dtype=np.int64)
+        order = np.lexsort([n[rows] for n in ranks[::-1]])
+
+        return array('q', rows[order].tobytes())
+
+    if rows is None:
+        rows = range(len(columns[keys[0][0]]))
+
+    rows = list(rows)
+
+    # list.sort is stable, sort by the least significant key first
+    for rank in ranks[::-1]:
+        rows.sort(key=rank.__getitem__)
+
+    return array('q', rows)
+
+
+def invert_order(order) -> array:
+    """
+    returns the position of each row in order (from sort_rows)
+    """
+
+    if np is not None:
+
+        position = np.empty(len(order), dtype=np.int64)
+        position[np.frombuffer(order, dtype=np.int64)] = np.arange(len(order))
+
+        return array('q', position.tobytes())
+
+    position = array('q', bytes(8 * len(order)))
+
+    for i, row in enumerate(order):
+        position[row] = i
+
+    return position
+
+
+def directed_rank(rank, descending=False):
+    """
+    returns ranks (from Column.rank) that sort in the given direction,
+    with empty rows (rank -1) last
+
+    returns a numpy array if numpy is installed, otherwise array('q')
+    """
+
+    if np is not None:
+
+        rank = np.frombuffer(rank, dtype=np.int64)
+        last = int(rank.max(initial=-1)) + 1
+        empty = rank == -1
+
+        if descending:
+            rank = last - 1 - rank
+        else:
+            rank = rank.copy()
+
+        rank[empty] = last
+
+        return rank
+
+    last = max(rank, default=-1) + 1
+
+    if descending:
+        return array('q', [last if n == -1 else last - 1 - n for n in rank])
+
+    return array('q', [last if n == -1 else n for n in rank])
+
+
+def empty_column(kind, n) -> Column:
+    """
+    returns a Column of kind with n empty rows
+    """
+
+    null = bytearray(b'\x01' * n)
+
+    if kind == 'int':
+        return Column(kind, array('q', bytes(8 * n)), null)
+
+    if kind == 'float':
+        return Column(kind, array('d', bytes(8 * n)), null)
+
+    if kind in ('datetime', 'timedelta'):
+        return Column(kind, [None] * n, null, keys=array('d', bytes(8 * n)))
+
+    if kind == 'text':
+        return Column(kind, [''] * n, null)
+
+    if kind == 'mixed':
+        return Column(kind, [None] * n, null)
+
+    return Column('null', [], null)
+
+
+def get_null(values) -> bytearray:
+    """
+    returns a bytearray with 1 for each None in values
+    """
+
+    return bytearray(map(is_none, values))
+
+
+def fill_null(values, null, fill) -> list:
+    """
+    returns values with fill instead of None
+    """
+
+    if not null.count(1):
+        return values
+
+    return [fill if n else v for v, n in zip(values, null)]
+
+
+def from_ints(values) -> Column:
+
+    null = get_null(values)
+    vals = fill_null(values, null, 0)
+
+    try:
+        return Column('int', array('q', vals), null)
+
+    # integers that are too large for array('q')
+    except OverflowError:
+        return from_values(values)
+
+
+def from_floats(vals, null) -> Column:
+    """
+    vals is array('d'), uses int in case all values are integer values
+    (same as convert_to_numeric)
+    """
+
+    if np is not None:
+
+        a = np.frombuffer(vals, dtype=np.float64)
+
+        if len(a) and np.all(np.floor(a) == a) and np.all(np.abs(a) < INT_MAX):
+            return Column('int', array('q', a.astype(np.int64).tobytes()), null)
+
+    elif all(map(float.is_integer, vals)) and all(abs(v) < INT_MAX for v in vals):
+        return Column('int', array('q', map(int, vals)), null)
+
+    return Column('float', vals, null)
+
+
+def from_strings(values) -> Column:
+    """
+    values are str or None
+
+    NULL representations (see misc.is_null) and empty / whitespace strings
+    are null, except [EMPTY] which is displayed
+    """
+
+    stripped = [v.strip() if v is not None else '' for v in values]
+
+    null = bytearray(
+        not s or v.lower() == 'null' or v == 'NaN'
+        for v, s in zip(values, stripped))
+
+    if null.count(1) == len(values):
+        return Column('null', [], null)
+
+    filled = fill_null(stripped, null, '0')
+
+    # try to convert the entire column at once, this raises
+    # ValueError in case any of the values are not numeric
+    try:
+        if np is not None:
+            vals = array('d', np.array(filled, dtype=np.float64).tobytes())
+        else:
+            vals = array('d', map(float, filled))
+
+        return from_floats(vals, null)
+
+    except ValueError:
+        pass
+
+    # none of the values are numeric
+    if not any(NUMERIC_START.match(s) for s in stripped):
+        return Column('text', fill_null(stripped, null, ''), null)
+
+    return from_values(values)
+
+
+def from_values(values) -> Column:
+    """
+    fallback for columns with several types, converts each value
+    separately using get_table_value
+    """
+
+    vals = [get_table_value(v) for v in values]
+    null = get_null(vals)
+
+    return Column('mixed', vals, null)
@@ -1,14 +1,17 @@
 import sys
+import time
 import ctypes
 
 
 from PyQt5.QtWidgets import (QMainWindow,
                              QLabel,
                              QStatusBar)
+from PyQt5.QtCore import QTimer
 
 from gui_template.helper import set_stylesheet, set_window_icon
 from gui_template.interface import MyTabWidget
 from gui_template.settings import APP_NAME, VERSION
+from gui_template.startup import PROFILER, span
 
 
 class MyMainWindow(QMainWindow):
@@ -40,7 +43,9 @@ class MyMainWindow(QMainWindow):
 
         self.setTitle(f'{APP_NAME} {VERSION}')
 
-        self.tab = MyTabWidget(self)
+        with span('MyTabWidget'):
+            self.tab = MyTabWidget(self)
+
         self.setCentralWidget(self.tab)
 
     def setTitle(self, text):
@@ -57,33 +62,60 @@ class MyMainWindow(QMainWindow):
             self.statusbar_right.setText(text)
 
     def closeEvent(self, event):
+        # the settings file is written by this program
+        if self.tab.watcher is not None:
+            self.tab.watcher.close()
+
         # save settings on close, just to be sure
         self.tab.settings.save()
+
+        # stop the running tasks that can be cancelled (e.g. loading a database),
+        # and wait until the others (e.g. saving the database) are finished
+        self.tab.tasks.cancelAll()
+        self.tab.tasks.waitForDone()
+
         return super().closeEvent(event)
 
 
-def GUI(app, splash):
+def GUI(app, splash, start_time=None):
     """
     sets up the GUI
 
     takes the app and splash screen as arg, to be able to close it after
     the GUI setup is finished
+
+    start_time is time.perf_counter() when the program was started, the
+    time until the event loop runs (time-to-interactive) is printed
     """
 
     # this is needed to show the taskbar icon in windows, and to give
     # the process the correct name
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(APP_NAME)
+    if sys.platform == 'win32':
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(APP_NAME)
+
+    with span('set_stylesheet'):
+        set_stylesheet(app)
 
-    set_stylesheet(app)
+    with span('MyMainWindow'):
+        window = MyMainWindow(app=app)
 
-    window = MyMainWindow(app=app)
-    set_window_icon(app)
+    with span('set_window_icon'):
+        set_window_icon(app)
 
-    window.show()
+    with span('show'):
+        window.show()
 
     # remove splashscreen
     splash.finish(window)
 
     print('successfully initialized GUI')
 
+    # called when the event loop has processed the events that show the window
+    if start_time is not None:
+        QTimer.singleShot(0, lambda: print(f'time to interactive: '
+                                           f'{time.perf_counter() - start_time:.3f} s'))
+
+    # writes the startup profile, quits in headless mode (see startup.py)
+    QTimer.singleShot(0, PROFILER.finish)
+
     sys.exit(app.exec_())
@@ -1,16 +1,14 @@
-import qdarkstyle
 from traceback import format_exc
-import datetime
 
 from PyQt5.QtWidgets import (QMessageBox,
                              QTableWidgetItem,
                              QListWidgetItem,
                              QLabel)
-from PyQt5.QtGui import QIcon, QPixmap
-from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtCore import Qt
 
-from gui_template.misc import is_null, convert_to_numeric
+from gui_template.model import TableModel, import_columns
 from gui_template.logger import logger
+from gui_template.assets import get_icon, get_pixmap, load_stylesheet
 
 
 class SortableTableItem(QTableWidgetItem):
@@ -31,23 +29,25 @@ class SortableTableItem(QTableWidgetItem):
 
 
 def set_window_icon(app):
-
-    icon = QIcon()
-    icon.addFile('assets/app-icon.png', QSize(256, 256))
-
-    app.setWindowIcon(icon)
+    app.setWindowIcon(get_icon('app-icon.png', 256))
 
 
 def set_stylesheet(app):
     """
     sets a dark theme for all GUI elements (qdarkstyle)
+
+    the stylesheet is cached on disk, see assets.load_stylesheet
     """
-    app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
+
+    app.setStyleSheet(load_stylesheet(app))
 
 
 def set_valid_label(label: QLabel, valid=True, height=20) -> None:
     """
     sets label to a green/red checkmark icon
+
+    the scaled icons are cached (see assets.get_pixmap), this
+    does not read any files after the first call
     """
 
     if valid:
@@ -56,12 +56,15 @@ def set_valid_label(label: QLabel, valid=True, height=20) -> None:
     else:
         icon_name = 'invalid-icon.png'
 
-    # NOTE: hardcoded path
-    icon = QPixmap(
-        f'(gui_template\\ui\\../../assets/{icon_name}').scaledToHeight(height,
-                                                                       Qt.SmoothTransformation)
+    pixmap = get_pixmap(icon_name, height)
+
+    # the label already shows this icon
+    current = label.pixmap()
 
-    label.setPixmap(icon)
+    if current is not None and current.cacheKey() == pixmap.cacheKey():
+        return
+
+    label.setPixmap(pixmap)
 
 
 def show_error_message(text='', heading='Error', title='Error',
@@ -168,60 +171,85 @@ def clear_table(table):
     table.clear()
 
 
-def populate_table(table, cols, vals, callback=None):
+def populate_table(table, cols, vals, callback=None, total=None, block_size=None):
     """
     populates table with data in cols, vals
 
     converts numerical strings to numerical to make sorting word as expected
     table is a QTableWidget
+
+    vals can be a list of rows, any iterator of rows or a sqlite3.Cursor
+    (or query.RowStream), the rows are converted and added in blocks of
+    block_size rows (default query.BLOCK_SIZE), so the rows don't need to
+    be fetched first
+    if cols is None, the column names are taken from the cursor
+
+    total is the number of rows (for the callback), the length of vals
+    is used in case it is a list
     """
 
-    N = len(vals)
+    # imports io (the modules for the database are not imported at startup)
+    from gui_template.query import BLOCK_SIZE, fetch_blocks, get_columns
+
+    if block_size is None:
+        block_size = BLOCK_SIZE
+
+    if cols is None:
+        cols = get_columns(vals)
+
+    if total is None and isinstance(vals, (list, tuple)):
+        total = len(vals)
+
     M = len(cols)
 
     clear_table(table)
 
-    table.setRowCount(N)
     table.setColumnCount(M)
 
-    for i, row in enumerate(vals):
-        for j, col in enumerate(cols):
+    if total is not None:
+        table.setRowCount(total)
 
-            val = vals[i][j]
+    step = max(1, (total or 0) // 1000)
 
-            # if the value is a representation of null or empty str / just whitespace
-            # display string [EMPTY] here, since it is needed in the update table at least
-            if val != '[EMPTY]' and (is_null(val) or (isinstance(val, str) and not val.strip())):
-                continue
+    # index of the first row in the current block
+    i0 = 0
 
-            if isinstance(val, datetime.datetime):
+    convert_column = import_columns().convert_column
 
-                # format 17-03-20 18:44:15
-                val_str = val.strftime('%d-%m-%Y %H:%M:%S')
+    for block in fetch_blocks(vals, block_size):
 
-                # use int timestamp for sorting
-                val = val.timestamp()
+        # in case the number of rows is not known (or was wrong)
+        if i0 + len(block) > table.rowCount():
+            table.setRowCount(i0 + len(block))
 
-            elif isinstance(val, datetime.timedelta):
+        # convert each column at once, zip(*block) transposes the rows
+        columns = [convert_column(n) for n in zip(*block)]
 
-                val_str = str(val)
-                val = val.total_seconds()
+        for i in range(len(block)):
+            for j, column in enumerate(columns):
 
-            else:
-                val = convert_to_numeric(val)
-                val_str = str(val)
+                # None if the value is a representation of null or empty str / just whitespace
+                val_str = column.text(i)
 
-            # QTableWidgetItem only accepts string values
-            # the default implementation only sorts according to string values
-            # SortableTableItem displays the first value,
-            # and uses the second one for sorting
-            item = SortableTableItem(val_str, val)
+                if val_str is None:
+                    continue
 
-            table.setItem(i, j, item)
+                # QTableWidgetItem only accepts string values
+                # the default implementation only sorts according to string values
+                # SortableTableItem displays the first value,
+                # and uses the second one for sorting
+                item = SortableTableItem(val_str, column.key(i))
 
-        # callback for each row
-        if callback:
-            callback(100 * i / (N * 1.1))
+                table.setItem(i0 + i, j, item)
+
+            # callback for every step rows (at most 1000 times)
+            if callback and total and not (i0 + i) % step:
+                callback(100 * (i0 + i) / (total * 1.1))
+
+        i0 += len(block)
+
+    # in case total was larger than the number of rows
+    table.setRowCount(i0)
 
     # set the column header names
     for j, col in enumerate(cols):
@@ -245,5 +273,72 @@ def populate_table(table, cols, vals, callback=None):
         callback(100)
 
 
+def populate_view(view, cols, vals, callback=None, total=None, block_size=None):
+    """
+    populates view with data in cols, vals using a TableModel
+
+    view is a QTableView (not a QTableWidget), the cells are formatted
+    when they are displayed, so this does not depend on the number of rows
+
+    vals can be a list of rows, any iterator of rows or a sqlite3.Cursor
+    (or query.RowStream), same as for populate_table
+    """
+
+    from gui_template.query import BLOCK_SIZE, fetch_blocks, get_columns
+
+    if block_size is None:
+        block_size = BLOCK_SIZE
+
+    if cols is None:
+        cols = get_columns(vals)
+
+    if total is None and isinstance(vals, (list, tuple)):
+        total = len(vals)
+
+    if callback:
+        callback(0)
+
+    model = view.model()
+
+    # a list is converted at once, other rows are added one block at a time
+    if isinstance(vals, (list, tuple)):
+        blocks = ()
+    else:
+        blocks = fetch_blocks(vals, block_size)
+        vals = []
+
+    if isinstance(model, TableModel):
+        model.setTable(cols, vals)
+    else:
+        model = TableModel(cols, vals, parent=view)
+        view.setModel(model)
+
+        # sorting is done by TableModel.sort when a header section is clicked
+        # section -1 keeps the original order until the user sorts
+        view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        view.setSortingEnabled(True)
+
+    for block in blocks:
+
+        model.appendRows(block)
+
+        if callback and total:
+            callback(min(90, 90 * model.rowCount() / total))
+
+    if callback:
+        callback(90)
+
+    # resizeRowsToContents would format every cell in the table,
+    # use a fixed row height instead
+    view.verticalHeader().setDefaultSectionSize(
+        view.verticalHeader().minimumSectionSize())
+
+    # only considers the first rows of each column (resizeContentsPrecision)
+    view.resizeColumnsToContents()
+
+    if callback:
+        callback(100)
+
+
 def get_list_items(listwidget) -> list:
     return [listwidget.item(i).text() for i in range(listwidget.count())]
@@ -1,12 +1,22 @@
-from PyQt5.QtWidgets import QTabWidget, QDialog
-from PyQt5.QtCore import Qt
+import os
+
+from PyQt5.QtWidgets import QTabWidget, QDialog, QTableWidget, QHeaderView, QShortcut
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import Qt, QTimer, QMimeData
 
 from gui_template.interface_form import Ui_TabWidget
 from gui_template.dialog_form import Ui_Dialog
-from gui_template.progress import progress
+from gui_template.progress import progress, MyProgressBar
+from gui_template.startup import span
+
+# NOTE: the modules for the database (io, query, advisor), the SQL profiler,
+# the tasks and the file watcher are imported where they are used, they
+# are not needed to show the window
 
 
-from gui_template.helper import populate_table
+from gui_template.helper import (populate_table, populate_view,
+                                 show_error_message, show_yes_no_dialog)
+from gui_template.model import LogModel, TableModel, TablePopulator
 from gui_template.folderdialog import BrowseDialog
 from gui_template.settings import (SETTINGS_PATH,
                                    Settings)
@@ -17,7 +27,20 @@ from gui_template.settings import (SETTINGS_PATH,
 #  no need to explicitly call logger.info()
 # this import should be the last import to prevent other modules from
 # outputting to logger
-from gui_template.logger import LOG_PATH, process_log_line
+from gui_template.logger import (LOG_BUFFER, LOG_INDEX, LEVEL_COLORS,
+                                 LOG_FILTER_DELAY, LOG_REFRESH_INTERVAL,
+                                 MAX_LOG_LINES, format_log_lines)
+
+
+def get_rate_str(rate) -> str:
+    """
+    throughput in MB/s for the status bar, empty string if rate is None
+    """
+
+    if rate is None:
+        return ''
+
+    return f' ({rate:.1f} MB/s)'
 
 
 class SeparateWindow(QDialog):
@@ -58,9 +81,11 @@ class MyTabWidget(QTabWidget):
         * all actions are defined as methods in this class
         * UI elements are accessed using the ui attribute
 
-        NOTE: no threading is used in this application.
-        Processes that take more time will have a modal progressbar to
-        prevent access to the GUI while the program is busy
+        NOTE: processes that take more time will have a modal progressbar to
+        prevent access to the GUI while the program is busy.
+        Long operations (e.g. loading and saving the database) run in a
+        worker thread using runTask, the GUI stays responsive and the progress
+        is sent to the progressbar using signals (see tasks.py)
 
         TODO: there are many methods in this class,
         maybe split up into multiple classes?
@@ -77,7 +102,9 @@ class MyTabWidget(QTabWidget):
         # which is generated from ui/interface.ui,
         # which is created using Qt Designer
         self.ui = Ui_TabWidget()
-        self.ui.setupUi(self)
+
+        with span('setupUi'):
+            self.ui.setupUi(self)
 
         # this handles the tab change actions
         # need to keep track of which tab was the last also,
@@ -89,8 +116,24 @@ class MyTabWidget(QTabWidget):
         self.setCurrentIndex(self.current_tab)
         self.currentChanged.connect(self.mainTabChange)
 
-        # open this separate dialog window when this is clicked
-        self.SeparateWindow = SeparateWindow(self.window)
+        # adds rows to a table in batches, see displayTableStream
+        self.populator = None
+
+        # runs long operations in worker threads, see runTask and the tasks property
+        self.task_manager = None
+
+        # the loaded database (io.DatabaseHandler), see loadDatabase
+        self.db = None
+
+        # thread-safe queries on the loaded database (query.ConnectionPool)
+        self.pool = None
+
+        # statistics for the SQL statements on the loaded database,
+        # see setupSQLTab and the profiler property
+        self.sql_profiler = None
+
+        # separate dialog window, created when it is shown the first time
+        self.SeparateWindow = None
 
         # loads settings from data/settings.txt
         # if file does not exist, uses default settings
@@ -98,14 +141,65 @@ class MyTabWidget(QTabWidget):
         self.settings = Settings(self, SETTINGS_PATH)
 
         # load settings after the settings attribute has been created
-        self.settings.load()
+        with span('settings.load'):
+            self.settings.load()
+
+        # notices when the settings file or the loaded database are
+        # changed by another program, see fileChanged
+        # started when the event loop runs (the window is shown), see startWatcher
+        self.watcher = None
+        QTimer.singleShot(0, self.startWatcher)
 
         # connect all actions to their UI elements
-        self.setupAllTabs()
+        with span('setupAllTabs'):
+            self.setupAllTabs()
 
         self.window.setStatus('Nothing loaded', side='left')
         self.window.setStatus('No data', side='right')
 
+    @property
+    def tasks(self):
+        """
+        the tasks.TaskManager, created when the first task is started
+        """
+
+        if self.task_manager is None:
+
+            from gui_template.tasks import TaskManager
+
+            self.task_manager = TaskManager(self)
+
+        return self.task_manager
+
+    @property
+    def profiler(self):
+        """
+        the profiler.SQLProfiler, created when it is used the first time
+        """
+
+        if self.sql_profiler is None:
+
+            from gui_template.profiler import SQLProfiler
+
+            self.sql_profiler = SQLProfiler()
+
+        return self.sql_profiler
+
+    def startWatcher(self):
+        """
+        creates the watcher.FileWatcher and watches the settings file,
+        called once the event loop runs (or before a database is loaded)
+        """
+
+        if self.watcher is not None:
+            return
+
+        from gui_template.watcher import FileWatcher
+
+        self.watcher = FileWatcher(self)
+        self.watcher.changed.connect(self.fileChanged)
+        self.watcher.watch(SETTINGS_PATH)
+
     def mainTabChange(self, idx):
         """
         this method is called whenever the tab changes in the main app
@@ -113,38 +207,73 @@ class MyTabWidget(QTabWidget):
         """
         print(f'changed from tab {self.current_tab} → {idx}')
 
+        # the tabs are set up when they are shown the first time
+        self.setupTab(idx)
+
+        # new lines are only read while the log tab is shown
+        if self.current_tab == self.indexOf(self.ui.LogTab):
+            self.log_timer.stop()
+
         if idx == self.indexOf(self.ui.LogTab):
-            self.setupLogTab()
+            self.refreshLogTab()
+            self.log_timer.start()
+
+        if idx == self.indexOf(self.ui.SQLTab):
+            self.refreshSQLTab()
 
         self.current_tab = idx
 
     def setupAllTabs(self):
         """
-        calls the setup method for all tabs in the correct order
+        sets up the current tab, the other tabs are set up
+        when they are shown the first time (see setupTab)
+
+        NOTE: the widgets of all tabs are created by ui.setupUi, only the
+        models, connections and timers of the tabs are created later
         """
 
-        self.setupMainTab()
-        self.setupLogTab()
+        # index of each tab that has not been set up: setup method
+        self.tab_setup = {self.indexOf(self.ui.MainTab): self.setupMainTab,
+                          self.indexOf(self.ui.SQLTab): self.setupSQLTab,
+                          self.indexOf(self.ui.LogTab): self.setupLogTab}
 
-    def setupMainTab(self):
+        self.setupTab(self.currentIndex())
 
-        self.ui.TestButton.clicked.connect(self.SeparateWindow.show)
+    def setupTab(self, idx):
+        """
+        calls the setup method for the tab at idx in case it has not been set up
+        """
 
-        def long_func():
+        setup = self.tab_setup.pop(idx, None)
+
+        if setup is not None:
+            setup()
 
-            with progress(self, 'Long process...') as pb:
+    def showSeparateWindow(self):
 
-                def cb(val):
+        # the dialog is only created in case it is used
+        if self.SeparateWindow is None:
+            self.SeparateWindow = SeparateWindow(self.window)
 
-                    pb.setValue(val)
-                    pb.update()
+        self.SeparateWindow.show()
+
+    def setupMainTab(self):
+
+        self.ui.TestButton.clicked.connect(self.showSeparateWindow)
+
+        def long_func():
+
+            # callback raises TaskCancelled if Cancel is clicked
+            def func(callback):
 
                 import time
 
                 for n in range(100):
 
                     time.sleep(0.05)
-                    cb(n)
+                    callback(n)
+
+            self.runTask(func, description='Long process...', cancellable=True)
 
         self.ui.ShowProgressButton.clicked.connect(long_func)
 
@@ -166,27 +295,270 @@ class MyTabWidget(QTabWidget):
 
         self.ui.FilesSelectButton.clicked.connect(get_files)
 
+    def setupSQLTab(self):
+        """
+        sets up the SQL tab, which shows the statistics from self.profiler
+
+        the table is refreshed each time the tab is accessed, see mainTabChange
+        """
+
+        def reset():
+
+            self.profiler.reset()
+            self.ui.SQLPlanBrowser.clear()
+            self.refreshSQLTab()
+
+        def keep_indexes(checked):
+
+            if self.db is not None:
+                self.db.keep_indexes = checked
+
+        self.ui.ExplainButton.clicked.connect(self.explainSlowest)
+        self.ui.AdviseIndexesButton.clicked.connect(self.adviseIndexes)
+        self.ui.KeepIndexesCheckBox.toggled.connect(keep_indexes)
+        self.ui.ResetProfilerButton.clicked.connect(reset)
+
+    def refreshSQLTab(self):
+
+        cols = ['Statement', 'Calls', 'Total (ms)', 'Mean (ms)', 'p95 (ms)', 'Rows']
+
+        vals = [(n['sql'], n['calls'], round(1000 * n['total'], 3),
+                 round(1000 * n['mean'], 3), round(1000 * n['p95'], 3), n['rows'])
+                for n in self.profiler.report()]
+
+        table = self.ui.SQLTable
+
+        # populate_table is much slower if the table is sorted
+        table.setSortingEnabled(False)
+        populate_table(table, cols, vals)
+        table.setSortingEnabled(True)
+
+    def explainSlowest(self):
+        """
+        shows the query plan (EXPLAIN QUERY PLAN) of the slowest statements
+        """
+
+        browser = self.ui.SQLPlanBrowser
+
+        if self.pool is None:
+            browser.setPlainText('No database is loaded')
+            return
+
+        lines = []
+
+        with self.pool.connection() as connection:
+
+            for row, plan in self.profiler.explain_slowest(connection):
+
+                lines.append(f'p95 {1000 * row["p95"]:.2f} ms, '
+                             f'{row["calls"]} calls: {row["sql"]}')
+
+                lines.extend(f'    {n}' for n in plan or ['(no query plan)'])
+                lines.append('')
+
+        browser.setPlainText('\n'.join(lines) or 'No statements have been timed')
+
+    def adviseIndexes(self):
+        """
+        shows the indexes that advisor.IndexAdvisor proposes for the
+        recorded statements, and creates them in the in-memory database
+        in case the user accepts
+        """
+
+        browser = self.ui.SQLPlanBrowser
+
+        if self.db is None or self.db.lazy:
+            browser.setPlainText('No database is loaded (or it is opened read-only)')
+            return
+
+        from gui_template.advisor import IndexAdvisor
+
+        advisor = IndexAdvisor(self.db, self.profiler)
+        proposals = advisor.propose()
+
+        if not proposals:
+            browser.setPlainText('No indexes to suggest, the recorded statements '
+                                 'do not scan any large tables')
+            return
+
+        lines = []
+
+        for n in proposals:
+            lines.append(f'{n["sql"]}')
+            lines.append(f'    {n["benefit"]:.3f} sec in {len(n["statements"])} statements')
+            lines.extend(f'    {k}' for k in n['statements'])
+            lines.append('')
+
+        browser.setPlainText('\n'.join(lines))
+
+        if not show_yes_no_dialog(self, 'Create indexes',
+                                  f'Create {len(proposals)} indexes in the loaded database?'):
+            return
+
+        def create(proposals, callback):
+            return advisor.create(proposals)
+
+        def created(names):
+            self.window.setStatus(f'Created {len(names)} indexes', side='left')
+
+        return self.runTask(create, proposals, description='Creating indexes...',
+                            result=created)
+
     def setupLogTab(self):
         """
         sets up the log tab
 
-        reloads each time the tab is accessed
+        the lines are shown with a LogModel, which keeps the last
+        MAX_LOG_LINES lines, only the lines that were logged since the
+        last refresh are read from the in-memory log (logger.LOG_BUFFER)
+
+        the log can be filtered by level and text, the matching lines are
+        found with the index of all records (logger.LOG_INDEX)
+        """
+
+        # number of lines in LOG_BUFFER that have been read
+        self.log_position = 0
+
+        # (levels, text) if the log is filtered, see filterLog
+        self.log_filter = None
+
+        # number of records in LOG_INDEX that have been searched
+        self.log_index_position = 0
+
+        self.log_model = LogModel(max_lines=MAX_LOG_LINES, colors=LEVEL_COLORS, parent=self)
+
+        self.ui.LogView.setModel(self.log_model)
+
+        # with a fixed row height the view does not need to
+        # look at the rows to lay them out
+        header = self.ui.LogView.verticalHeader()
+        header.setSectionResizeMode(QHeaderView.Fixed)
+        header.setDefaultSectionSize(self.ui.LogView.fontMetrics().height() + 2)
+
+        # the log is filtered once the text has not changed for LOG_FILTER_DELAY,
+        # not after every key press
+        self.log_filter_timer = QTimer(self)
+        self.log_filter_timer.setSingleShot(True)
+        self.log_filter_timer.setInterval(LOG_FILTER_DELAY)
+        self.log_filter_timer.timeout.connect(self.filterLog)
+
+        self.ui.LogLevelComboBox.currentIndexChanged.connect(self.filterLog)
+        self.ui.LogFilterLineEdit.textChanged.connect(self.log_filter_timer.start)
+
+        # copies the selected lines as text and rich text
+        QShortcut(QKeySequence.Copy, self.ui.LogView, activated=self.copyLogSelection)
+
+        # checks for new lines while the log tab is shown
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_REFRESH_INTERVAL)
+        self.log_timer.timeout.connect(self.refreshLogTab)
+
+    def filterLog(self):
+        """
+        shows the lines with the selected level that contain the filter text
+        """
+
+        # in case the level was changed while the text was typed
+        self.log_filter_timer.stop()
+
+        text = self.ui.LogFilterLineEdit.text().strip()
+        levels = None
+
+        if self.ui.LogLevelComboBox.currentIndex() > 0:
+
+            levels = [self.ui.LogLevelComboBox.currentText()]
+
+            if levels == ['ERROR']:
+                levels.append('CRITICAL')
+
+        if levels is None and not text:
+            self.log_filter = None
+        else:
+            self.log_filter = (levels, text)
+
+        # read all lines again
+        self.log_model.clear()
+        self.log_position = 0
+        self.log_index_position = 0
+
+        self.refreshLogTab()
+
+    def readLogLines(self) -> list:
+        """
+        returns the lines that were logged since the last call,
+        only the lines that match the filter (if any)
+        """
+
+        if self.log_filter is None:
+
+            lines, self.log_position = LOG_BUFFER.read(self.log_position)
+
+            return lines
+
+        levels, text = self.log_filter
+
+        # records are added (and the oldest records dropped) in the logging thread,
+        # the record numbers are only valid while the lock is held
+        with LOG_INDEX.lock:
+
+            n = len(LOG_INDEX)
+
+            # the oldest records were dropped from the index, search all records again
+            if n < self.log_index_position:
+                self.log_model.clear()
+                self.log_index_position = 0
+
+            matches = LOG_INDEX.search(levels=levels, text=text, first=self.log_index_position)
+
+            self.log_index_position = n
+
+            # messages with a traceback have more than one line
+            return [line for i in matches[-MAX_LOG_LINES:] for line in LOG_INDEX.line(i).splitlines()]
+
+    def refreshLogTab(self):
+        """
+        appends the new lines in the log to the log tab
+        """
+
+        lines = self.readLogLines()
+
+        errors = LOG_INDEX.count('ERROR') + LOG_INDEX.count('CRITICAL')
+        warnings = LOG_INDEX.count('WARNING')
+
+        self.window.setStatus(f'{errors} errors, {warnings} warnings', side='right')
+
+        if not lines:
+            return
+
+        scrollbar = self.ui.LogView.verticalScrollBar()
+
+        # only follow the new lines in case the last line was visible
+        at_end = scrollbar.value() == scrollbar.maximum()
+
+        self.log_model.appendLines(lines)
+
+        if at_end:
+            self.ui.LogView.scrollToBottom()
+
+    def copyLogSelection(self):
+        """
+        copies the selected lines in the log tab to the clipboard,
+        as plain text and as rich text (same colors as in the log tab)
         """
 
-        textbrowser = self.ui.LogBrowser
+        rows = sorted(n.row() for n in self.ui.LogView.selectionModel().selectedRows())
 
-        # log file is deleted on program startup, so it cannot become too long
-        # so it's safe to just read this from scratch each time
-        with open(LOG_PATH, 'r', encoding='utf-8') as f:
+        if not rows:
+            return
 
-            lines = f.read().split('\n')
+        lines = [self.log_model.lines[n] for n in rows]
+        formatted, _ = format_log_lines(lines)
 
-            rich_text = '<br>'.join([process_log_line(n) for n in lines])
-            textbrowser.setText(rich_text)
+        data = QMimeData()
+        data.setText('\n'.join(lines))
+        data.setHtml(f'<span style="font-family:Consolas">{"<br>".join(formatted)}</span>')
 
-        # ensure that the last line is visible
-        textbrowser.verticalScrollBar().setValue(
-            textbrowser.verticalScrollBar().maximum())
+        self.app.clipboard().setMimeData(data)
 
     def disableUI(self):
         """
@@ -198,11 +570,153 @@ class MyTabWidget(QTabWidget):
 
         pass
 
-    def displayTable(self, table, cols, vals):
+    def runTask(self, func, *args, description='Progress', result=None,
+                cancellable=False, **kwargs):
+        """
+        runs func(*args, callback=callback, **kwargs) in a worker thread
+        and shows a progressbar until it is finished
+
+        callback(val) updates the progressbar (val in percent), and raises
+        tasks.TaskCancelled in case the user clicked Cancel (only shown if
+        cancellable=True)
+
+        result is called in the GUI thread with the return value of func,
+        exceptions are shown with show_error_message
+
+        returns the tasks.Task
+        """
+
+        from gui_template.tasks import Task
+
+        task = Task(func, *args, cancellable=cancellable, **kwargs)
+
+        if cancellable:
+            pb = MyProgressBar(self, description=description, cancel=task.cancel)
+        else:
+            pb = MyProgressBar(self, description=description)
+
+        def error(e, exception_str):
+            show_error_message(f'{description}\n\n{exception_str}')
+
+        task.signals.progress.connect(pb.setValue)
+        task.signals.error.connect(error)
+        task.signals.cancelled.connect(lambda: print(f'cancelled: {description}'))
+        task.signals.finished.connect(pb.finish)
+
+        if result is not None:
+            task.signals.result.connect(result)
+
+        return self.tasks.start(task)
+
+    def loadDatabase(self, path, callback=None):
+        """
+        loads the SQLite database at path into memory in a worker thread
+
+        callback is called with the io.DatabaseHandler when it is loaded
+        """
+
+        from gui_template.io import DatabaseHandler
+        from gui_template.query import ConnectionPool
+
+        # the database file is watched when it is loaded
+        self.startWatcher()
+
+        def load(path, callback):
+
+            # see io.DatabaseHandler
+            def progress(status, remaining, total):
+                callback(100 * (total - remaining) / max(total, 1))
+
+            return DatabaseHandler(path, progress=progress,
+                                   callback=self.profiler.trace)
+
+        def loaded(db):
+
+            # the previous database is deleted from memory when
+            # its last connection is closed
+            if self.pool is not None:
+                self.pool.close()
+
+            if self.db is not None:
+                self.watcher.unwatch(self.db.path)
+                self.db.close()
+
+            self.db = db
+            self.watcher.watch(db.path)
+            self.db.keep_indexes = self.ui.KeepIndexesCheckBox.isChecked()
+            self.pool = ConnectionPool(db, profiler=self.profiler)
+            self.window.setStatus(f'Loaded {db.path}{get_rate_str(db.rate)}', side='left')
+
+            if callback:
+                callback(db)
+
+        return self.runTask(load, path, description='Loading database...',
+                            result=loaded, cancellable=True)
+
+    def saveDatabase(self, callback=None):
+        """
+        saves the loaded database to its file in a worker thread
+
+        callback is called without arguments when the database is saved
+        """
+
+        def save(db, callback):
+
+            def progress(status, remaining, total):
+                callback(100 * (total - remaining) / max(total, 1))
+
+            db.save(progress=progress)
+
+        def saved(_):
+
+            self.window.setStatus(f'Saved {self.db.path}{get_rate_str(self.db.rate)}', side='left')
+
+            if callback:
+                callback()
+
+        # the changes to the file are made by this program
+        path = self.db.path
+        self.watcher.suspend(path)
+
+        task = self.runTask(save, self.db, description='Saving database...',
+                            result=saved)
+
+        task.signals.finished.connect(lambda: self.watcher.resume(path))
+
+        return task
+
+    def fileChanged(self, paths):
+        """
+        called by the FileWatcher when watched files were changed by another program
+        """
+
+        for path in paths:
+
+            print(f'{path} was changed by another program')
+
+            if os.path.abspath(path) == os.path.abspath(SETTINGS_PATH):
+                self.settings.load()
+
+            elif self.db is not None and os.path.abspath(path) == os.path.abspath(self.db.path):
+                self.window.setStatus(f'{self.db.path} was changed by another program, '
+                                      'load it again to see the changes', side='left')
+
+    def displayTable(self, table, cols, vals, total=None):
         """
         populates a QTableWidget with a progress indicator
+
+        if table is a QTableView (and not a QTableWidget), the data is
+        shown using a TableModel, see helper.populate_view
+
+        vals can also be a sqlite3.Cursor or query.RowStream, the rows are
+        fetched in blocks (cols can be None in this case), pass the number
+        of rows as total to show the progress
         """
 
+        if not isinstance(table, QTableWidget):
+            populate_view(table, cols, vals, total=total)
+            return
+
         with progress(self, 'Displaying table...') as pb:
 
             def callback(x):
@@ -212,4 +726,66 @@ class MyTabWidget(QTabWidget):
             callback(0)
 
             populate_table(table, cols, vals,
-                           callback=callback)
+                           callback=callback, total=total)
+
+    def displayTableStream(self, view, cols, rows, callback=None):
+        """
+        populates a QTableView from an iterator or sqlite3.Cursor without
+        blocking the GUI, the rows are added in batches (see model.TablePopulator)
+
+        the first rows are shown directly, the number of rows loaded so far
+        is shown in the status bar
+
+        callback is called with the stats dict when all rows are loaded
+        (or when cancelDisplay is called), it contains the time to the first row
+        and the total time, errors while fetching the rows are shown with
+        show_error_message (the rows fetched so far stay in the view)
+
+        if cols is None, the column names are taken from the cursor
+
+        returns the TablePopulator
+        """
+
+        # stop the previous one, if it is still running
+        self.cancelDisplay()
+
+        if cols is None:
+
+            from gui_template.query import get_columns
+
+            cols = get_columns(rows)
+
+        model = TableModel(cols, [], parent=view)
+        view.setModel(model)
+
+        self.populator = TablePopulator(model, rows, parent=self)
+
+        def progress(n):
+            self.window.setStatus(f'{n} rows', side='right')
+
+        def finished(stats):
+
+            if stats['error'] is not None:
+                show_error_message(f'Could not display all rows: {stats["error"]}')
+
+            print(f'displayed {stats["rows"]} rows in {stats["total"]:.2f} sec, '
+                  f'first rows after {stats["first_row"] or 0:.3f} sec')
+
+            if callback:
+                callback(stats)
+
+        self.populator.progress.connect(progress)
+        self.populator.finished.connect(finished)
+
+        self.populator.start()
+
+        return self.populator
+
+    def cancelDisplay(self):
+        """
+        stops adding rows to the table, see displayTableStream
+        """
+
+        if self.populator is not None:
+            self.populator.cancel()
+            self.populator = None
@@ -57,22 +57,78 @@ class Ui_TabWidget(object):
         icon2 = QtGui.QIcon()
         icon2.addPixmap(QtGui.QPixmap("gui_template\\ui\\../../assets/tools-icon-inverted.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
         TabWidget.addTab(self.ToolsTab, icon2, "")
+        self.SQLTab = QtWidgets.QWidget()
+        self.SQLTab.setObjectName("SQLTab")
+        self.gridLayout_4 = QtWidgets.QGridLayout(self.SQLTab)
+        self.gridLayout_4.setObjectName("gridLayout_4")
+        self.SQLTable = QtWidgets.QTableWidget(self.SQLTab)
+        self.SQLTable.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.SQLTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.SQLTable.setObjectName("SQLTable")
+        self.SQLTable.setColumnCount(0)
+        self.SQLTable.setRowCount(0)
+        self.SQLTable.setSortingEnabled(True)
+        self.gridLayout_4.addWidget(self.SQLTable, 0, 0, 1, 5)
+        spacerItem2 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.gridLayout_4.addItem(spacerItem2, 1, 0, 1, 1)
+        self.KeepIndexesCheckBox = QtWidgets.QCheckBox(self.SQLTab)
+        self.KeepIndexesCheckBox.setObjectName("KeepIndexesCheckBox")
+        self.gridLayout_4.addWidget(self.KeepIndexesCheckBox, 1, 1, 1, 1)
+        self.AdviseIndexesButton = QtWidgets.QPushButton(self.SQLTab)
+        self.AdviseIndexesButton.setObjectName("AdviseIndexesButton")
+        self.gridLayout_4.addWidget(self.AdviseIndexesButton, 1, 2, 1, 1)
+        self.ExplainButton = QtWidgets.QPushButton(self.SQLTab)
+        self.ExplainButton.setObjectName("ExplainButton")
+        self.gridLayout_4.addWidget(self.ExplainButton, 1, 3, 1, 1)
+        self.ResetProfilerButton = QtWidgets.QPushButton(self.SQLTab)
+        self.ResetProfilerButton.setObjectName("ResetProfilerButton")
+        self.gridLayout_4.addWidget(self.ResetProfilerButton, 1, 4, 1, 1)
+        self.SQLPlanBrowser = QtWidgets.QTextBrowser(self.SQLTab)
+        font = QtGui.QFont()
+        font.setFamily("Consolas")
+        font.setPointSize(9)
+        self.SQLPlanBrowser.setFont(font)
+        self.SQLPlanBrowser.setFrameShadow(QtWidgets.QFrame.Plain)
+        self.SQLPlanBrowser.setLineWrapMode(QtWidgets.QTextEdit.NoWrap)
+        self.SQLPlanBrowser.setObjectName("SQLPlanBrowser")
+        self.gridLayout_4.addWidget(self.SQLPlanBrowser, 2, 0, 1, 5)
+        icon3 = QtGui.QIcon()
+        icon3.addPixmap(QtGui.QPixmap("gui_template\\ui\\../../assets/sql-icon-inverted.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
+        TabWidget.addTab(self.SQLTab, icon3, "")
         self.LogTab = QtWidgets.QWidget()
         self.LogTab.setObjectName("LogTab")
         self.gridLayout_3 = QtWidgets.QGridLayout(self.LogTab)
         self.gridLayout_3.setObjectName("gridLayout_3")
-        self.LogBrowser = QtWidgets.QTextBrowser(self.LogTab)
+        self.LogLevelComboBox = QtWidgets.QComboBox(self.LogTab)
+        self.LogLevelComboBox.setObjectName("LogLevelComboBox")
+        self.LogLevelComboBox.addItem("")
+        self.LogLevelComboBox.addItem("")
+        self.LogLevelComboBox.addItem("")
+        self.LogLevelComboBox.addItem("")
+        self.LogLevelComboBox.addItem("")
+        self.gridLayout_3.addWidget(self.LogLevelComboBox, 0, 0, 1, 1)
+        self.LogFilterLineEdit = QtWidgets.QLineEdit(self.LogTab)
+        self.LogFilterLineEdit.setClearButtonEnabled(True)
+        self.LogFilterLineEdit.setObjectName("LogFilterLineEdit")
+        self.gridLayout_3.addWidget(self.LogFilterLineEdit, 0, 1, 1, 1)
+        self.LogView = QtWidgets.QTableView(self.LogTab)
         font = QtGui.QFont()
         font.setFamily("Consolas")
         font.setPointSize(9)
-        self.LogBrowser.setFont(font)
-        self.LogBrowser.setFrameShadow(QtWidgets.QFrame.Plain)
-        self.LogBrowser.setLineWrapMode(QtWidgets.QTextEdit.NoWrap)
-        self.LogBrowser.setObjectName("LogBrowser")
-        self.gridLayout_3.addWidget(self.LogBrowser, 0, 0, 1, 1)
-        icon3 = QtGui.QIcon()
-        icon3.addPixmap(QtGui.QPixmap("gui_template\\ui\\../../assets/log-icon-inverted.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
-        TabWidget.addTab(self.LogTab, icon3, "")
+        self.LogView.setFont(font)
+        self.LogView.setFrameShadow(QtWidgets.QFrame.Plain)
+        self.LogView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.LogView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.LogView.setShowGrid(False)
+        self.LogView.setWordWrap(False)
+        self.LogView.setObjectName("LogView")
+        self.LogView.horizontalHeader().setVisible(False)
+        self.LogView.horizontalHeader().setStretchLastSection(True)
+        self.LogView.verticalHeader().setVisible(False)
+        self.gridLayout_3.addWidget(self.LogView, 1, 0, 1, 2)
+        icon4 = QtGui.QIcon()
+        icon4.addPixmap(QtGui.QPixmap("gui_template\\ui\\../../assets/log-icon-inverted.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
+        TabWidget.addTab(self.LogTab, icon4, "")
 
         self.retranslateUi(TabWidget)
         TabWidget.setCurrentIndex(0)
@@ -88,4 +144,15 @@ class Ui_TabWidget(object):
         TabWidget.setTabText(TabWidget.indexOf(self.MainTab), _translate("TabWidget", "Main"))
         TabWidget.setTabText(TabWidget.indexOf(self.SettingsTab), _translate("TabWidget", "Settings"))
         TabWidget.setTabText(TabWidget.indexOf(self.ToolsTab), _translate("TabWidget", "Tools"))
+        self.KeepIndexesCheckBox.setText(_translate("TabWidget", "Save indexes to file"))
+        self.AdviseIndexesButton.setText(_translate("TabWidget", "Suggest indexes"))
+        self.ExplainButton.setText(_translate("TabWidget", "Explain slowest"))
+        self.ResetProfilerButton.setText(_translate("TabWidget", "Reset"))
+        TabWidget.setTabText(TabWidget.indexOf(self.SQLTab), _translate("TabWidget", "SQL"))
+        self.LogLevelComboBox.setItemText(0, _translate("TabWidget", "All levels"))
+        self.LogLevelComboBox.setItemText(1, _translate("TabWidget", "DEBUG"))
+        self.LogLevelComboBox.setItemText(2, _translate("TabWidget", "INFO"))
+        self.LogLevelComboBox.setItemText(3, _translate("TabWidget", "WARNING"))
+        self.LogLevelComboBox.setItemText(4, _translate("TabWidget", "ERROR"))
+        self.LogFilterLineEdit.setPlaceholderText(_translate("TabWidget", "Filter"))
         TabWidget.setTabText(TabWidget.indexOf(self.LogTab), _translate("TabWidget", "Log"))
@@ -3,25 +3,173 @@ import shutil
 import sqlite3
 import datetime
 import json
+import struct
+import hashlib
+import zlib
+import codecs
+import time
+import threading
+import uuid
+import fnmatch
 
 from pathlib import Path
-from typing import Union
-
-# tries to open files using these encodings, in order
-# break loop if the operation using the loaded data succeeded
-# this is not fool-proof, should use something like chardet to
-# detect endcodings in case this becomes an issue
+from typing import Iterator, Union
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from gui_template.cache import (FILE_CACHE, STEP_INTERVAL, TRANSFER_RATES,
+                                get_file_signature)
+from gui_template.misc import divide_chunks
+
+# faster JSON parsers are used in case they are installed, see parse_json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# encodings that load_json tries (in order) in case the encoding could not be
+# detected from a byte order mark or the null bytes (UTF-16 and UTF-32)
 # NOTE: ANSI means default encoding for the system:
 # cp1252 for Windows using western languages
-POSSIBLE_ENCODINGS = ['utf_8', 'utf_8_sig',
-                      'utf_16_be', 'utf_16_le', 'utf_16',
-                      'ascii', 'cp1252']
+POSSIBLE_ENCODINGS = ['utf_8', 'cp1252']
+
+# byte order marks, UTF-32 must be checked before UTF-16 (same first bytes)
+BYTE_ORDER_MARKS = [(codecs.BOM_UTF8, 'utf_8_sig'),
+                    (codecs.BOM_UTF32_LE, 'utf_32'),
+                    (codecs.BOM_UTF32_BE, 'utf_32'),
+                    (codecs.BOM_UTF16_LE, 'utf_16'),
+                    (codecs.BOM_UTF16_BE, 'utf_16')]
+
+# number of parsed files that load_json keeps
+JSON_CACHE_SIZE = 32
+
+# path: (signature, object), see load_json
+JSON_CACHE = {}
+JSON_CACHE_LOCK = threading.Lock()
+
+
+# number of threads that process_input uses to list folders on network drives
+SCAN_WORKERS = 16
+
+# number of files that are stat-ed at a time by scan_folder
+SCAN_BATCH_SIZE = 256
+
+# file in a folder, see scan_folder
+FileEntry = namedtuple('FileEntry', ['path', 'size', 'mtime_ns'])
+
+# limits for the number of pages per step in DatabaseHandler.backup
+MIN_BACKUP_PAGES = 16
+MAX_BACKUP_PAGES = 65536
+
+# maximum size of the memory map for databases opened with lazy=True,
+# SQLite limits this to its compile-time maximum (2 GB by default)
+MMAP_SIZE = 2 ** 31
+
+# number of pages that are read at a time to hash a database file, see get_file_page_hashes
+HASH_CHUNK_PAGES = 1024
+
+# DatabaseHandler.save writes the original content of the pages that are
+# changed to this file before the database file is modified
+# NOTE: don't use the suffix "-journal", SQLite uses that for its own journal files
+DELTA_JOURNAL_SUFFIX = '.delta-journal'
+DELTA_JOURNAL_MAGIC = b'DELTAJ01'
+
+
+def detect_encoding(data: bytes) -> Union[str, None]:
+    """
+    returns the encoding of data (bytes of a JSON file) based on the byte
+    order mark, or the pattern of null bytes in the first four bytes
+    (a JSON text starts with an ASCII character, see RFC 4627)
+
+    returns None in case the encoding is not UTF-16 or UTF-32 and
+    there is no UTF-8 byte order mark
+    """
+
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if data.startswith(bom):
+            return encoding
+
+    head = data[:4]
+
+    if len(head) == 4:
+
+        if head[:3] == b'\x00\x00\x00':
+            return 'utf_32_be'
+
+        if head[1:] == b'\x00\x00\x00':
+            return 'utf_32_le'
+
+    if len(head) >= 2:
+
+        if head[0] == 0:
+            return 'utf_16_be'
+
+        if head[1] == 0:
+            return 'utf_16_le'
+
+    return None
+
+
+def parse_json(data: bytes) -> object:
+    """
+    decodes data (see detect_encoding) and parses the JSON text
+
+    uses orjson or ujson if they are installed, falls back to json
+    in case they can't parse the text (e.g. NaN)
+
+    raises ValueError in case data is not valid JSON in any of the encodings
+    """
+
+    encoding = detect_encoding(data)
+
+    if encoding is None:
+
+        for encoding in POSSIBLE_ENCODINGS:
+
+            try:
+                text = data.decode(encoding)
+                break
+
+            except UnicodeDecodeError:
+                continue
+
+        else:
+            raise ValueError('could not detect the encoding')
+
+    else:
+        text = data.decode(encoding)
+
+    for backend in (orjson, ujson):
+
+        if backend is None:
+            continue
+
+        try:
+            return backend.loads(text)
+
+        # json might accept this
+        except ValueError:
+            break
+
+    return json.loads(text)
 
 
 def load_json(path: Union[Path, str]) -> object:
     """
     reads a .json file and returns the object
-    from json.load(file)
+    from json.loads
+
+    the file is read once, the encoding is detected from the content
+    (see detect_encoding)
+
+    the result is cached, the file is only read again in case its size or
+    modification time has changed (this only calls os.stat)
+    NOTE: the same object is returned each time, copy it before modifying it
 
     Returns False in case the file could not be loaded using
     any of the encodings listen in io.POSSIBLE_ENCODINGS
@@ -31,15 +179,35 @@ def load_json(path: Union[Path, str]) -> object:
     path : Union[Path, str]
     """
 
-    for enc in POSSIBLE_ENCODINGS:
-        with open(path, encoding=enc) as f:
+    path = os.path.abspath(path)
+    signature = get_file_signature(path)
 
-            try:
-                return json.loads(f)
-            except:
-                continue
+    with JSON_CACHE_LOCK:
+        cached = JSON_CACHE.get(path)
 
-    return False
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    try:
+        obj = parse_json(data)
+
+    except ValueError:
+        return False
+
+    with JSON_CACHE_LOCK:
+
+        # the oldest entry is removed
+        JSON_CACHE.pop(path, None)
+
+        if len(JSON_CACHE) >= JSON_CACHE_SIZE:
+            JSON_CACHE.pop(next(iter(JSON_CACHE)))
+
+        JSON_CACHE[path] = (signature, obj)
+
+    return obj
 
 
 def last_modified(path: Union[Path, str], prefix='modified: ') -> str:
@@ -58,12 +226,19 @@ def last_modified(path: Union[Path, str], prefix='modified: ') -> str:
     return f'{prefix}{time_str}'
 
 
-def has_changed(path: Union[Path, str], last: str) -> bool:
+def has_changed(path: Union[Path, str], last: Union[str, tuple]) -> bool:
     """
     Checks if path has changed on disk.
-    last is the previous timestamp to compare with.
+    last is the previous timestamp to compare with, either a string from
+    last_modified (one second resolution) or a (size, mtime_ns) tuple
+    from cache.get_file_signature
+
+    NOTE: use watcher.FileWatcher instead of calling this repeatedly
     """
 
+    if isinstance(last, tuple):
+        return get_file_signature(path) != last
+
     return last_modified(path, prefix='') != last
 
 
@@ -79,8 +254,13 @@ def is_local_path(path: Union[Path, str]) -> bool:
     and parse output...
 
     path can be a folder or a file
+
+    paths without a drive letter (Linux and macOS) are considered local
     """
 
+    if os.name != 'nt':
+        return True
+
     # this works for both Path and str
     # Z:\NETWORK DRIVE\folder\etc → Z
     # C:\Users\user\folder\etc → C
@@ -92,7 +272,174 @@ def is_local_path(path: Union[Path, str]) -> bool:
     return False
 
 
-def process_input(args, ext='') -> tuple:
+def iter_directory(folder, ext='', pattern=None, recursive=False, folders=None) -> Iterator[os.DirEntry]:
+    """
+    generator that lists folder with os.scandir and yields an os.DirEntry
+    for the files with extension ext (can be tuple of strings) whose
+    name matches the glob pattern
+
+    if recursive is True, the paths of the subfolders are appended to
+    the list folders
+
+    symlinks to folders are not followed, folders that cannot be
+    read (e.g. no permission) are skipped
+    """
+
+    try:
+        with os.scandir(folder) as it:
+
+            for entry in it:
+
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+
+                        if recursive:
+                            folders.append(entry.path)
+
+                        continue
+
+                    if not entry.is_file():
+                        continue
+
+                # the entry was removed while the folder was listed
+                except OSError:
+                    continue
+
+                if not entry.name.endswith(ext):
+                    continue
+
+                if pattern is not None and not fnmatch.fnmatch(entry.name, pattern):
+                    continue
+
+                yield entry
+
+    except OSError as e:
+        print(f'could not list {folder}: {e}')
+
+
+def scan_directory(folder, ext='', pattern=None, recursive=False) -> tuple:
+    """
+    returns (files, folders), a list of os.DirEntry for the files in
+    folder (see iter_directory) and a list of paths to the subfolders
+    """
+
+    folders = []
+    files = list(iter_directory(folder, ext, pattern, recursive, folders))
+
+    return files, folders
+
+
+def stat_entries(entries, stat=True) -> list:
+    """
+    returns a FileEntry for each os.DirEntry in entries
+
+    on Windows the size and modification time are included in the directory
+    listing, on other systems each DirEntry.stat is a separate call
+    if stat is False, size and mtime_ns are None
+    """
+
+    if not stat:
+        return [FileEntry(Path(entry.path), None, None) for entry in entries]
+
+    result = []
+
+    for entry in entries:
+
+        try:
+            st = entry.stat()
+
+        # the file was removed after the folder was listed
+        except OSError:
+            continue
+
+        result.append(FileEntry(Path(entry.path), st.st_size, st.st_mtime_ns))
+
+    return result
+
+
+def scan_folder(folder, ext='', pattern=None, recursive=False,
+                workers=0, stat=True) -> Iterator[FileEntry]:
+    """
+    generator that yields a FileEntry (absolute path, size, mtime_ns) for each
+    file in folder with extension ext (can be tuple of strings), the size and
+    modification time are read while listing, no need to call os.stat again
+    (if stat is False, size and mtime_ns are None and no stat calls are made)
+
+    pattern is a glob pattern for the file name (e.g. 'report_*.pdf'),
+    if recursive is True, the files in all subfolders are included
+
+    the files are yielded as soon as they have been listed, a folder
+    with many files does not have to be listed completely first
+
+    if workers > 0, the folders are listed and the files are stat-ed
+    in a thread pool with this many threads, this is much faster for
+    folders on network drives (each call takes a round trip to the server).
+    The order of the files is not deterministic in this case
+
+    usage:
+        for n in scan_folder('Z:/project', ext='.dwg', recursive=True, workers=16):
+            print(n.path, n.size)
+    """
+
+    folder = os.path.abspath(folder)
+
+    if workers <= 0:
+
+        folders = [folder]
+
+        while folders:
+
+            batch = []
+            subfolders = []
+
+            for entry in iter_directory(folders.pop(), ext, pattern, recursive, subfolders):
+
+                batch.append(entry)
+
+                if len(batch) >= SCAN_BATCH_SIZE:
+                    yield from stat_entries(batch, stat)
+                    batch = []
+
+            yield from stat_entries(batch, stat)
+
+            # depth first, in the order of the listing
+            folders.extend(reversed(subfolders))
+
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    try:
+        pending = {executor.submit(scan_directory, folder, ext, pattern, recursive)}
+
+        while pending:
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                result = future.result()
+
+                # a list of FileEntry from stat_entries
+                if isinstance(result, list):
+                    yield from result
+                    continue
+
+                files, subfolders = result
+
+                for chunk in divide_chunks(files, SCAN_BATCH_SIZE):
+                    pending.add(executor.submit(stat_entries, chunk, stat))
+
+                for subfolder in subfolders:
+                    pending.add(executor.submit(scan_directory, subfolder,
+                                                ext, pattern, recursive))
+
+    # also in case the generator is not consumed completely
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def process_input(args, ext='', recursive=False, pattern=None) -> tuple:
     """
     returns a list of absolute file paths (WindowsPath objects) and the
     folder as WindowsPath object in which the last file is located
@@ -102,6 +449,12 @@ def process_input(args, ext='') -> tuple:
     (space-separated in command line in case several paths are given)
     in case of a directory, includes all files with
     extension ext (can be tuple of strings), default '' (all files)
+    and name matching the glob pattern (see scan_folder)
+    if recursive is True, also includes the files in subfolders
+
+    folders on network drives are listed using a thread pool (see scan_folder),
+    use scan_folder directly to also get the size and modification time
+    of the files, or to process the files while the folder is listed
 
 
     usage:
@@ -124,8 +477,11 @@ def process_input(args, ext='') -> tuple:
     if os.path.isdir(args[0]):
 
         folder = Path(args[0])
-        fnames = [Path(folder / a).absolute()
-                  for a in os.listdir(folder) if a.endswith(ext)]
+
+        workers = 0 if is_local_path(folder.absolute()) else SCAN_WORKERS
+
+        fnames = [n.path for n in scan_folder(folder, ext=ext, pattern=pattern, recursive=recursive,
+                                               workers=workers, stat=False)]
 
     # if one or multiple file paths are given as input, create WindowsPath objects from them
     else:
@@ -139,23 +495,33 @@ def process_input(args, ext='') -> tuple:
 
 class DatabaseHandler:
 
-    def __init__(self, path, callback=None, progress=None):
+    def __init__(self, path, callback=None, progress=None, lazy=False, cache=None):
         """
         loads a SQLite database file and keeps it in memory
 
+        if cache is True, the file is loaded from a local copy (see cache.FileCache),
+        which is only copied from path in case the file has changed since
+        the last time it was copied. By default (None) the cache is only used
+        for files that are not on a local disk (see is_local_path), a copy of
+        a local file would only be read and stored twice
+
+        if lazy is True, the local copy is instead opened read-only using a
+        memory map, only the parts of the file that are actually queried are
+        read into memory. The database cannot be saved in this mode
+
         NOTE: it is important that this class works as intended
               also in case the files are located on network drives
               the user might have a bad network connection, which
               can lead to a number of issues in common file operations
               like remove, copy, etc...
 
-        if progress is not None, it is passed to the sqlite3.connection.backup method
-
         callback is called each time an SQL statement is executed on the in-memory database
 
-        progress is a callable object that will be executed at each iteration
-        with three integer arguments: status of the last iteration, the remaining number of pages
-        still to be copied and the total number of pages.
+        progress is a callable object that will be executed at each step of a
+        load or save with three arguments: status of the last step, the remaining
+        number of pages (bytes when copying to the cache) still to be copied
+        and the total number of pages (bytes), the same as for sqlite3.Connection.backup
+        the throughput in MB/s of the current (or last) transfer is in self.rate
 
         seems like windows has some type of cache for files on
         network drives, the second time a file is opened it's much faster
@@ -164,27 +530,65 @@ class DatabaseHandler:
 
         self.progress = progress
         self.callback = callback
+        self.lazy = lazy
 
-        # these settings for connection.backup updates the progressbar more smoothly
+        if cache is None:
+            cache = not is_local_path(Path(path).absolute())
+
+        # lazy=True always uses the cache
+        self.cache = FILE_CACHE if cache or lazy else None
+
+        # number of pages per step for connection.backup, in case the throughput
+        # for the folder is not known yet, see backup
+        # a small first step gives a quick first progress update
         self.pages = 100
         # this setting does not seem to do anything?
         self.sleep = 0
 
-        # create a new database connection in memory
-        # note: there can only be one connection to this database
-        # ensure that any previous connections to this in-memory database have been closed
-        # (effectively deleting any previous data)
-        self.connection = sqlite3.connect(':memory:')
+        # throughput (MB/s) of the last load or save
+        self.rate = None
 
-        if self.callback is not None:
+        # create a new database connection in memory
+        # the in-memory database has a unique name and uses the shared cache,
+        # other connections to the same database can be opened with self.uri
+        # (see query.ConnectionPool), the database is deleted when the last
+        # connection to it is closed
+        # the database can be loaded in a worker thread (see tasks.py) and used
+        # in the GUI thread, the connection is never used by two threads at the same time
+        # with lazy=True, the connection to the local copy is created in load_lazy
+        if self.lazy:
+            self.uri = None
+            self.connection = None
+        else:
+            self.uri = f'file:gui-template-{uuid.uuid4().hex}?mode=memory&cache=shared'
+            self.connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+
+        if self.callback is not None and self.connection is not None:
             self.connection.set_trace_callback(self.callback)
 
+        # held while self.connection is used for writes from a worker thread
+        # (see query.ConnectionPool) and while the database is saved
+        self.lock = threading.RLock()
+
+        # local copy of the file, in case the cache is used
+        self.local_path = None
+
         # path to the SQLite datbase file
         self.path = Path(path).absolute()
 
+        # indexes that were created in the in-memory database by advisor.IndexAdvisor,
+        # these are not saved to the file unless keep_indexes is True
+        self.auto_indexes = set()
+        self.keep_indexes = False
+
+        # hash of each page of the database after it was loaded or saved
+        # and (size, mtime_ns) of the file at that time, used by save_delta
+        self.page_hashes = None
+        self.file_stat = None
+
         self.load()
 
-    def load(self) -> None:
+    def load(self, progress=None) -> None:
         """
         load a SQLite database from a file and read it
         into the in-memory SQLite db
@@ -194,30 +598,436 @@ class DatabaseHandler:
 
         use the progress callback to monitor progress, by default
         the file is read in 100 parts with a callback after each
+        progress overrides the callback that was passed to __init__
         """
 
-        # connect to the SQLite database at path
-        source = sqlite3.connect(str(self.path))
+        if progress is None:
+            progress = self.progress
+
+        # in case the program crashed during save_delta
+        recover_delta_journal(self.path)
+
+        if self.lazy:
+            self.load_lazy(progress)
+            return
+
+        if self.cache is not None:
+            source_path, file_stat = self.cache.get(self.path, progress=self.measure_rate(progress))
+            self.local_path = source_path
+
+        else:
+            source_path, file_stat = self.path, get_file_signature(self.path)
+
+        # connect to the SQLite database at path (or the local copy)
+        source = sqlite3.connect(str(source_path))
 
         # copy the contents of source into the in-memory db
-        # do this in steps of 100, otherwise it is slower for some reason
-        source.backup(self.connection, pages=self.pages, sleep=self.sleep,
-                      progress=self.progress)
+        self.backup(source, self.connection, Path(source_path).parent, progress=progress)
+
+        source.close()
+
+        self.update_page_hashes(file_stat, source_path)
+
+    def load_lazy(self, progress=None) -> None:
+        """
+        opens the local copy of the file (see cache.FileCache) read-only
+
+        the pages are memory-mapped (PRAGMA mmap_size), the operating system
+        only reads the pages that are used by queries
+        """
+
+        self.local_path, _ = self.cache.get(self.path, progress=self.measure_rate(progress))
+
+        if self.connection is not None:
+            self.connection.close()
+
+        self.uri = f'{self.local_path.as_uri()}?mode=ro'
+        self.connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+
+        self.connection.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+
+        if self.callback is not None:
+            self.connection.set_trace_callback(self.callback)
+
+    def backup(self, source, target, folder, progress=None) -> None:
+        """
+        copies the database source (connection) to target (connection)
+        using source.backup
+
+        the number of pages per step is chosen so that each step takes about
+        cache.STEP_INTERVAL seconds, based on the throughput that was measured
+        the last time a file in folder (the folder on the slow side of the
+        transfer) was copied. The first time, self.pages is used
+
+        NOTE: sqlite3.Connection.backup cannot change the number of pages
+        between steps, the measured throughput is used for the next backup
+        """
+
+        folder = str(Path(folder).absolute())
+        page_size = source.execute('PRAGMA page_size').fetchone()[0]
+
+        if folder in TRANSFER_RATES:
+            pages = int(TRANSFER_RATES[folder] * STEP_INTERVAL / page_size)
+            pages = min(max(pages, MIN_BACKUP_PAGES), MAX_BACKUP_PAGES)
+        else:
+            pages = self.pages
+
+        t0 = time.perf_counter()
+        copied = 0
+
+        def step_progress(status, remaining, total):
+
+            nonlocal copied
+            copied = total - remaining
+
+            self.rate = copied * page_size / max(time.perf_counter() - t0, 1e-9) / 1e6
+
+            if progress is not None:
+                progress(status, remaining, total)
+
+        source.backup(target, pages=pages, sleep=self.sleep, progress=step_progress)
+
+        if copied:
+            TRANSFER_RATES[folder] = copied * page_size / max(time.perf_counter() - t0, 1e-9)
+
+    def close(self) -> None:
+        """
+        closes the connection to the in-memory database (or to the local copy
+        in case lazy is True), waits for writes and saves in other threads
+
+        the in-memory database is deleted when its last connection is closed,
+        close the query.ConnectionPool of the database as well
+        """
+
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+
+    def measure_rate(self, progress=None, unit_size=1):
+        """
+        returns a progress callback for a transfer of units of unit_size bytes
+        (e.g. cache.copy_file) that updates self.rate and calls progress
+        """
+
+        t0 = time.perf_counter()
+
+        def rate_progress(status, remaining, total):
+
+            self.rate = (total - remaining) * unit_size / max(time.perf_counter() - t0, 1e-9) / 1e6
+
+            if progress is not None:
+                progress(status, remaining, total)
+
+        return rate_progress
+
+    def update_page_hashes(self, file_stat, path=None) -> None:
+        """
+        stores the hash of each page of the file at path (default self.path)
+        that the in-memory database is identical to, and the size and
+        modification time of the original file (file_stat)
+
+        the file is read in chunks (see get_file_page_hashes), the in-memory
+        database is not serialized, which would copy all of it
+        """
 
-    def save(self):
+        if path is None:
+            path = self.path
+
+        self.page_hashes = get_file_page_hashes(path, self.get_page_size())
+        self.file_stat = file_stat
+
+    def get_page_size(self) -> int:
+        return self.connection.execute('PRAGMA page_size').fetchone()[0]
+
+    def can_save_delta(self) -> bool:
+        """
+        checks whether save_delta can be used
+
+        the file must not have been changed since it was loaded,
+        and it must not use WAL mode (the -wal file is not updated)
+
+        this requires sqlite3.Connection.serialize (Python 3.11)
+        """
+
+        if not can_serialize(self.connection):
+            return False
+
+        if self.page_hashes is None or not os.path.isfile(self.path):
+            return False
+
+        if get_file_signature(self.path) != self.file_stat:
+            return False
+
+        if os.path.isfile(f'{self.path}-wal'):
+            return False
+
+        with open(self.path, 'rb') as f:
+            header = f.read(100)
+
+        # bytes 18 and 19 are 2 for WAL mode
+        return len(header) == 100 and header[18] == 1 and header[19] == 1
+
+    def save(self, progress=None, delta=True, keep_indexes=None):
+        """
+        saves the in-memory database to the original database file
+
+        if delta is True, only the pages that have changed since the database
+        was loaded are written (see save_delta) if this is possible, otherwise
+        the entire database is written (see save_full)
+
+        the indexes in self.auto_indexes (see advisor.IndexAdvisor) are only
+        saved in case keep_indexes is True (default self.keep_indexes)
+
+        progress overrides the callback that was passed to __init__
+        """
+
+        if self.lazy:
+            raise PermissionError(f'{self.path} is opened read-only (lazy=True)')
+
+        if keep_indexes is None:
+            keep_indexes = self.keep_indexes
+
+        # wait for writes from other threads (see query.ConnectionPool)
+        with self.lock:
+
+            # a previous save_delta failed and the file could not be restored,
+            # the file is consistent again before it is saved (save_full is used
+            # since the file has changed)
+            recover_delta_journal(self.path)
+
+            connection = self.get_save_connection(keep_indexes)
+
+            try:
+                if delta and self.can_save_delta():
+                    self.save_delta(progress=progress, connection=connection)
+                else:
+                    self.save_full(progress=progress, connection=connection)
+
+            finally:
+                if connection is not self.connection:
+                    connection.close()
+
+            # the indexes are part of the file now
+            if keep_indexes:
+                self.auto_indexes.clear()
+
+    def get_save_connection(self, keep_indexes) -> sqlite3.Connection:
         """
-        dumps the in-memory datbase to disk, overwriting the original database file
+        returns a connection to the database that is written to the file
+
+        in case there are indexes in self.auto_indexes that should not be saved,
+        this is a copy of the in-memory database without these indexes
+        (the indexes are kept in the in-memory database)
+
+        the pages that the indexes used are removed in case they are at the end
+        of the database (see truncate_free_pages), which is usually the case since
+        the indexes were created after the database was loaded, otherwise they are
+        saved as empty free pages (SQLite reuses these pages when data is added)
+
+        the copy is made with sqlite3.Connection.backup in case serialize
+        is not available (before Python 3.11), the free pages are kept then
+        """
+
+        self.connection.commit()
+
+        if keep_indexes or not self.auto_indexes:
+            return self.connection
+
+        connection = sqlite3.connect(':memory:')
+
+        if can_serialize(self.connection):
+            connection.deserialize(self.connection.serialize())
+        else:
+            self.connection.backup(connection)
+
+        # overwrite the content of the free pages with zeros
+        connection.execute('PRAGMA secure_delete = ON')
+
+        for name in self.auto_indexes:
+            connection.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+        connection.commit()
+
+        if not can_serialize(connection):
+            return connection
+
+        image = truncate_free_pages(connection.serialize(), self.get_page_size())
+
+        if image is not None:
+            connection.deserialize(image)
+
+        return connection
+
+    def save_delta(self, progress=None, connection=None):
+        """
+        writes the pages of the in-memory database (or connection, see
+        get_save_connection) that have changed since the database
+        was loaded (or saved) to the original database file
+
+            this method calls connection.commit()
+
+        the original content of the pages is first written to a journal file
+        (path + DELTA_JOURNAL_SUFFIX), in case writing the pages fails the file
+        is restored from the journal, in case the program crashes before all pages
+        are written the file is restored the next time it is loaded (or saved)
+
+        the file is locked (BEGIN EXCLUSIVE) while the pages are written
+
+        raises PermissionError in case the file cannot be written to
+        """
+
+        if progress is None:
+            progress = self.progress
+
+        if not os.access(self.path, os.W_OK):
+            raise PermissionError(f'no write permission for {self.path}')
+
+        if connection is None:
+            connection = self.connection
+
+        self.connection.commit()
+
+        page_size = self.get_page_size()
+        image = connection.serialize()
+
+        n_pages = len(image) // page_size
+
+        # page 1 is changed before it is written (the rest of image is not copied)
+        first_page = bytearray(image[:page_size])
+
+        journal_path = f'{self.path}{DELTA_JOURNAL_SUFFIX}'
+
+        # NOTE: on POSIX, closing any file descriptor of a file releases all (fcntl)
+        # locks that the process holds on the file, including the lock of
+        # file_connection. The file is opened before it is locked and closed
+        # after the lock is released, all pages are read and written with f
+        with open(self.path, 'r+b') as f:
+
+            # prevents other connections from reading or writing the file
+            file_connection = sqlite3.connect(str(self.path), isolation_level=None)
+
+            try:
+                file_connection.execute('BEGIN EXCLUSIVE')
+
+                original_size = os.fstat(f.fileno()).st_size
+
+                # other connections use the file change counter (offset 24) to check
+                # if their cache is valid, it must be incremented for each change
+                # offset 92 is the version-valid-for number
+                f.seek(24)
+                counter = (struct.unpack('>I', f.read(4))[0] + 1) % 2 ** 32
+
+                first_page[24:28] = struct.pack('>I', counter)
+                first_page[92:96] = struct.pack('>I', counter)
+
+                hashes = get_page_hashes(first_page, page_size) + \
+                    get_page_hashes(memoryview(image)[page_size:], page_size)
+
+                # page indices (0-based) that have changed
+                changed = [i for i in range(n_pages)
+                           if hashes[16 * i:16 * i + 16] != self.page_hashes[16 * i:16 * i + 16]]
+
+                try:
+                    write_delta_journal(self.path, f, original_size, page_size,
+                                        [i for i in changed if (i + 1) * page_size <= original_size])
+
+                # the file has not been modified, the journal might be incomplete
+                except BaseException:
+                    remove_delta_journal(self.path)
+                    raise
+
+                try:
+                    t0 = time.perf_counter()
+
+                    for k, i in enumerate(changed):
+
+                        f.seek(i * page_size)
+                        f.write(first_page if i == 0 else image[i * page_size:(i + 1) * page_size])
+
+                        self.rate = (k + 1) * page_size / max(time.perf_counter() - t0, 1e-9) / 1e6
+
+                        if progress is not None:
+                            progress(sqlite3.SQLITE_OK, len(changed) - k - 1, len(changed))
+
+                    f.truncate(n_pages * page_size)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                # some pages might have been written, the original pages are written
+                # back while the file is still locked, otherwise the journal is kept
+                # and the file is restored the next time it is loaded or saved
+                except BaseException:
+
+                    try:
+                        restore_delta_journal(journal_path, f)
+                        remove_delta_journal(self.path)
+
+                    except Exception as e:
+                        print(f'could not restore {self.path} from {journal_path}: {e}')
+
+                    raise
+
+                # all pages are written, the journal is not needed anymore
+                remove_delta_journal(self.path)
+
+            finally:
+                if file_connection.in_transaction:
+                    file_connection.execute('ROLLBACK')
+
+                file_connection.close()
+
+        print(f'saved {len(changed)} of {n_pages} pages to {self.path}')
+
+        self.page_hashes = hashes
+        self.file_stat = get_file_signature(self.path)
+
+        if self.local_path is None:
+            return
+
+        # the local copy was identical to the file before it was saved,
+        # write the same pages to it instead of copying the file again
+        try:
+            with open(self.local_path, 'r+b') as f:
+
+                for i in changed:
+                    f.seek(i * page_size)
+                    f.write(first_page if i == 0 else image[i * page_size:(i + 1) * page_size])
+
+                f.truncate(n_pages * page_size)
+
+            # the mtime must match the saved file
+            shutil.copystat(self.path, self.local_path)
+
+            self.local_path, self.file_stat = self.cache.update(self.path, self.local_path)
+
+        # the file will be copied again the next time it is loaded
+        except Exception:
+            self.cache.discard(self.path)
+            self.local_path = None
+
+    def save_full(self, progress=None, connection=None):
+        """
+        dumps the in-memory datbase (or connection, see get_save_connection)
+        to disk, overwriting the original database file
 
             this method calls connection.commit()
 
         creates a backup of the original file
 
+        progress overrides the callback that was passed to __init__
+
         NOTE: this method does _not_ close the database connection
         it must be closed by the user if necessary
 
         raises PermissionError in case the file cannot be written to
         """
 
+        if progress is None:
+            progress = self.progress
+
+        if connection is None:
+            connection = self.connection
+
         # the backup file will be prefixed with "backup-"
         backup_path = self.path.parent / f'backup-{self.path.name}'
 
@@ -267,8 +1077,7 @@ class DatabaseHandler:
         # will wrap this in a try-except, assuming sqlite3 will raise
         # some exception if the write fails due to bad network
         try:
-            self.connection.backup(file_connection, pages=self.pages, sleep=self.sleep,
-                                   progress=self.progress)
+            self.backup(connection, file_connection, self.path.parent, progress=progress)
             failed = False
 
         except Exception as e:
@@ -286,3 +1095,223 @@ class DatabaseHandler:
                 shutil.copy2(backup_path, self.path.parent /
                              f'backup-2-{self.path.name}')
                 print('copied backup to backup-2')
+
+        file_connection.close()
+
+        # the file was written completely, an old journal must not be applied to it
+        remove_delta_journal(self.path)
+
+        # the local copy is outdated
+        if self.cache is not None:
+            self.cache.discard(self.path)
+            self.local_path = None
+
+        self.update_page_hashes(get_file_signature(self.path))
+
+
+def truncate_free_pages(image, page_size) -> Union[bytearray, None]:
+    """
+    removes the free pages from image (bytes of a SQLite database) in case
+    all free pages are at the end of the database
+
+    returns the truncated image, or None in case the free pages cannot be
+    removed this way (or there are none), see https://www.sqlite.org/fileformat.html
+    """
+
+    # database size in pages, first freelist trunk page, number of free pages
+    n_pages, trunk, n_free = struct.unpack('>III', image[28:40])
+
+    # the pages can't just be removed in auto-vacuum mode (pointer map pages)
+    if not n_free or n_pages * page_size != len(image) or struct.unpack('>I', image[52:56])[0]:
+        return None
+
+    free = set()
+
+    while trunk:
+
+        # corrupt freelist
+        if trunk in free or trunk > n_pages:
+            return None
+
+        free.add(trunk)
+
+        offset = (trunk - 1) * page_size
+        next_trunk, count = struct.unpack('>II', image[offset:offset + 8])
+
+        free.update(struct.unpack(f'>{count}I', image[offset + 8:offset + 8 + 4 * count]))
+        trunk = next_trunk
+
+    n_used = n_pages - n_free
+
+    if free != set(range(n_used + 1, n_pages + 1)):
+        return None
+
+    truncated = bytearray(image[:n_used * page_size])
+    truncated[28:40] = struct.pack('>III', n_used, 0, 0)
+
+    return truncated
+
+
+def can_serialize(connection) -> bool:
+    """
+    sqlite3.Connection.serialize and deserialize were added in Python 3.11
+    (and require a SQLite library that was built with them)
+    """
+
+    return hasattr(connection, 'serialize') and hasattr(connection, 'deserialize')
+
+
+def get_file_page_hashes(path, page_size) -> bytes:
+    """
+    returns the page hashes (see get_page_hashes) of the database file at path
+
+    the file is read in chunks of HASH_CHUNK_PAGES pages, only one chunk
+    is in memory at a time
+    """
+
+    hashes = []
+    buffer = bytearray(HASH_CHUNK_PAGES * page_size)
+    view = memoryview(buffer)
+
+    with open(path, 'rb') as f:
+
+        while True:
+
+            n = f.readinto(buffer)
+
+            if not n:
+                break
+
+            hashes.append(get_page_hashes(view[:n], page_size))
+
+    return b''.join(hashes)
+
+
+def get_page_hashes(image, page_size) -> bytes:
+    """
+    returns the 16-byte blake2b hash of each page in image (bytes of a
+    SQLite database), concatenated
+    """
+
+    view = memoryview(image)
+
+    return b''.join(hashlib.blake2b(view[i:i + page_size], digest_size=16).digest()
+                    for i in range(0, len(view), page_size))
+
+
+def write_delta_journal(path, f, original_size, page_size, pages) -> None:
+    """
+    writes the original content of pages (0-based indices) in the database
+    file f (opened with r+b) to path + DELTA_JOURNAL_SUFFIX
+
+    format:
+        magic, original file size, page size, number of pages
+        (index, page content) for each page
+        crc32 of everything above (the journal is only valid if this matches)
+    """
+
+    data = bytearray(DELTA_JOURNAL_MAGIC)
+    data += struct.pack('>QII', original_size, page_size, len(pages))
+
+    for i in pages:
+        f.seek(i * page_size)
+        data += struct.pack('>Q', i)
+        data += f.read(page_size)
+
+    data += struct.pack('>I', zlib.crc32(data))
+
+    with open(f'{path}{DELTA_JOURNAL_SUFFIX}', 'wb') as journal:
+        journal.write(data)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def remove_delta_journal(path) -> None:
+    """
+    removes the journal of the database file at path (see save_delta), if it exists
+    """
+
+    try:
+        os.remove(f'{path}{DELTA_JOURNAL_SUFFIX}')
+
+    except FileNotFoundError:
+        pass
+
+
+def restore_delta_journal(journal_path, f) -> bool:
+    """
+    writes the original pages from the journal at journal_path to the
+    database file f (opened with r+b), see write_delta_journal
+
+    returns False (and does not change f) in case the journal is incomplete,
+    which means that the program crashed before the database file was modified
+    """
+
+    with open(journal_path, 'rb') as journal:
+        data = journal.read()
+
+    n = len(DELTA_JOURNAL_MAGIC)
+
+    valid = len(data) >= n + 20 and data[:n] == DELTA_JOURNAL_MAGIC and \
+        struct.unpack('>I', data[-4:])[0] == zlib.crc32(data[:-4])
+
+    if not valid:
+        return False
+
+    original_size, page_size, n_pages = struct.unpack('>QII', data[n:n + 16])
+
+    offset = n + 16
+
+    for _ in range(n_pages):
+
+        i = struct.unpack('>Q', data[offset:offset + 8])[0]
+        offset += 8
+
+        f.seek(i * page_size)
+        f.write(data[offset:offset + page_size])
+        offset += page_size
+
+    f.truncate(original_size)
+    f.flush()
+    os.fsync(f.fileno())
+
+    return True
+
+
+def recover_delta_journal(path) -> bool:
+    """
+    restores the database file at path from the journal written by
+    DatabaseHandler.save_delta, in case it exists (the program crashed
+    while the pages were written, or the file could not be restored
+    when the save failed)
+
+    the journal is removed, returns True if the file was restored
+    """
+
+    journal_path = f'{path}{DELTA_JOURNAL_SUFFIX}'
+
+    if not os.path.isfile(journal_path):
+        return False
+
+    # the file is locked while it is restored
+    with open(path, 'r+b') as f:
+
+        file_connection = sqlite3.connect(str(path), isolation_level=None)
+
+        try:
+            file_connection.execute('BEGIN EXCLUSIVE')
+
+            valid = restore_delta_journal(journal_path, f)
+
+            os.remove(journal_path)
+
+        finally:
+            if file_connection.in_transaction:
+                file_connection.execute('ROLLBACK')
+
+            file_connection.close()
+
+    if valid:
+        print(f'restored {path} from {journal_path}')
+
+    return valid
@@ -0,0 +1,482 @@
+import re
+import json
+import time
+import threading
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# the oldest half of the records is dropped when there are more records than this
+MAX_INDEX_RECORDS = 1000000
+
+# the values of a short list are looked up in a long list with binary search in case
+# the long list is this many times longer, otherwise the lists are intersected as sets
+BISECT_RATIO = 16
+
+# number of records that are added to the word index at a time, see LogIndex.update_tokens
+TOKEN_BATCH_SIZE = 10000
+
+# words in the messages, a text search finds the records that contain all words
+LOG_TOKENS = re.compile(r'\w+')
+
+# the postings of at most this many words are merged for a partial word of
+# a text search (e.g. the words that start with it), see LogIndex.search
+MAX_PREFIX_TOKENS = 1000
+
+# the postings of several words are only merged in case they have fewer record
+# numbers in total than this fraction of the number of records, see LogIndex.merge_postings
+MAX_MERGE_RATIO = 0.25
+
+
+def tokenize(text: str) -> set:
+    return set(LOG_TOKENS.findall(text.lower()))
+
+
+def query_tokens(text: str) -> tuple:
+    """
+    returns (words, prefix, suffix, part) for the text of a search (lowercase)
+
+        words: the words in text that are also whole words in every message
+               that contains text, i.e. words with a non-word character
+               (or nothing) on both sides in text, except at the start and end
+        prefix: the last word in case there is a non-word character before
+                it, each message that contains text has a word that starts
+                with it (the word can still be typed), otherwise None
+        suffix: the first word in case there is a non-word character after
+                it, each message that contains text has a word that ends
+                with it, otherwise None
+        part: text in case it is a single word, each message that contains
+              text has a word that contains it, otherwise None
+
+    the first word can be the end of a longer word in the message, and
+    the last word can be the start of a longer word, e.g. 'message 4'
+    is found in 'mymessage 42', so neither is in words
+    """
+
+    words = set()
+    prefix = suffix = part = None
+
+    for match in LOG_TOKENS.finditer(text):
+
+        start, end = match.span()
+
+        if start > 0 and end < len(text):
+            words.add(match.group())
+
+        elif start > 0:
+            prefix = match.group()
+
+        elif end < len(text):
+            suffix = match.group()
+
+        else:
+            part = match.group()
+
+    return words, prefix, suffix, part
+
+
+def format_record(timestamp, level, message) -> str:
+    """
+    returns the line in the same format as in data/log.txt
+    """
+
+    time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+    return f'{time_str} {level:<8} {message}'
+
+
+def contains(values, value) -> bool:
+    """
+    checks if the sorted sequence values contains value (binary search)
+    """
+
+    i = bisect_left(values, value)
+
+    return i < len(values) and values[i] == value
+
+
+def intersect(lists) -> list:
+    """
+    returns the sorted values that are in all of the sorted sequences in lists
+
+    starts with the shortest list, each value is looked up in the longer lists
+    with binary search, or with a set in case the lists have similar lengths
+    """
+
+    lists = sorted(lists, key=len)
+    result = lists[0]
+
+    for values in lists[1:]:
+
+        if not result:
+            break
+
+        if len(values) > len(result) * BISECT_RATIO:
+            result = [n for n in result if contains(values, n)]
+        else:
+            result = sorted(set(result).intersection(values))
+
+    return list(result)
+
+
+class LogIndex:
+
+    def __init__(self, max_records=MAX_INDEX_RECORDS):
+        """
+        in-memory index of log records (time, level, message) that can be filtered
+        by level, time range and text without looking at all records
+
+        * the records are numbered in the order they are added, the number
+          is the position in the index (after dropping old records, the
+          numbers start from 0 again)
+        * times: the time of each record, each time is at least the previous
+          time (records from different threads can be added slightly out of order)
+          so the time range is found with bisect
+        * levels: record numbers for each level
+        * tokens: record numbers for each word in the messages (inverted index),
+          the words are added later (see update_tokens)
+
+        the record numbers are kept in arrays, so the index uses about
+        4 bytes per word in the messages
+
+        usage:
+            index = LogIndex.load('data/log.jsonl')
+
+            for n in index.search(levels=['ERROR'], text='database'):
+                print(index.line(n))
+        """
+
+        self.max_records = max_records
+
+        self.times = array('d')
+        self.levels = []
+        self.messages = []
+
+        self.by_level = {}
+        self.tokens = {}
+
+        # number of records in tokens, see update_tokens
+        self.indexed = 0
+
+        # the words in tokens in sorted order (for prefix searches), and the
+        # same words joined with newlines and the offset of each word in it
+        # (for searches of the middle or end of words), None in case
+        # words were added since they were sorted, see sort_tokens
+        self.sorted_tokens = None
+        self.token_text = None
+        self.token_offsets = None
+
+        # records are added in the logging thread and searched in the GUI thread
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, timestamp, level, message) -> None:
+
+        with self.lock:
+
+            if len(self.messages) >= self.max_records:
+                self.drop(self.max_records // 2)
+
+            n = len(self.messages)
+
+            if self.times and timestamp < self.times[-1]:
+                timestamp = self.times[-1]
+
+            self.times.append(timestamp)
+            self.levels.append(level)
+            self.messages.append(message)
+
+            postings = self.by_level.get(level)
+
+            if postings is None:
+                postings = self.by_level[level] = array('I')
+
+            postings.append(n)
+
+    def update_tokens(self) -> None:
+        """
+        adds the records that were added since the last call to the word index
+
+        this is not done for each record in add, the logging thread calls this
+        when there are no more records to log (see logger.LogIndexHandler),
+        and search calls this before searching for text
+
+        the lock is released after every TOKEN_BATCH_SIZE records
+        """
+
+        while True:
+
+            with self.lock:
+
+                end = min(self.indexed + TOKEN_BATCH_SIZE, len(self.messages))
+
+                for n in range(self.indexed, end):
+
+                    for token in tokenize(self.messages[n]):
+
+                        postings = self.tokens.get(token)
+
+                        if postings is None:
+                            postings = self.tokens[token] = array('I')
+                            self.sorted_tokens = None
+
+                        postings.append(n)
+
+                self.indexed = end
+
+                if end == len(self.messages):
+                    return
+
+    def drop(self, n) -> None:
+        """
+        removes the first n records, the index is built again for the rest
+        """
+
+        with self.lock:
+
+            records = list(zip(self.times[n:], self.levels[n:], self.messages[n:]))
+
+            self.times = array('d')
+            self.levels = []
+            self.messages = []
+
+            self.by_level = {}
+            self.tokens = {}
+            self.indexed = 0
+            self.sorted_tokens = None
+
+            for record in records:
+                self.add(*record)
+
+    def sort_tokens(self) -> None:
+        """
+        sorts the words in the index in case words were added since
+        the last call, see find_prefix and find_part
+        """
+
+        if self.sorted_tokens is not None:
+            return
+
+        self.sorted_tokens = sorted(self.tokens)
+
+        # each word is followed by a newline (words don't contain newlines)
+        self.token_text = ''.join(f'{n}\n' for n in self.sorted_tokens)
+        self.token_offsets = array('I', [0])
+
+        for n in self.sorted_tokens:
+            self.token_offsets.append(self.token_offsets[-1] + len(n) + 1)
+
+    def merge_postings(self, names) -> list:
+        """
+        returns the sorted record numbers of the records with any of the words names,
+        None in case the words are in more than MAX_MERGE_RATIO of the records
+        (comparing the messages is faster than merging the postings then)
+        """
+
+        postings = [self.tokens[n] for n in names]
+
+        if len(postings) == 1:
+            return postings[0]
+
+        if sum(len(n) for n in postings) > len(self.messages) * MAX_MERGE_RATIO:
+            return None
+
+        return sorted(set().union(*postings))
+
+    def find_prefix(self, prefix) -> list:
+        """
+        returns the sorted record numbers of the records with a word that
+        starts with prefix, None in case more than MAX_PREFIX_TOKENS words
+        start with prefix (merging the postings would take longer than
+        comparing the messages, see also merge_postings)
+        """
+
+        self.sort_tokens()
+
+        i = bisect_left(self.sorted_tokens, prefix)
+        j = bisect_left(self.sorted_tokens, prefix + '\U0010ffff')
+
+        if j - i > MAX_PREFIX_TOKENS:
+            return None
+
+        return self.merge_postings(self.sorted_tokens[i:j])
+
+    def find_part(self, part, end=False) -> list:
+        """
+        returns the sorted record numbers of the records with a word that
+        contains part (that ends with part in case end is True), None in case
+        more than MAX_PREFIX_TOKENS words match (see find_prefix)
+
+        the words are not compared one at a time, part is found in the
+        joined words (self.token_text) with str.find, and the word of
+        each match is found from its offset with bisect
+        """
+
+        self.sort_tokens()
+
+        text = self.token_text
+        offsets = self.token_offsets
+
+        if end:
+            part += '\n'
+
+        names = []
+        i = text.find(part)
+
+        while i >= 0:
+
+            k = bisect_right(offsets, i) - 1
+            names.append(self.sorted_tokens[k])
+
+            if len(names) > MAX_PREFIX_TOKENS:
+                return None
+
+            # the next match in a later word
+            i = text.find(part, offsets[k + 1])
+
+        if not names:
+            return []
+
+        return self.merge_postings(names)
+
+    def search(self, levels=None, start=None, end=None, text=None, first=0) -> list:
+        """
+        returns the numbers of the records (in order) that match all of
+
+            levels: list of levels, e.g. ['WARNING', 'ERROR']
+            start, end: time range (seconds since the epoch, end is not included)
+            text: the message contains text (case-insensitive)
+            first: the record number is at least first (e.g. to only search
+                   the records that were added since the last search)
+
+        the arguments that are None are not used
+
+        the lists of record numbers for the levels and the words in text are
+        intersected (see intersect), only the remaining candidates are compared
+        with text (all records in the time range in case there are no levels
+        and no words in text)
+
+        text can end or start in the middle of a word (e.g. while it is typed),
+        the words that must be whole words in the messages are looked up in
+        the index, and the words that start with the last word, end with the
+        first word or contain a single word (see query_tokens, find_prefix
+        and find_part). The messages are not compared in case text is a
+        single word, the messages with a word that contains it contain text
+        """
+
+        with self.lock:
+
+            # record numbers in the time range
+            lo = max(first, 0 if start is None else bisect_left(self.times, start))
+            hi = len(self.times) if end is None else bisect_left(self.times, end)
+
+            if lo >= hi:
+                return []
+
+            # sorted sequences of record numbers, the result is in all of them
+            lists = []
+
+            if levels is not None:
+
+                postings = [self.by_level.get(n, ()) for n in levels]
+
+                if len(postings) == 1:
+                    lists.append(postings[0])
+                else:
+                    lists.append(sorted(n for p in postings for n in p[bisect_left(p, lo):bisect_left(p, hi)]))
+
+            # the words that contain text were found, the messages
+            # don't have to be compared (see below)
+            found = False
+
+            if text:
+
+                self.update_tokens()
+
+                words, prefix, suffix, part = query_tokens(text.lower())
+
+                for token in words:
+                    lists.append(self.tokens.get(token, ()))
+
+                if prefix is not None:
+
+                    postings = self.find_prefix(prefix)
+
+                    if postings is not None:
+                        lists.append(postings)
+
+                if suffix is not None:
+
+                    postings = self.find_part(suffix, end=True)
+
+                    if postings is not None:
+                        lists.append(postings)
+
+                if part is not None:
+
+                    postings = self.find_part(part)
+
+                    if postings is not None:
+                        lists.append(postings)
+                        found = True
+
+            # only the part of each list in the time range
+            lists = [p[bisect_left(p, lo):bisect_left(p, hi)] for p in lists]
+
+            if lists:
+                candidates = intersect(lists)
+            else:
+                candidates = range(lo, hi)
+
+            if not text or found:
+                return list(candidates)
+
+            # the words match, check that the message contains the text
+            # (also the partial words and the characters between the words)
+            text = text.lower()
+
+            return [n for n in candidates if text in self.messages[n].lower()]
+
+    def count(self, level) -> int:
+        """
+        returns the number of records with level
+        """
+
+        with self.lock:
+            return len(self.by_level.get(level, ()))
+
+    def record(self, n) -> tuple:
+        """
+        returns (time, level, message) of record number n
+        """
+
+        with self.lock:
+            return self.times[n], self.levels[n], self.messages[n]
+
+    def line(self, n) -> str:
+        return format_record(*self.record(n))
+
+    @classmethod
+    def load(cls, path, max_records=MAX_INDEX_RECORDS) -> 'LogIndex':
+        """
+        creates an index from a JSON lines log file (see logger.JsonFormatter),
+        lines that cannot be parsed are skipped
+        """
+
+        index = cls(max_records=max_records)
+
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+
+            for line in f:
+
+                try:
+                    record = json.loads(line)
+                    index.add(record['time'], record['level'], record['message'])
+
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+        return index
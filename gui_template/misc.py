@@ -1,6 +1,7 @@
 import os
 import datetime
 from pathlib import Path
+from itertools import islice
 
 from typing import Iterator, Union
 from collections.abc import Iterable
@@ -74,6 +75,7 @@ def clean_sqlite_string(x) -> str:
     double quotes inside the string are not changed
 
     NOTE: will not strip whitespace
+    NOTE: use parameters (?) instead where possible, see sql.py
     """
 
     x = str(x)
@@ -90,10 +92,26 @@ def divide_chunks(container: Iterable, N) -> Iterator[object]:
     generator that divides container into chunks of N
     the last chunk might not have N elements
 
+    container can also be an iterator (e.g. a generator or sqlite3.Cursor),
+    the chunks are lists in this case and only one chunk is in memory at a time
+
     usage:
         parts_with_3_elements = list(divide_chunks(container, 3))
     """
 
+    if not hasattr(container, '__getitem__'):
+
+        iterator = iter(container)
+
+        while True:
+
+            chunk = list(islice(iterator, N))
+
+            if not chunk:
+                return
+
+            yield chunk
+
     for i in range(0, len(container), N):
         yield container[i:i + N]
 
@@ -229,6 +247,33 @@ def convert_to_numeric(x: str) -> Union[int, float]:
     return x
 
 
+def get_table_value(x) -> Union[tuple, None]:
+    """
+    returns the display string and sort key for a table cell value x
+
+    returns None in case the cell should be left empty, i.e. if x is a
+    representation of null or an empty str / just whitespace
+    the string [EMPTY] is displayed, since it is needed in the update table at least
+
+        datetime.datetime: format 17-03-20 18:44:15, sorted by timestamp
+        datetime.timedelta: str(x), sorted by total seconds
+        other: converted with convert_to_numeric
+    """
+
+    if x != '[EMPTY]' and (is_null(x) or (isinstance(x, str) and not x.strip())):
+        return None
+
+    if isinstance(x, datetime.datetime):
+        return x.strftime('%d-%m-%Y %H:%M:%S'), x.timestamp()
+
+    if isinstance(x, datetime.timedelta):
+        return str(x), x.total_seconds()
+
+    x = convert_to_numeric(x)
+
+    return str(x), x
+
+
 def ticks_to_date(ticks) -> datetime.datetime:
     """
     converts C# / .NET ticks to
@@ -0,0 +1,467 @@
+import time
+from collections import deque
+from itertools import islice
+
+from PyQt5.QtGui import QBrush, QColor
+from PyQt5.QtCore import (QAbstractListModel, QAbstractTableModel, QModelIndex, QObject,
+                          QTimer, Qt, pyqtSignal)
+
+
+def import_columns():
+    """
+    returns the columns module
+
+    columns imports numpy, which takes a while, the module
+    is imported when the first table is shown
+    """
+
+    from gui_template import columns
+
+    return columns
+
+
+class TableModel(QAbstractTableModel):
+
+    def __init__(self, cols=(), vals=(), parent=None):
+        """
+        table model that keeps the data in a columnar store and formats
+        cells only when they are requested by the view
+
+        use this with a QTableView instead of populating a QTableWidget
+        with one item per cell, no Python objects are created per cell
+        and the display strings are only created for the visible rows
+
+        cols is a list of column names, vals is a list of rows
+        (e.g. the return value from cursor.fetchall())
+
+        the values are converted one column at a time with columns.convert_column,
+        the display strings are the same as in helper.populate_table
+        """
+
+        super().__init__(parent)
+
+        self.cols = []
+
+        # one columns.Column per column
+        self.columns = []
+        self.n_rows = 0
+
+        # row order after sorting (array of row indices in the columns)
+        # None if the table is not sorted
+        self.order = None
+
+        # list of (column, descending), the first key is the primary sort key
+        self.sort_keys = []
+
+        self.setTable(cols, vals)
+
+    def setTable(self, cols, vals):
+        """
+        replaces all data in the model
+        """
+
+        convert_column = import_columns().convert_column
+
+        self.beginResetModel()
+
+        self.cols = [str(n) for n in cols]
+        self.n_rows = len(vals)
+
+        # zip(*vals) transposes the rows
+        if self.n_rows:
+            self.columns = [convert_column(n) for n in zip(*vals)]
+        else:
+            self.columns = [convert_column(()) for _ in self.cols]
+
+        self.order = None
+        self.sort_keys = []
+
+        self.endResetModel()
+
+    def appendRows(self, vals):
+        """
+        appends the rows in vals (list of rows) at the end of the table
+
+        in case the table is sorted, the new rows are added last,
+        call sortBy(self.sort_keys) to sort them
+        """
+
+        n = len(vals)
+
+        if not n:
+            return
+
+        convert_column = import_columns().convert_column
+
+        batch = [convert_column(c) for c in zip(*vals)]
+
+        self.beginInsertRows(QModelIndex(), self.n_rows, self.n_rows + n - 1)
+
+        for column, new in zip(self.columns, batch):
+            column.extend(new)
+
+        if self.order is not None:
+            self.order.extend(range(self.n_rows, self.n_rows + n))
+
+        self.n_rows += n
+
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+
+        # this is a flat table, items have no children
+        if parent.isValid():
+            return 0
+
+        return self.n_rows
+
+    def columnCount(self, parent=QModelIndex()):
+
+        if parent.isValid():
+            return 0
+
+        return len(self.cols)
+
+    def data(self, index, role=Qt.DisplayRole):
+
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        row = index.row()
+
+        if self.order is not None:
+            row = self.order[row]
+
+        # None if the cell should be empty
+        return self.columns[index.column()].text(row)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+
+        if role != Qt.DisplayRole:
+            return None
+
+        if orientation == Qt.Horizontal:
+            return self.cols[section]
+
+        # row numbers start at 1, same as for QTableWidget
+        return str(section + 1)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        called by the view when the user clicks a header section
+
+        sorts the current row order by column, the previous sort
+        keys are kept as secondary keys since the sort is stable
+
+        column -1 restores the original order
+        """
+
+        if column < 0 or column >= len(self.columns):
+            self.sortBy([])
+            return
+
+        descending = order == Qt.DescendingOrder
+        keys = [(column, descending)] + [n for n in self.sort_keys if n[0] != column]
+
+        # re-sort the current order by the new primary key only
+        if self.sort_keys and self.sort_keys[0][0] != column:
+            self.setOrder(import_columns().sort_rows(self.columns, keys[:1], rows=self.order), keys)
+        else:
+            self.sortBy(keys)
+
+    def sortBy(self, keys):
+        """
+        sorts by keys, a list of (column, descending) tuples
+        the first key is the primary sort key
+        """
+
+        self.setOrder(import_columns().sort_rows(self.columns, keys), keys)
+
+    def setOrder(self, order, keys):
+        """
+        applies the row order (array of row indices, None for the original order)
+        """
+
+        self.layoutAboutToBeChanged.emit()
+
+        persistent = self.persistentIndexList()
+        previous = self.order
+
+        self.order = order
+        self.sort_keys = list(keys)
+
+        # indices that the view keeps (e.g. selection, current cell) must be moved
+        if persistent:
+
+            # position of each row in the new order
+            position = import_columns().invert_order(order) if order is not None else None
+
+            new = []
+
+            for index in persistent:
+
+                row = index.row()
+
+                if previous is not None:
+                    row = previous[row]
+
+                if position is not None:
+                    row = position[row]
+
+                new.append(self.index(row, index.column()))
+
+            self.changePersistentIndexList(persistent, new)
+
+        self.layoutChanged.emit()
+
+
+class TablePopulator(QObject):
+
+    # number of rows that have been added so far
+    progress = pyqtSignal(int)
+
+    # emitted with the stats dict when all rows have been added or when cancelled
+    finished = pyqtSignal(dict)
+
+    def __init__(self, model, rows, interval=0.016, first=100, parent=None):
+        """
+        adds rows to a TableModel in batches without blocking the event loop
+
+        rows is an iterator (or list) of rows, a sqlite3.Cursor or a
+        query.RowStream (closed when finished or cancelled), the rows
+        are fetched and added in batches that take about interval seconds
+        each (default 16 ms), the event loop runs in between the batches
+        so the GUI stays responsive and the view shows the rows that have
+        been added so far
+
+        the first batch has first rows (about one screen) and is added
+        directly when start is called
+
+        the stats attribute contains
+            rows: number of rows that were added
+            first_row: seconds until the first rows were added
+            total: seconds until all rows were added (or cancelled)
+            cancelled: True if cancel was called before all rows were added
+            error: the error message in case fetching or adding the rows failed
+                   (finished is emitted, the rows added so far are kept)
+        """
+
+        super().__init__(parent)
+
+        self.model = model
+        self.rows = rows
+        self.interval = interval
+        self.first = first
+
+        # number of rows per batch
+        self.batch = first
+
+        self.iterator = None
+        self.t0 = None
+
+        self.stats = {'rows': 0, 'first_row': None,
+                      'total': None, 'cancelled': False, 'error': None}
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.step)
+
+    def start(self):
+
+        self.t0 = time.perf_counter()
+
+        if not hasattr(self.rows, 'fetchmany'):
+            self.iterator = iter(self.rows)
+
+        # show the first screen right away
+        if self.tryAddRows(self.first):
+            self.timer.start()
+
+    def cancel(self):
+
+        if self.stats['total'] is not None:
+            return
+
+        self.stats['cancelled'] = True
+        self.finish()
+
+    def fetch(self, n) -> list:
+
+        if self.iterator is None:
+            return self.rows.fetchmany(n)
+
+        return list(islice(self.iterator, n))
+
+    def addRows(self, n) -> bool:
+        """
+        fetches and adds n rows, returns False in case there are no more rows
+        """
+
+        rows = self.fetch(n)
+        self.model.appendRows(rows)
+
+        if rows and self.stats['first_row'] is None:
+            self.stats['first_row'] = time.perf_counter() - self.t0
+
+        self.stats['rows'] += len(rows)
+        self.progress.emit(self.stats['rows'])
+
+        if len(rows) < n:
+            self.finish()
+            return False
+
+        return True
+
+    def tryAddRows(self, n) -> bool:
+        """
+        same as addRows, in case the iterator or cursor raises the error is
+        stored in stats and finish is called
+
+        NOTE: an exception that is raised in a slot (e.g. the timer) aborts
+        the program with PyQt5, so it must not be raised from step
+        """
+
+        try:
+            return self.addRows(n)
+
+        except Exception as e:
+            self.stats['error'] = str(e) or type(e).__name__
+            self.finish()
+            return False
+
+    def step(self):
+        """
+        adds rows for about self.interval seconds, the number of rows
+        per batch is adjusted based on the time the previous batch took
+        """
+
+        t = time.perf_counter()
+        deadline = t + self.interval
+
+        n = self.batch
+
+        while True:
+
+            if not self.tryAddRows(n):
+                return
+
+            now = time.perf_counter()
+
+            # rows per second, at most double the batch size each time
+            rate = n / max(now - t, 1e-6)
+            self.batch = max(1, min(2 * self.batch, int(rate * self.interval)))
+
+            if now >= deadline:
+                return
+
+            n = max(1, min(self.batch, int(rate * (deadline - now))))
+            t = now
+
+    def finish(self):
+
+        self.timer.stop()
+
+        # e.g. returns the connection of a query.RowStream to the pool
+        if hasattr(self.rows, 'close'):
+            self.rows.close()
+
+        self.stats['total'] = time.perf_counter() - self.t0
+        self.finished.emit(dict(self.stats))
+
+
+class LogModel(QAbstractListModel):
+
+    def __init__(self, max_lines=10000, colors=None, parent=None):
+        """
+        list model for the lines in the log, the lines are kept in a ring buffer
+        (deque) of max_lines lines, the oldest lines are dropped when new lines
+        are appended
+
+        use this with a QTableView (one column, fixed row height) instead of a
+        QTextBrowser, only the visible lines are drawn and appending lines
+        does not lay out the whole document again
+
+            NOTE: QListView lays out all rows each time rows are added or
+            removed, even with uniformItemSizes, QTableView does not
+
+        colors is a dict with the text color for each level, e.g. {'ERROR': '#ff0000'},
+        the level is the third word in the line (after the date and time)
+        """
+
+        super().__init__(parent)
+
+        self.lines = deque(maxlen=max_lines)
+
+        # QBrush objects are created once per level
+        self.brushes = {level: QBrush(QColor(color))
+                        for level, color in (colors or {}).items()}
+
+    def appendLines(self, lines):
+        """
+        appends the lines (list of str) at the end, the first lines
+        are removed in case there are more than max_lines lines
+        """
+
+        if not lines:
+            return
+
+        maxlen = self.lines.maxlen
+
+        if len(lines) >= maxlen:
+
+            self.beginResetModel()
+
+            self.lines.clear()
+            self.lines.extend(lines[-maxlen:])
+
+            self.endResetModel()
+
+            return
+
+        n_remove = len(self.lines) + len(lines) - maxlen
+
+        if n_remove > 0:
+
+            self.beginRemoveRows(QModelIndex(), 0, n_remove - 1)
+
+            for _ in range(n_remove):
+                self.lines.popleft()
+
+            self.endRemoveRows()
+
+        n = len(self.lines)
+
+        self.beginInsertRows(QModelIndex(), n, n + len(lines) - 1)
+        self.lines.extend(lines)
+        self.endInsertRows()
+
+    def clear(self):
+
+        self.beginResetModel()
+        self.lines.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+
+        if parent.isValid():
+            return 0
+
+        return len(self.lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+
+        if not index.isValid():
+            return None
+
+        if role == Qt.DisplayRole:
+            return self.lines[index.row()]
+
+        if role == Qt.ForegroundRole:
+
+            # 2020-01-01 12:00:00 INFO     message
+            words = self.lines[index.row()].split(None, 3)
+
+            if len(words) > 2:
+                return self.brushes.get(words[2])
+
+        return None
@@ -0,0 +1,258 @@
+import re
+import math
+import threading
+
+from collections import deque
+
+
+# number of latencies that are kept for each statement (for the p95 latency)
+MAX_SAMPLES = 1000
+
+# number of statements that SQLProfiler.explain_slowest runs EXPLAIN QUERY PLAN on
+EXPLAIN_COUNT = 5
+
+# quoted identifiers are kept, string and numeric literals are replaced by ?
+# so that the same statement with different values is counted together
+SQL_LITERALS = re.compile(r"""("(?:[^"]|"")*")|'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b|(\s+)""")
+
+# lists of values, e.g. IN (?, ?, ?) → IN (?)
+SQL_VALUE_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+# rows of a multi-row INSERT (after SQL_VALUE_LISTS), e.g. VALUES (?), (?) → VALUES (?)
+SQL_VALUE_ROWS = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+
+
+def normalize_statement(sql: str) -> str:
+    """
+    returns sql with all literal values replaced by ? and whitespace collapsed,
+    statements that only differ in their values are normalized to the same text
+
+    e.g. SELECT * FROM data WHERE id IN (1, 2, 3) AND name = 'x'
+      → SELECT * FROM data WHERE id IN (?) AND name = ?
+    """
+
+    def replace(match):
+
+        # quoted identifier
+        if match.group(1) is not None:
+            return match.group(1)
+
+        # whitespace
+        if match.group(2) is not None:
+            return ' '
+
+        return '?'
+
+    sql = SQL_LITERALS.sub(replace, sql).strip()
+
+    sql = SQL_VALUE_LISTS.sub('(?)', sql)
+
+    return SQL_VALUE_ROWS.sub('(?)', sql)
+
+
+def percentile(values, p) -> float:
+    """
+    returns the p-th percentile (0-100) of values (nearest rank)
+    """
+
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class SQLProfiler:
+
+    def __init__(self):
+        """
+        collects statistics for the SQL statements that are executed on a database
+
+        trace is used as trace callback (sqlite3.Connection.set_trace_callback,
+        the callback argument of io.DatabaseHandler), it counts how many times
+        each statement is executed
+
+        the query layer (query.ConnectionPool) measures the time of each query and
+        calls record with the time and the number of rows, the trace callback
+        does not know how long a statement takes
+
+        statements are grouped by their normalized text (see normalize_statement)
+
+        usage:
+            profiler = SQLProfiler()
+
+            db = DatabaseHandler(path, callback=profiler.trace)
+            pool = ConnectionPool(db, profiler=profiler)
+
+            ...
+
+            for row in profiler.report():
+                print(row['sql'], row['calls'], row['p95'])
+        """
+
+        # normalized sql: {traced, timed, total, rows, samples, sample}
+        self.statements = {}
+
+        # the callbacks are called from several threads
+        self.lock = threading.Lock()
+
+    def get_entry(self, key) -> dict:
+
+        entry = self.statements.get(key)
+
+        if entry is None:
+            entry = self.statements[key] = {'traced': 0,
+                                            'timed': 0,
+                                            'total': 0.0,
+                                            'rows': 0,
+                                            'samples': deque(maxlen=MAX_SAMPLES),
+                                            'sample': None}
+
+        return entry
+
+    def trace(self, sql: str) -> None:
+        """
+        trace callback, sql is the statement with the values of the parameters
+        """
+
+        key = normalize_statement(sql)
+
+        with self.lock:
+
+            entry = self.get_entry(key)
+            entry['traced'] += 1
+
+            # used by explain in case record is not called for this statement
+            if entry['sample'] is None:
+                entry['sample'] = (sql, ())
+
+    def record(self, sql: str, elapsed: float, rows=0, params=()) -> None:
+        """
+        records that sql (with parameters params) took elapsed seconds
+        and returned (or modified) rows rows
+
+        params is None in case the parameters are not known (e.g. executemany)
+        """
+
+        key = normalize_statement(sql)
+
+        with self.lock:
+
+            entry = self.get_entry(key)
+
+            entry['timed'] += 1
+            entry['total'] += elapsed
+            entry['rows'] += max(rows, 0)
+            entry['samples'].append(elapsed)
+
+            # the traced statement contains the values of the parameters
+            if params is not None or entry['sample'] is None:
+                entry['sample'] = (sql, params)
+
+    def reset(self) -> None:
+
+        with self.lock:
+            self.statements = {}
+
+    def report(self) -> list:
+        """
+        returns a list with one dict per statement, the statements that
+        took the most time in total are first
+
+        each dict contains
+            sql: normalized statement
+            calls: number of times the statement was executed
+            total, mean, p95: latency in seconds (of the timed calls)
+            rows: number of rows returned (or modified)
+        """
+
+        with self.lock:
+            items = [(key, dict(entry, samples=list(entry['samples'])))
+                     for key, entry in self.statements.items()]
+
+        report = []
+
+        for key, entry in items:
+
+            # executemany is traced once for each row but timed once
+            calls = max(entry['traced'], entry['timed'])
+
+            report.append({'sql': key,
+                           'calls': calls,
+                           'total': entry['total'],
+                           'mean': entry['total'] / entry['timed'] if entry['timed'] else 0.0,
+                           'p95': percentile(entry['samples'], 95),
+                           'rows': entry['rows']})
+
+        return sorted(report, key=lambda n: (n['total'], n['calls']), reverse=True)
+
+    def slowest(self, n=EXPLAIN_COUNT) -> list:
+        """
+        returns the n statements with the highest p95 latency
+        """
+
+        report = [n for n in self.report() if n['total'] > 0]
+
+        return sorted(report, key=lambda n: n['p95'], reverse=True)[:n]
+
+    def explain(self, connection, sql) -> list:
+        """
+        runs EXPLAIN QUERY PLAN for the normalized statement sql on connection,
+        using the last values that the statement was executed with
+
+        returns a list of lines (indented by depth in the query plan), e.g.
+            SCAN data
+            USE TEMP B-TREE FOR ORDER BY
+        """
+
+        with self.lock:
+            entry = self.statements.get(sql)
+            sample = entry['sample'] if entry is not None else None
+
+        if sample is None:
+            return []
+
+        statement, params = sample
+
+        # the values don't matter for the query plan
+        if params is None:
+            params = (None, ) * statement.count('?')
+
+        # only queries (not e.g. PRAGMA or BEGIN) have a query plan
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT',
+                                                      'UPDATE', 'DELETE', 'REPLACE')):
+            return []
+
+        rows = connection.execute(f'EXPLAIN QUERY PLAN {statement}', params).fetchall()
+
+        # id: depth
+        depth = {0: -1}
+        lines = []
+
+        for node, parent, _, detail in rows:
+
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append(f'{"  " * depth[node]}{detail}')
+
+        return lines
+
+    def explain_slowest(self, connection, n=EXPLAIN_COUNT) -> list:
+        """
+        returns a list of (report dict, query plan lines) for the n slowest statements
+        """
+
+        result = []
+
+        for row in self.slowest(n):
+
+            try:
+                plan = self.explain(connection, row['sql'])
+
+            # e.g. a table that was created by a statement has been dropped
+            except Exception as e:
+                plan = [f'could not explain: {e}']
+
+            result.append((row, plan))
+
+        return result
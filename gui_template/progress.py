@@ -1,7 +1,87 @@
+import time
+
 from PyQt5 import QtCore, QtWidgets
 from contextlib import contextmanager
 
 
+# the progressbar is updated when the integer percentage changes,
+# but at most once per MIN_INTERVAL seconds, and at least once per MAX_INTERVAL
+# seconds to keep the GUI responsive, see ProgressThrottle
+MIN_INTERVAL = 0.05
+MAX_INTERVAL = 0.25
+
+
+class ProgressThrottle:
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        """
+        decides when a progress update should be shown
+
+        calling the instance with the progress in percent returns True in case
+        the update should be shown, this is cheap compared to app.processEvents
+        so it can be called for each row in a loop
+
+        also keeps track of the rate (percent per second) and the
+        estimated time left
+        """
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self.t0 = time.perf_counter()
+        self.last_time = None
+        self.last_percent = None
+
+        self.value = 0
+
+    def __call__(self, val) -> bool:
+
+        self.value = val
+
+        t = time.perf_counter()
+
+        # always show the first update
+        if self.last_time is None:
+            self.last_time = t
+            self.last_percent = int(val)
+            return True
+
+        dt = t - self.last_time
+
+        if dt < self.max_interval and (dt < self.min_interval or int(val) == self.last_percent):
+            return False
+
+        self.last_time = t
+        self.last_percent = int(val)
+
+        return True
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    @property
+    def rate(self) -> float:
+        """
+        percent per second since the start
+        """
+
+        return self.value / max(self.elapsed, 1e-9)
+
+    @property
+    def eta(self):
+        """
+        estimated number of seconds left, None if no progress has been made yet
+        """
+
+        rate = self.rate
+
+        if rate <= 0:
+            return None
+
+        return max(100 - self.value, 0) / rate
+
+
 class ProgressBarForm:
 
     def setupUi(self, Form):
@@ -38,11 +118,14 @@ class ProgressBarForm:
 
 class MyProgressBar(QtWidgets.QDialog, ProgressBarForm):
 
-    def __init__(self, parent=None, description=None, busy=False):
+    def __init__(self, parent=None, description=None, busy=False, cancel=None):
         """
         a progressbar that prevents focus elsewhere in the GUI
 
         if busy=True, show a busy indication instead of progress
+
+        if cancel is not None, a Cancel button is shown that calls cancel
+        (also called if the dialog is closed by the user)
         """
 
         super(MyProgressBar, self).__init__(
@@ -55,6 +138,22 @@ class MyProgressBar(QtWidgets.QDialog, ProgressBarForm):
         self.app = parent.app
         self.currval = 0
 
+        # decides when the GUI is updated
+        self.throttle = ProgressThrottle()
+
+        # True if there is an update that has not been shown yet
+        self.due = False
+
+        self.cancel = cancel
+
+        if cancel is not None:
+
+            self.resize(400, 120)
+
+            self.cancelButton = QtWidgets.QPushButton('Cancel', self)
+            self.cancelButton.setGeometry(QtCore.QRect(290, 75, 80, 30))
+            self.cancelButton.clicked.connect(self.close)
+
         self.show()
 
         if busy:
@@ -66,15 +165,59 @@ class MyProgressBar(QtWidgets.QDialog, ProgressBarForm):
             self.setDescription(description)
 
     def setValue(self, val):
+        """
+        the progressbar is only changed when the update is due (see ProgressThrottle)
+        so this can be called for each iteration in a loop
+        """
 
-        self.progressBar.setProperty('value', val)
         self.currval = val
+        self.due = self.throttle(val)
+
+        if not self.due:
+            return
+
+        self.progressBar.setProperty('value', val)
+
+        eta = self.throttle.eta
+
+        # show the time left for processes that take a while
+        if eta is not None and self.throttle.elapsed > 2:
+            self.progressBar.setFormat(f'%p%  ({eta:.0f} s left)')
+
+    @property
+    def rate(self) -> float:
+        return self.throttle.rate
+
+    @property
+    def eta(self):
+        return self.throttle.eta
 
     def setDescription(self, description):
         self.setWindowTitle(description)
 
-    def update(self):
-        self.app.processEvents()
+    def update(self, force=False):
+        """
+        processes events in case the last value from setValue was shown
+        """
+
+        if self.due or force:
+            self.due = False
+            self.app.processEvents()
+
+    def finish(self):
+        """
+        closes the dialog without calling cancel
+        """
+
+        self.cancel = None
+        self.close()
+
+    def closeEvent(self, event):
+
+        if self.cancel is not None:
+            self.cancel()
+
+        event.accept()
 
 
 @contextmanager
@@ -86,13 +229,14 @@ def progress(parent, description='Progress', busy=False) -> MyProgressBar:
 
     need to call pb.update() to update pb manually where this is used,
     for example each iteration in a loop
+    pb.setValue and pb.update only update the GUI when needed, see ProgressThrottle
     """
 
     pb = MyProgressBar(parent, description=description, busy=busy)
 
     # make sure the progressbar starts at 0
     pb.setValue(0)
-    pb.update()
+    pb.update(force=True)
 
     yield pb
 
@@ -0,0 +1,495 @@
+import re
+import queue
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+
+from gui_template.io import MMAP_SIZE
+from gui_template.sql import (build_insert, build_update, build_upsert,
+                              bulk_insert, bulk_update, bulk_upsert)
+
+
+# maximum number of read connections in a ConnectionPool
+# reads from the shared in-memory database are serialized by SQLite for the most part,
+# more connections mainly help for lazy databases (separate file connections)
+POOL_SIZE = 4
+
+# number of prepared statements that each connection keeps
+# (the cached_statements argument of sqlite3.connect, the default is 128)
+STATEMENT_CACHE_SIZE = 256
+
+# default number of rows that are fetched at a time, see RowStream
+BLOCK_SIZE = 1000
+
+# string literals, quoted identifiers and comments are kept as they are
+# by normalize_sql, whitespace outside of these is collapsed
+SQL_TOKENS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/)|(\s+)""",
+                        re.DOTALL)
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def normalize_sql(sql: str) -> str:
+    """
+    collapses whitespace in sql (except inside string literals and quoted names)
+
+    the prepared statements of a connection are cached by the exact SQL text,
+    statements that only differ in whitespace (e.g. the same query written
+    as a multi-line string in different places) share the prepared statement
+    """
+
+    def replace(match):
+
+        if match.group(1) is not None:
+
+            # a line comment must still end with a line break
+            if match.group(1).startswith('--'):
+                return match.group(1) + '\n'
+
+            return match.group(1)
+
+        return ' '
+
+    return SQL_TOKENS.sub(replace, sql).strip()
+
+
+def get_columns(rows) -> list:
+    """
+    returns the column names of a sqlite3.Cursor or RowStream
+    """
+
+    if isinstance(rows, RowStream):
+        return rows.cols
+
+    # description is None for statements that don't return rows
+    return [n[0] for n in rows.description or ()]
+
+
+def fetch_blocks(rows, size=BLOCK_SIZE):
+    """
+    yields lists of at most size rows from rows, which can be a
+    sqlite3.Cursor or RowStream (uses fetchmany), a list or any iterator
+
+    only one block is kept in memory at a time (unless rows is a list)
+    """
+
+    if hasattr(rows, 'fetchmany'):
+
+        while True:
+
+            block = rows.fetchmany(size)
+
+            if not block:
+                return
+
+            yield block
+
+    elif isinstance(rows, (list, tuple)):
+
+        for i in range(0, len(rows), size):
+            yield rows[i:i + size]
+
+    else:
+
+        iterator = iter(rows)
+
+        while True:
+
+            block = list(islice(iterator, size))
+
+            if not block:
+                return
+
+            yield block
+
+
+class RowStream:
+
+    def __init__(self, cursor, size=BLOCK_SIZE, on_close=None):
+        """
+        iterates over the rows of a query (cursor is a sqlite3.Cursor)
+        without fetching all rows at once, the rows are fetched in blocks
+        of size rows with cursor.fetchmany
+
+        the column names are available as the cols attribute
+
+        on_close is called once when the stream is exhausted or closed
+        (e.g. to return the connection to a ConnectionPool)
+
+        usage:
+            rows = RowStream(db.connection.execute('SELECT * FROM data'))
+
+            for block in rows.blocks():
+                ...
+        """
+
+        self.cursor = cursor
+        self.size = size
+        self.on_close = on_close
+
+        self.cols = get_columns(cursor)
+
+        # number of rows fetched so far
+        self.rows = 0
+
+        # time spent in cursor.fetchmany (seconds)
+        self.elapsed = 0.0
+
+    def fetchmany(self, size=None) -> list:
+        """
+        returns the next size rows (default self.size), an empty list
+        when there are no more rows
+        """
+
+        if self.cursor is None:
+            return []
+
+        t = time.perf_counter()
+
+        block = self.cursor.fetchmany(size or self.size)
+
+        self.elapsed += time.perf_counter() - t
+        self.rows += len(block)
+
+        if not block:
+            self.close()
+
+        return block
+
+    def blocks(self):
+        return fetch_blocks(self, self.size)
+
+    def __iter__(self):
+
+        for block in self.blocks():
+            yield from block
+
+    def close(self) -> None:
+
+        if self.cursor is None:
+            return
+
+        self.cursor.close()
+        self.cursor = None
+
+        if self.on_close is not None:
+            self.on_close()
+
+    # in case the stream is not exhausted or closed
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ConnectionPool:
+
+    def __init__(self, db, size=POOL_SIZE, cached_statements=STATEMENT_CACHE_SIZE,
+                 profiler=None):
+        """
+        thread-safe query API for an io.DatabaseHandler
+
+        reads (execute, fetchall, fetchone) use a pool of at most size
+        connections to the same database (db.uri), each connection is used
+        by one thread at a time, threads wait for a free connection in case
+        all connections are in use
+
+            the in-memory database uses the shared cache, the pool connections
+            use PRAGMA read_uncommitted so that reads are not blocked by
+            (and do not block) writes on db.connection
+
+        writes (write, executemany, bulk_insert) use db.connection while holding
+        db.lock, the rows are written in a single transaction that is
+        committed when all rows are written (rolled back in case of an error)
+
+        each connection keeps the last cached_statements prepared statements,
+        the SQL is passed through normalize_sql so that the same statement
+        is not prepared again in case it is written differently
+
+        if profiler (profiler.SQLProfiler) is given, the time and number of rows
+        of each query is recorded and the pool connections are traced
+
+        usage:
+            pool = ConnectionPool(db)
+
+            # can be called from any thread
+            rows = pool.fetchall('SELECT * FROM data WHERE id > ?', (10, ))
+            n = pool.executemany('INSERT INTO data VALUES (?, ?)', rows)
+
+            pool.close()
+        """
+
+        self.db = db
+
+        # lazy databases are read-only files, see io.DatabaseHandler.load_lazy
+        self.uri = db.uri
+        self.lazy = db.lazy
+
+        self.size = size
+        self.cached_statements = cached_statements
+
+        self.profiler = profiler
+
+        # connections that are not used at the moment, the most recently
+        # used connection is used first
+        self.idle = queue.LifoQueue()
+
+        # limits the number of connections that are in use at the same time
+        self.available = threading.BoundedSemaphore(size)
+
+        self.closed = False
+
+    def connect(self) -> sqlite3.Connection:
+
+        connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False,
+                                     cached_statements=self.cached_statements)
+
+        # pool connections are only used for reading
+        connection.execute('PRAGMA query_only = 1')
+
+        if self.lazy:
+            connection.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+        else:
+            connection.execute('PRAGMA read_uncommitted = 1')
+
+        if self.profiler is not None:
+            connection.set_trace_callback(self.profiler.trace)
+
+        return connection
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        returns a connection from the pool, waits in case all connections are used
+        the connection must be returned with release
+        """
+
+        if self.closed:
+            raise sqlite3.ProgrammingError('the connection pool is closed')
+
+        self.available.acquire()
+
+        try:
+            return self.idle.get_nowait()
+
+        # connections are created when they are needed
+        except queue.Empty:
+            pass
+
+        try:
+            return self.connect()
+
+        except BaseException:
+            self.available.release()
+            raise
+
+    def release(self, connection) -> None:
+
+        # close was called while the connection was used
+        if self.closed:
+            connection.close()
+        else:
+            self.idle.put(connection)
+
+        self.available.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        context manager that returns a connection from the pool
+        the connection must only be used inside the with block
+        """
+
+        connection = self.acquire()
+
+        try:
+            yield connection
+
+        finally:
+            self.release(connection)
+
+    def fetchall(self, sql, params=()) -> list:
+        """
+        runs the query sql with parameters params on a pool connection
+        and returns all rows
+        """
+
+        sql = normalize_sql(sql)
+
+        with self.connection() as connection:
+
+            t = time.perf_counter()
+            rows = connection.execute(sql, params).fetchall()
+
+        self.record(sql, time.perf_counter() - t, len(rows), params)
+
+        return rows
+
+    def fetchone(self, sql, params=()):
+
+        sql = normalize_sql(sql)
+
+        with self.connection() as connection:
+
+            t = time.perf_counter()
+            row = connection.execute(sql, params).fetchone()
+
+        self.record(sql, time.perf_counter() - t, int(row is not None), params)
+
+        return row
+
+    def execute(self, sql, params=()) -> list:
+        """
+        same as fetchall, the returned rows are a list (not a cursor) since
+        the connection is returned to the pool
+        """
+
+        return self.fetchall(sql, params)
+
+    def stream(self, sql, params=(), size=BLOCK_SIZE) -> 'RowStream':
+        """
+        runs the query sql and returns a RowStream that fetches the rows in
+        blocks of size rows, the pool connection is used until the stream
+        is exhausted or closed
+
+        usage:
+            with pool.stream('SELECT * FROM data') as rows:
+                for row in rows:
+                    ...
+        """
+
+        sql = normalize_sql(sql)
+
+        connection = self.acquire()
+
+        try:
+            t = time.perf_counter()
+            cursor = connection.execute(sql, params)
+            elapsed = time.perf_counter() - t
+
+        except BaseException:
+            self.release(connection)
+            raise
+
+        def close():
+
+            self.release(connection)
+            self.record(sql, elapsed + stream.elapsed, stream.rows, params)
+
+        stream = RowStream(cursor, size=size, on_close=close)
+
+        return stream
+
+    def write(self, sql, params=()) -> int:
+        """
+        runs a single statement that modifies the database on db.connection,
+        returns the number of modified rows
+        """
+
+        return self.executemany(sql, (params, ))
+
+    def executemany(self, sql, rows) -> int:
+        """
+        runs sql once for each parameter tuple in rows (can be an iterator)
+        in a single transaction, returns the number of modified rows
+        """
+
+        if self.lazy:
+            raise PermissionError(f'{self.db.path} is opened read-only (lazy=True)')
+
+        sql = normalize_sql(sql)
+
+        with self.db.lock:
+
+            connection = self.db.connection
+
+            t = time.perf_counter()
+
+            try:
+                cursor = connection.executemany(sql, rows)
+                connection.commit()
+
+            except BaseException:
+                connection.rollback()
+                raise
+
+        # the parameters are not kept, rows can be an iterator
+        self.record(sql, time.perf_counter() - t, cursor.rowcount, None)
+
+        return cursor.rowcount
+
+    def record(self, sql, elapsed, rows, params) -> None:
+
+        if self.profiler is not None:
+            self.profiler.record(sql, elapsed, rows=rows, params=params)
+
+    def bulk_insert(self, table, cols, rows, replace=False, chunk_size=None) -> int:
+        """
+        inserts rows (list or iterator of tuples with one value per column in cols)
+        into table using multi-row INSERT statements (see sql.bulk_insert),
+        returns the number of inserted rows
+
+        the rows are written in a single transaction, or in
+        transactions of chunk_size rows
+
+        if replace is True, rows that conflict with existing rows replace them
+        """
+
+        return self.bulk(bulk_insert, build_insert(table, cols, replace=replace),
+                         table, cols, rows, replace=replace, chunk_size=chunk_size)
+
+    def bulk_update(self, table, cols, keys, rows, chunk_size=None) -> int:
+        """
+        updates cols where keys match, see sql.bulk_update
+        """
+
+        return self.bulk(bulk_update, build_update(table, cols, keys),
+                         table, cols, keys, rows, chunk_size=chunk_size)
+
+    def bulk_upsert(self, table, cols, keys, rows, chunk_size=None) -> int:
+        """
+        inserts or updates rows, see sql.bulk_upsert
+        """
+
+        return self.bulk(bulk_upsert, build_upsert(table, cols, keys),
+                         table, cols, keys, rows, chunk_size=chunk_size)
+
+    def bulk(self, func, sql, *args, **kwargs) -> int:
+        """
+        runs func (one of the bulk functions in sql.py) on db.connection,
+        sql is the statement that is recorded by the profiler
+        """
+
+        if self.lazy:
+            raise PermissionError(f'{self.db.path} is opened read-only (lazy=True)')
+
+        with self.db.lock:
+
+            t = time.perf_counter()
+            n = func(self.db.connection, *args, **kwargs)
+
+        self.record(sql, time.perf_counter() - t, n, None)
+
+        return n
+
+    def close(self) -> None:
+        """
+        closes all connections, the connections that are in use
+        are closed when they are returned
+        """
+
+        self.closed = True
+
+        while True:
+
+            try:
+                self.idle.get_nowait().close()
+
+            except queue.Empty:
+                break
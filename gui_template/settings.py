@@ -1,4 +1,5 @@
 import os
+import copy
 import json
 
 
@@ -42,7 +43,13 @@ class Settings:
         if os.path.isfile(self.file_path):
 
             # this function checks other encodings that utf-8 if necessary
-            self.sdict = load_json(self.file_path)
+            # the loaded object is cached by load_json, copy it since
+            # the settings are modified
+            self.sdict = copy.deepcopy(load_json(self.file_path))
+
+            if self.sdict is False:
+                print(f'could not load {self.file_path}, using default settings')
+                self.sdict = get_default_settings()
         else:
             self.sdict = get_default_settings()
 
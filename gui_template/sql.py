@@ -0,0 +1,226 @@
+import sqlite3
+
+from gui_template.misc import divide_chunks
+
+
+# number of rows that are written in each transaction by the bulk functions
+CHUNK_SIZE = 10000
+
+# maximum number of rows in a multi-row INSERT statement, longer statements
+# take longer to prepare without making the insert faster
+MAX_STATEMENT_ROWS = 500
+
+# maximum number of ? in a statement in case the limit cannot be read from the
+# connection (SQLITE_MAX_VARIABLE_NUMBER is 999 before SQLite 3.32)
+DEFAULT_MAX_VARIABLES = 999
+
+
+def quote_identifier(name: str) -> str:
+    """
+    quotes a table or column name, double quotes in the name are escaped
+    """
+
+    name = str(name).replace('"', '""')
+
+    return f'"{name}"'
+
+
+def get_max_variables(connection) -> int:
+    """
+    returns the maximum number of parameters (?) in a statement for connection
+    """
+
+    # Python 3.11+
+    if hasattr(connection, 'getlimit'):
+        return connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+
+    return DEFAULT_MAX_VARIABLES
+
+
+def build_insert(table, cols, rows=1, replace=False) -> str:
+    """
+    returns an INSERT statement for table with a ? for each value, e.g.
+
+        INSERT INTO "data" ("id", "name") VALUES (?, ?), (?, ?)
+
+    for rows=2, the parameters are the values of all rows after each other
+    if replace is True, rows that conflict with existing rows replace them
+    """
+
+    verb = 'INSERT OR REPLACE' if replace else 'INSERT'
+
+    names = ', '.join(quote_identifier(n) for n in cols)
+    values = ', '.join([f'({", ".join("?" for _ in cols)})'] * rows)
+
+    return f'{verb} INTO {quote_identifier(table)} ({names}) VALUES {values}'
+
+
+def build_update(table, cols, keys) -> str:
+    """
+    returns an UPDATE statement that sets cols for the row(s) where keys match, e.g.
+
+        UPDATE "data" SET "name" = ?, "value" = ? WHERE "id" = ?
+
+    the parameters are the values of cols followed by the values of keys
+    """
+
+    values = ', '.join(f'{quote_identifier(n)} = ?' for n in cols)
+    where = ' AND '.join(f'{quote_identifier(n)} = ?' for n in keys)
+
+    return f'UPDATE {quote_identifier(table)} SET {values} WHERE {where}'
+
+
+def build_upsert(table, cols, keys) -> str:
+    """
+    returns an INSERT statement that updates the existing row in case a row
+    with the same keys exists (there must be a unique index on keys), e.g.
+
+        INSERT INTO "data" ("id", "name") VALUES (?, ?)
+        ON CONFLICT ("id") DO UPDATE SET "name" = excluded."name"
+
+    cols contains all columns (including keys), the parameters are the values of cols
+    """
+
+    update = [n for n in cols if n not in keys]
+
+    sql = build_insert(table, cols)
+    conflict = ', '.join(quote_identifier(n) for n in keys)
+
+    if not update:
+        return f'{sql} ON CONFLICT ({conflict}) DO NOTHING'
+
+    values = ', '.join(f'{quote_identifier(n)} = excluded.{quote_identifier(n)}' for n in update)
+
+    return f'{sql} ON CONFLICT ({conflict}) DO UPDATE SET {values}'
+
+
+def execute_chunked(connection, sql, rows, chunk_size=CHUNK_SIZE, progress=None) -> int:
+    """
+    runs sql with executemany for the parameter tuples in rows (list or iterator),
+    chunk_size rows at a time, each chunk is written in its own transaction
+
+    if chunk_size is None, all rows are written in a single transaction
+
+    in case of an error, the current chunk is rolled back (the previous
+    chunks have already been committed) and the exception is raised
+
+    progress is called with the number of rows written so far after each chunk
+
+    NOTE: an open transaction on connection is committed with the first chunk
+
+    returns the number of modified rows
+    """
+
+    chunks = (rows, ) if chunk_size is None else divide_chunks(rows, chunk_size)
+
+    n = 0
+    written = 0
+
+    for chunk in chunks:
+
+        try:
+            cursor = connection.executemany(sql, chunk)
+            connection.commit()
+
+        except BaseException:
+            connection.rollback()
+            raise
+
+        n += max(cursor.rowcount, 0)
+
+        if progress is not None:
+
+            written += len(chunk) if hasattr(chunk, '__len__') else cursor.rowcount
+            progress(written)
+
+    return n
+
+
+def bulk_insert(connection, table, cols, rows, chunk_size=CHUNK_SIZE,
+                replace=False, progress=None) -> int:
+    """
+    inserts rows (list or iterator of tuples with one value per column in cols)
+    into table, returns the number of inserted rows
+
+    each statement inserts several rows (multi-row VALUES), as many as
+    the limit for the number of parameters allows (at most MAX_STATEMENT_ROWS),
+    the rows are written in transactions of chunk_size rows (see execute_chunked)
+
+    usage:
+        bulk_insert(connection, 'data', ['id', 'name'], [(1, 'a'), (2, 'b')])
+    """
+
+    if not cols:
+        return 0
+
+    per_statement = max(1, min(MAX_STATEMENT_ROWS, get_max_variables(connection) // len(cols)))
+
+    # always the same statement, so it is only prepared once (see query.STATEMENT_CACHE_SIZE)
+    sql = build_insert(table, cols, rows=per_statement, replace=replace)
+
+    n = 0
+    written = 0
+
+    chunks = (rows, ) if chunk_size is None else divide_chunks(rows, chunk_size)
+
+    for chunk in chunks:
+
+        # one tuple with the values of per_statement rows for each statement
+        groups = [[v for row in group for v in row]
+                  for group in divide_chunks(chunk, per_statement)]
+
+        last = None
+
+        # the last group is smaller, it needs a shorter statement
+        if groups and len(groups[-1]) < per_statement * len(cols):
+            last = groups.pop()
+
+        try:
+            if groups:
+                n += max(connection.executemany(sql, groups).rowcount, 0)
+
+            if last is not None:
+                short = build_insert(table, cols, rows=len(last) // len(cols), replace=replace)
+                n += max(connection.execute(short, last).rowcount, 0)
+
+            connection.commit()
+
+        except BaseException:
+            connection.rollback()
+            raise
+
+        if progress is not None:
+            written += len(groups) * per_statement + (len(last) // len(cols) if last else 0)
+            progress(written)
+
+    return n
+
+
+def bulk_update(connection, table, cols, keys, rows, chunk_size=CHUNK_SIZE, progress=None) -> int:
+    """
+    updates cols in table for the rows where keys match, rows contains tuples with
+    the values of cols followed by the values of keys, returns the number of
+    updated rows
+
+    NOTE: there should be an index on keys (e.g. the primary key),
+    otherwise each row is found with a full table scan
+
+    usage:
+        # UPDATE data SET name = 'x' WHERE id = 1 ...
+        bulk_update(connection, 'data', ['name'], ['id'], [('x', 1), ('y', 2)])
+    """
+
+    return execute_chunked(connection, build_update(table, cols, keys), rows,
+                           chunk_size=chunk_size, progress=progress)
+
+
+def bulk_upsert(connection, table, cols, keys, rows, chunk_size=CHUNK_SIZE, progress=None) -> int:
+    """
+    inserts rows (tuples with one value per column in cols) into table, existing
+    rows with the same keys are updated instead (see build_upsert)
+
+    returns the number of inserted or updated rows
+    """
+
+    return execute_chunked(connection, build_upsert(table, cols, keys), rows,
+                           chunk_size=chunk_size, progress=progress)
@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import threading
+
+from contextlib import contextmanager
+
+
+# set this environment variable to profile the startup, the value is the output
+# file (a .json file is written as Chrome trace, otherwise as a text report)
+PROFILE_ENV = 'GUI_TEMPLATE_PROFILE_STARTUP'
+
+# set this environment variable (to anything except 0) to run without showing
+# any windows (Qt offscreen platform), the program exits when the GUI is ready
+HEADLESS_ENV = 'GUI_TEMPLATE_HEADLESS'
+
+# the same as the environment variables, e.g.
+#   python app.py --profile-startup data/startup.json --headless
+PROFILE_FLAG = '--profile-startup'
+HEADLESS_FLAG = '--headless'
+
+# output file in case the flag is given without a path
+DEFAULT_PROFILE_PATH = 'data/startup.txt'
+
+# number of modules in the import section of the text report
+REPORT_IMPORTS = 30
+
+# NOTE: this module is imported before PyQt5 (and before the splash screen
+# is shown), it must not import PyQt5 or any module that imports it
+
+
+def get_time() -> float:
+    """
+    returns the time in seconds since the profiler module was imported
+    """
+
+    return time.perf_counter() - START_TIME
+
+
+START_TIME = time.perf_counter()
+
+
+class ImportTimer:
+
+    def __init__(self, profiler):
+        """
+        import hook (sys.meta_path) that measures the time to load each
+        imported module
+
+        the module is found by the other finders in sys.meta_path as usual,
+        only the loader is wrapped so that loading the module is timed
+
+        the time of a module includes the modules that it imports,
+        the self time does not
+        """
+
+        self.profiler = profiler
+
+        # only the main thread is timed, imports in other threads
+        # would mix up the nesting
+        self.thread = threading.get_ident()
+
+        # names of the modules that are being found, find_spec is
+        # called again by the other finders for these
+        self.finding = set()
+
+        # modules that are being executed (to subtract the time of nested imports)
+        self.stack = []
+
+    def find_spec(self, name, path=None, target=None):
+
+        if name in self.finding or threading.get_ident() != self.thread:
+            return None
+
+        self.finding.add(name)
+
+        try:
+            for finder in sys.meta_path:
+
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+
+                spec = finder.find_spec(name, path, target)
+
+                if spec is not None:
+                    break
+
+            else:
+                return None
+
+        finally:
+            self.finding.discard(name)
+
+        # e.g. namespace packages
+        if spec.loader is None or not hasattr(spec.loader, 'exec_module'):
+            return spec
+
+        spec.loader = TimedLoader(spec.loader, self)
+
+        return spec
+
+    def start(self) -> None:
+        sys.meta_path.insert(0, self)
+
+    def stop(self) -> None:
+
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class TimedLoader:
+
+    def __init__(self, loader, timer):
+        """
+        wraps the loader of a module, all attributes except create_module
+        and exec_module are the ones of the original loader
+
+        extension modules (e.g. PyQt5.QtWidgets) are loaded in create_module,
+        python modules are executed in exec_module, both are timed
+        """
+
+        self.loader = loader
+        self.timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.timed(spec.name, self.loader.create_module, spec)
+
+    def exec_module(self, module):
+        self.timed(module.__name__, self.loader.exec_module, module)
+
+    def timed(self, name, func, *args):
+
+        stack = self.timer.stack
+        stack.append(0.0)
+
+        start = get_time()
+
+        try:
+            return func(*args)
+
+        finally:
+            end = get_time()
+
+            # time of the modules that this module imported
+            nested = stack.pop()
+
+            if stack:
+                stack[-1] += end - start
+
+            self.timer.profiler.addImport(name, start, end, end - start - nested)
+
+
+class StartupProfiler:
+
+    def __init__(self):
+        """
+        records where the time goes when the program starts
+
+        * spans: wall-clock time of each phase (get_app, show_splash_screen,
+          set_stylesheet, the window and tab widget constructors etc.),
+          the phases can be nested
+        * imports: time to import each module (see ImportTimer and TimedLoader)
+
+        does nothing until enable is called, the spans are cheap
+        when the profiler is not enabled
+
+        the result is written with save, either as a text report or
+        as a Chrome trace (.json, open in chrome://tracing or Perfetto)
+
+        usage:
+            PROFILER.enable('data/startup.json')
+
+            with span('set_stylesheet'):
+                set_stylesheet(app)
+
+            PROFILER.finish()
+        """
+
+        self.enabled = False
+        self.headless = False
+        self.path = None
+
+        # (name, start, end, depth), times in seconds since START_TIME
+        self.spans = []
+        self.depth = 0
+
+        # (module name, start, end, self time)
+        self.imports = []
+
+        self.import_timer = None
+
+        # the time when the GUI could be used, see finish
+        self.ready = None
+
+    def configure(self, argv=None, environ=None) -> None:
+        """
+        enables the profiler and headless mode from the command line
+        flags or environment variables (see PROFILE_ENV and HEADLESS_ENV)
+        """
+
+        argv = sys.argv[1:] if argv is None else argv
+        environ = os.environ if environ is None else environ
+
+        path = environ.get(PROFILE_ENV) or None
+
+        if PROFILE_FLAG in argv:
+
+            i = argv.index(PROFILE_FLAG)
+
+            if i + 1 < len(argv) and not argv[i + 1].startswith('-'):
+                path = argv[i + 1]
+            else:
+                path = path or DEFAULT_PROFILE_PATH
+
+        headless = HEADLESS_FLAG in argv or environ.get(HEADLESS_ENV, '0') not in ('', '0')
+
+        if headless:
+            self.setHeadless()
+
+        if path is not None:
+            self.enable(path)
+
+    def setHeadless(self) -> None:
+        """
+        uses the Qt offscreen platform (no windows are shown),
+        must be called before the QApplication is created
+        """
+
+        self.headless = True
+        os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+
+    def enable(self, path=DEFAULT_PROFILE_PATH) -> None:
+
+        self.enabled = True
+        self.path = path
+
+        self.import_timer = ImportTimer(self)
+        self.import_timer.start()
+
+    @contextmanager
+    def span(self, name):
+
+        if not self.enabled:
+            yield
+            return
+
+        start = get_time()
+        self.depth += 1
+
+        try:
+            yield
+
+        finally:
+            self.depth -= 1
+            self.spans.append((name, start, get_time(), self.depth))
+
+    def addImport(self, name, start, end, self_time) -> None:
+        self.imports.append((name, start, end, self_time))
+
+    def finish(self) -> None:
+        """
+        called when the event loop runs for the first time (the GUI can be used),
+        stops timing imports and writes the output file
+
+        quits the application in headless mode
+        """
+
+        if self.ready is not None:
+            return
+
+        self.ready = get_time()
+
+        if self.enabled:
+
+            self.import_timer.stop()
+
+            try:
+                self.save(self.path)
+                print(f'saved startup profile to {self.path}')
+
+            except OSError as e:
+                print(f'could not save startup profile to {self.path}: {e}')
+
+        if self.headless:
+
+            from PyQt5.QtCore import QCoreApplication
+
+            QCoreApplication.quit()
+
+    def report(self) -> str:
+        """
+        returns the phases (in the order they started, indented by depth)
+        and the modules with the longest import time
+        """
+
+        lines = [f'time to interactive: {self.ready or get_time():.3f} s',
+                 '',
+                 'phases (start, duration):']
+
+        for name, start, end, depth in sorted(self.spans, key=lambda n: (n[1], n[3])):
+            lines.append(f'{start:8.3f} s {(end - start) * 1000:9.1f} ms  {"  " * depth}{name}')
+
+        # module name: [self time, cumulative time], create_module
+        # and exec_module of the same module are added up
+        modules = {}
+
+        for name, start, end, self_time in self.imports:
+
+            times = modules.setdefault(name, [0.0, 0.0])
+            times[0] += self_time
+            times[1] += end - start
+
+        total = sum(n[0] for n in modules.values())
+
+        lines += ['',
+                  f'imports ({len(modules)} modules, {total * 1000:.1f} ms self time):',
+                  '     self   cumulative  module']
+
+        for name, (self_time, cumulative) in sorted(modules.items(), key=lambda n: n[1][0],
+                                                    reverse=True)[:REPORT_IMPORTS]:
+            lines.append(f'{self_time * 1000:6.1f} ms {cumulative * 1000:9.1f} ms  {name}')
+
+        return '\n'.join(lines) + '\n'
+
+    def trace(self) -> dict:
+        """
+        returns the spans and imports in the Chrome trace event format
+        (complete events, times in microseconds)
+        """
+
+        pid = os.getpid()
+        tid = threading.get_ident()
+
+        events = []
+
+        for name, start, end, _ in self.spans:
+            events.append({'name': name, 'cat': 'startup', 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': start * 1e6, 'dur': (end - start) * 1e6})
+
+        for name, start, end, self_time in self.imports:
+            events.append({'name': name, 'cat': 'import', 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': start * 1e6, 'dur': (end - start) * 1e6,
+                           'args': {'self_ms': round(self_time * 1000, 3)}})
+
+        if self.ready is not None:
+            events.append({'name': 'interactive', 'cat': 'startup', 'ph': 'i', 's': 'p',
+                           'pid': pid, 'tid': tid, 'ts': self.ready * 1e6})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self, path) -> None:
+
+        folder = os.path.dirname(path)
+
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        with open(path, 'w', encoding='utf-8') as f:
+
+            if path.lower().endswith('.json'):
+                json.dump(self.trace(), f)
+            else:
+                f.write(self.report())
+
+
+# used by app.py and the GUI modules, see span
+PROFILER = StartupProfiler()
+
+
+def span(name):
+    """
+    context manager that records the time of a startup phase, e.g.
+
+        with span('set_stylesheet'):
+            set_stylesheet(app)
+    """
+
+    return PROFILER.span(name)
@@ -0,0 +1,163 @@
+import threading
+from traceback import format_exc
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from gui_template.progress import ProgressThrottle
+
+
+# maximum number of tasks that run at the same time
+# additional tasks are queued by the QThreadPool
+MAX_TASKS = 2
+
+
+class TaskCancelled(Exception):
+    """
+    raised by Task.setProgress in the worker thread after Task.cancel is called
+    """
+
+    pass
+
+
+class TaskSignals(QObject):
+    """
+    signals for Task, QRunnable is not a QObject so it cannot have signals
+
+    this object is created in the GUI thread, so the signals that are emitted
+    from the worker thread are received in the GUI thread
+    """
+
+    # progress in percent
+    progress = pyqtSignal(float)
+
+    # return value of the function
+    result = pyqtSignal(object)
+
+    # exception and traceback string
+    error = pyqtSignal(object, str)
+
+    # emitted after the function was cancelled
+    cancelled = pyqtSignal()
+
+    # always emitted last
+    finished = pyqtSignal()
+
+
+class Task(QRunnable):
+
+    def __init__(self, func, *args, cancellable=True, **kwargs):
+        """
+        runs func(*args, callback=self.setProgress, **kwargs) in a worker thread
+
+        func can call callback(val) with the progress in percent (same as
+        the callback argument of helper.populate_table), callback raises
+        TaskCancelled in case the task has been cancelled
+
+        tasks that are not cancellable (e.g. saving a file, which must not
+        stop halfway) are not cancelled by TaskManager.cancelAll
+
+        NOTE: func must not access any widgets, use the signals to
+        update the GUI
+        """
+
+        super().__init__()
+
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancellable = cancellable
+
+        self.signals = TaskSignals()
+
+        # the TaskManager keeps a reference until the task is finished
+        self.setAutoDelete(False)
+
+        self.cancel_event = threading.Event()
+
+        # limits the number of progress signals
+        self.throttle = ProgressThrottle()
+
+    def cancel(self):
+        """
+        the task is stopped the next time it calls setProgress
+        """
+
+        self.cancel_event.set()
+
+    def isCancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def setProgress(self, val):
+
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
+
+        if self.throttle(val):
+            self.signals.progress.emit(val)
+
+    def run(self):
+
+        try:
+            result = self.func(*self.args, callback=self.setProgress, **self.kwargs)
+
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+
+        except Exception as e:
+            self.signals.error.emit(e, format_exc())
+
+        else:
+            self.signals.result.emit(result)
+
+        finally:
+            self.signals.finished.emit()
+
+
+class TaskManager(QObject):
+
+    def __init__(self, parent=None, max_tasks=MAX_TASKS):
+        """
+        starts Tasks in a QThreadPool, at most max_tasks run at the same time
+        """
+
+        super().__init__(parent)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_tasks)
+
+        # keep a reference to running tasks, otherwise the signals object
+        # might be deleted before the signals are received
+        self.tasks = set()
+
+    def start(self, task) -> Task:
+        """
+        runs task (a Task) in a worker thread
+
+        connect to the signals of the task before calling this,
+        otherwise the signals might be emitted before they are connected
+
+        usage:
+            task = Task(func, arg)
+            task.signals.result.connect(slot)
+            manager.start(task)
+        """
+
+        self.tasks.add(task)
+        task.signals.finished.connect(lambda: self.tasks.discard(task))
+
+        self.pool.start(task)
+
+        return task
+
+    def cancelAll(self):
+        """
+        cancels the tasks that are cancellable, use waitForDone
+        to wait until the other tasks are finished
+        """
+
+        for task in list(self.tasks):
+            if task.cancellable:
+                task.cancel()
+
+    def waitForDone(self, msecs=-1) -> bool:
+        return self.pool.waitForDone(msecs)
@@ -0,0 +1,394 @@
+import os
+import sys
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+from PyQt5.QtCore import QObject, QSocketNotifier, QTimer, pyqtSignal
+
+from gui_template.cache import get_file_signature
+
+
+# changes within this time (ms) are sent as one changed signal
+COALESCE_INTERVAL = 200
+
+# seconds between the checks of the polling thread
+POLL_INTERVAL = 1.0
+
+# inotify event masks, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+
+# the folder is watched, files are often replaced (written to a temporary
+# file that is renamed) instead of modified in place
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+              IN_MOVED_TO | IN_CREATE | IN_DELETE)
+
+# struct inotify_event: wd, mask, cookie, len (followed by the name)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def get_signature(path):
+    """
+    returns (size, mtime_ns) of path, None in case the file does not exist
+    """
+
+    try:
+        return get_file_signature(path)
+
+    except OSError:
+        return None
+
+
+class InotifyBackend:
+
+    def __init__(self, parent, callback):
+        """
+        watches the folders of the watched files with inotify (Linux only)
+
+        the inotify file descriptor is read when the event loop notices that
+        there are events (QSocketNotifier), nothing runs between events
+
+        callback is called with a list of watched paths that might have changed
+
+        raises OSError in case inotify is not available
+        """
+
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self.callback = callback
+
+        # folder: watch descriptor, and the reverse
+        self.folders = {}
+        self.descriptors = {}
+
+        # folder: set of watched file names in the folder
+        self.files = {}
+
+        self.notifier = QSocketNotifier(self.fd, QSocketNotifier.Read, parent)
+        self.notifier.activated.connect(self.read)
+
+    def add(self, path) -> None:
+
+        folder, name = os.path.split(path)
+
+        if folder not in self.folders:
+
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'could not watch {folder}')
+
+            self.folders[folder] = wd
+            self.descriptors[wd] = folder
+            self.files[folder] = set()
+
+        self.files[folder].add(name)
+
+    def remove(self, path) -> None:
+
+        folder, name = os.path.split(path)
+
+        names = self.files.get(folder)
+
+        if names is None:
+            return
+
+        names.discard(name)
+
+        if not names:
+
+            wd = self.folders.pop(folder)
+
+            del self.descriptors[wd]
+            del self.files[folder]
+
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self) -> None:
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+
+        except BlockingIOError:
+            return
+
+        changed = set()
+        offset = 0
+
+        while offset < len(data):
+
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length]
+            offset += EVENT_HEADER.size + length
+
+            # events were lost, check all files
+            if mask & IN_Q_OVERFLOW:
+                changed.update(os.path.join(f, n) for f, names in self.files.items() for n in names)
+                continue
+
+            folder = self.descriptors.get(wd)
+
+            if folder is None:
+                continue
+
+            # the folder was removed or unmounted
+            if mask & IN_IGNORED:
+                changed.update(os.path.join(folder, n) for n in self.files.get(folder, ()))
+                continue
+
+            name = os.fsdecode(name.rstrip(b'\0'))
+
+            if name in self.files[folder]:
+                changed.add(os.path.join(folder, name))
+
+        if changed:
+            self.callback(sorted(changed))
+
+    def close(self) -> None:
+
+        self.notifier.setEnabled(False)
+        os.close(self.fd)
+
+
+class PollingBackend:
+
+    def __init__(self, callback, interval=POLL_INTERVAL):
+        """
+        checks the size and modification time (ns) of the watched files
+        every interval seconds in a separate thread
+
+        callback is called (in the thread) with a list of the paths that have changed
+        """
+
+        self.callback = callback
+        self.interval = interval
+
+        # path: (size, mtime_ns) at the last check
+        self.signatures = {}
+        self.lock = threading.Lock()
+
+        self.stop_event = threading.Event()
+
+        self.thread = threading.Thread(target=self.run, name='FileWatcher', daemon=True)
+        self.thread.start()
+
+    def add(self, path) -> None:
+
+        signature = get_signature(path)
+
+        with self.lock:
+            self.signatures[path] = signature
+
+    def remove(self, path) -> None:
+
+        with self.lock:
+            self.signatures.pop(path, None)
+
+    def run(self) -> None:
+
+        while not self.stop_event.wait(self.interval):
+
+            with self.lock:
+                paths = list(self.signatures.items())
+
+            # the files are checked outside of the lock,
+            # os.stat can take a while on network drives
+            current = [(path, get_signature(path)) for path, _ in paths]
+
+            changed = [path for (path, last), (_, signature) in zip(paths, current)
+                       if signature != last]
+
+            with self.lock:
+                for path, signature in current:
+                    if path in self.signatures:
+                        self.signatures[path] = signature
+
+            if changed:
+                self.callback(changed)
+
+    def close(self) -> None:
+        self.stop_event.set()
+
+
+class FileWatcher(QObject):
+
+    # list of paths (str) that have been changed, removed or created
+    changed = pyqtSignal(list)
+
+    # used to send the paths from the polling thread to the GUI thread
+    pathsChanged = pyqtSignal(list)
+
+    def __init__(self, parent=None, interval=POLL_INTERVAL):
+        """
+        sends the changed signal when watched files (e.g. the loaded database
+        or the settings file) are changed by another program
+
+        uses inotify on Linux, otherwise the files are checked every interval
+        seconds in a separate thread (size and modification time in ns,
+        see cache.get_file_signature), nothing is checked in the GUI thread
+        between changes
+
+        the changes within COALESCE_INTERVAL ms are sent as one signal, and only
+        in case the size or modification time of the file has actually changed
+
+        use suspend and resume around changes that the program makes itself
+
+        usage:
+            watcher = FileWatcher(parent)
+            watcher.changed.connect(slot)
+            watcher.watch(path)
+        """
+
+        super().__init__(parent)
+
+        self.interval = interval
+
+        # path: (size, mtime_ns) or None, the last known state of the file
+        self.signatures = {}
+
+        # path: backend that watches the path
+        self.backends = {}
+
+        # paths that are not reported, see suspend
+        self.suspended = set()
+
+        # paths that might have changed, checked when the timer fires
+        self.pending = set()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(COALESCE_INTERVAL)
+        self.timer.timeout.connect(self.flush)
+
+        # queued connection, the polling thread emits this signal
+        self.pathsChanged.connect(self.queue)
+
+        try:
+            self.inotify = InotifyBackend(self, self.queue)
+
+        except (OSError, AttributeError) as e:
+            self.inotify = None
+            print(f'inotify is not available ({e}), polling files instead')
+
+        # created when the first file is polled
+        self.poller = None
+
+    def watch(self, path, polling=False) -> None:
+        """
+        starts watching path (the file does not have to exist)
+
+        NOTE: inotify does not notice changes that other computers make to
+        files on network drives, use polling=True for these
+        """
+
+        path = os.path.abspath(path)
+
+        if path in self.signatures:
+            return
+
+        if polling or self.inotify is None:
+
+            if self.poller is None:
+                self.poller = PollingBackend(self.pathsChanged.emit, interval=self.interval)
+
+            backend = self.poller
+
+        else:
+            backend = self.inotify
+
+        try:
+            backend.add(path)
+
+        # e.g. the folder does not exist
+        except OSError as e:
+            print(f'could not watch {path}: {e}')
+            return
+
+        self.signatures[path] = get_signature(path)
+        self.backends[path] = backend
+
+    def unwatch(self, path) -> None:
+
+        path = os.path.abspath(path)
+
+        backend = self.backends.pop(path, None)
+
+        if backend is not None:
+            del self.signatures[path]
+            backend.remove(path)
+
+    def suspend(self, path) -> None:
+        """
+        changes to path are not reported until resume is called,
+        e.g. while the program saves the file
+        """
+
+        self.suspended.add(os.path.abspath(path))
+
+    def resume(self, path) -> None:
+        """
+        reports changes to path again, the current state of the file is
+        the new reference (the changes since suspend are not reported)
+        """
+
+        path = os.path.abspath(path)
+
+        self.suspended.discard(path)
+
+        if path in self.signatures:
+            self.signatures[path] = get_signature(path)
+
+    def queue(self, paths) -> None:
+
+        self.pending.update(paths)
+
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self) -> None:
+
+        changed = []
+
+        for path in sorted(self.pending):
+
+            if path not in self.signatures or path in self.suspended:
+                continue
+
+            signature = get_signature(path)
+
+            # e.g. the file was opened for writing but not changed
+            if signature == self.signatures[path]:
+                continue
+
+            self.signatures[path] = signature
+            changed.append(path)
+
+        self.pending.clear()
+
+        if changed:
+            self.changed.emit(changed)
+
+    def close(self) -> None:
+
+        self.timer.stop()
+
+        for backend in (self.inotify, self.poller):
+            if backend is not None:
+                backend.close()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# no windows are shown, see startup.StartupProfiler.setHeadless
+os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+
+# the modules use paths relative to the repository (data/, assets/)
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+@pytest.fixture(scope='session')
+def qapp():
+
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication([])
+
+    yield app
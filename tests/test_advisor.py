@@ -0,0 +1,143 @@
+import sqlite3
+
+import pytest
+
+from gui_template.advisor import IndexAdvisor, get_index_columns, get_table_aliases
+from gui_template.profiler import SQLProfiler
+
+
+class Database:
+
+    def __init__(self, schema, rows=2000):
+        """
+        the part of io.DatabaseHandler that IndexAdvisor uses
+        """
+
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute(schema)
+        self.connection.executemany('INSERT INTO data (id, val) VALUES (?, ?)',
+                                    [(i, i % 100) for i in range(rows)])
+
+
+def propose(schema, sql, params=(1, )):
+
+    db = Database(schema)
+    profiler = SQLProfiler()
+
+    db.connection.execute(sql, params).fetchall()
+    profiler.record(sql, 0.1, rows=1, params=params)
+
+    return IndexAdvisor(db, profiler).propose()
+
+
+def test_rowid_alias_not_in_index():
+
+    proposals = propose('CREATE TABLE data (id INTEGER PRIMARY KEY, val INTEGER)',
+                        'SELECT val, id FROM data WHERE val = ?')
+
+    assert [n['columns'] for n in proposals] == [('val', )]
+
+
+@pytest.mark.parametrize('schema', ['CREATE TABLE data (id INT PRIMARY KEY, val INTEGER)',
+                                    'CREATE TABLE data (id INTEGER PRIMARY KEY, val INTEGER) '
+                                    'WITHOUT ROWID'])
+def test_primary_key_that_is_not_rowid_alias(schema):
+
+    proposals = propose(schema, 'SELECT val, id FROM data WHERE val = ?')
+
+    assert [n['columns'] for n in proposals] == [('val', 'id')]
+
+
+COLUMNS = {'a': 'a', 'b': 'b', 'c': 'c', 'name': 'Name'}
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ('SELECT * FROM t WHERE a = ? AND b > ? AND c < ?', ['a', 'b']),
+    ('SELECT * FROM t WHERE b IN (?) AND a = ? ORDER BY c', ['b', 'a', 'c']),
+    ('SELECT * FROM t ORDER BY c, b DESC', ['c', 'b']),
+    ('SELECT a, Name FROM t WHERE b = ?', ['b', 'a', 'Name']),
+    ('SELECT x.a FROM t AS x JOIN u ON u.id = x.b WHERE x.c = ? AND u.a = ?', ['c', 'a']),
+    ('SELECT * FROM t WHERE a + 1 > ? ORDER BY LENGTH(a)', []),
+])
+def test_get_index_columns(sql, expected):
+    assert get_index_columns(sql, 't', COLUMNS, get_table_aliases(sql)) == expected
+
+
+def test_propose_merges_indexes_with_the_same_columns():
+
+    db = Database('CREATE TABLE data (id INTEGER PRIMARY KEY, val INTEGER, name TEXT)')
+    profiler = SQLProfiler()
+
+    for sql, elapsed in [('SELECT * FROM data WHERE val = ?', 0.1),
+                         ('SELECT * FROM data WHERE val = ? AND name = ?', 0.2)]:
+        profiler.record(sql, elapsed, params=(1, ) * sql.count('?'))
+
+    proposals = IndexAdvisor(db, profiler).propose()
+
+    assert len(proposals) == 1
+    assert proposals[0]['columns'] == ('val', 'name')
+    assert proposals[0]['benefit'] == pytest.approx(0.3)
+    assert len(proposals[0]['statements']) == 2
+
+
+def test_no_proposals_for_small_tables_and_existing_indexes():
+
+    schema = 'CREATE TABLE data (id INTEGER PRIMARY KEY, val INTEGER)'
+
+    db = Database(schema, rows=10)
+    profiler = SQLProfiler()
+    profiler.record('SELECT id FROM data WHERE val = ?', 0.1, params=(1, ))
+
+    assert IndexAdvisor(db, profiler).propose() == []
+
+    db = Database(schema)
+    db.connection.execute('CREATE INDEX existing ON data (val, id)')
+
+    assert IndexAdvisor(db, profiler).propose() == []
+
+
+def test_created_indexes_are_not_saved(tmp_path):
+
+    from gui_template.io import DatabaseHandler
+
+    path = tmp_path / 'data.db'
+
+    connection = Database('CREATE TABLE data (id INTEGER PRIMARY KEY, val INTEGER)').connection
+    connection.commit()
+    connection.execute('VACUUM INTO ?', (str(path), ))
+
+    db = DatabaseHandler(path, cache=False)
+    profiler = SQLProfiler()
+
+    sql = 'SELECT id FROM data WHERE val = ?'
+    profiler.record(sql, 0.1, params=(1, ))
+
+    names = IndexAdvisor(db, profiler).create()
+
+    assert names == ['auto_idx_data_val']
+    assert 'USING COVERING INDEX auto_idx_data_val' in profiler.explain(db.connection, sql)[0]
+
+    def saved_indexes():
+
+        connection = sqlite3.connect(path)
+
+        try:
+            return [n[0] for n in connection.execute("SELECT name FROM sqlite_master "
+                                                     "WHERE type = 'index'")]
+        finally:
+            connection.close()
+
+    db.save()
+
+    assert saved_indexes() == []
+
+    # the index is still used in memory
+    assert db.connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == \
+        [('auto_idx_data_val', )]
+
+    db.save(keep_indexes=True)
+
+    assert saved_indexes() == ['auto_idx_data_val']
+    assert not db.auto_indexes
+
+    db.close()
@@ -0,0 +1,112 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from PyQt5.QtGui import QPixmapCache
+
+from gui_template import assets
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# loads the stylesheet in a new process, prints whether qdarkstyle was
+# imported and whether the resources that the stylesheet uses can be read
+LOAD_STYLESHEET = '''
+import re
+import sys
+
+from PyQt5.QtCore import QFile
+from PyQt5.QtWidgets import QApplication
+
+from gui_template.assets import load_stylesheet
+
+app = QApplication([])
+stylesheet = load_stylesheet(app)
+
+urls = re.findall(r'url\\("(:/[^"]+)"\\)', stylesheet)
+
+print('qdarkstyle' in sys.modules, len(urls) > 0 and all(QFile.exists(n) for n in urls))
+'''
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+
+    path = str(tmp_path / 'assets')
+    monkeypatch.setattr(assets, 'STYLESHEET_CACHE_PATH', path)
+
+    return path
+
+
+def test_stylesheet_key(monkeypatch):
+
+    key = assets.get_stylesheet_key()
+
+    assert key == assets.get_stylesheet_key()
+
+    monkeypatch.setattr(assets, 'VERSION', 'other')
+
+    assert assets.get_stylesheet_key() != key
+
+
+def test_load_stylesheet_from_cache(qapp, cache, monkeypatch):
+
+    stylesheet = assets.load_stylesheet(qapp)
+
+    key = assets.get_stylesheet_key()
+
+    assert sorted(os.listdir(cache)) == [f'{key}.color', f'{key}.qss', f'{key}.rcc']
+
+    def save_stylesheet(path):
+        raise AssertionError('the stylesheet should be read from the cache')
+
+    monkeypatch.setattr(assets, 'save_stylesheet', save_stylesheet)
+
+    assert assets.load_stylesheet(qapp) == stylesheet
+
+
+def test_files_of_other_versions_are_removed(qapp, cache, monkeypatch):
+
+    os.makedirs(cache)
+
+    for ext in ('qss', 'rcc', 'color'):
+        with open(os.path.join(cache, f'old.{ext}'), 'w') as f:
+            f.write('')
+
+    assets.load_stylesheet(qapp)
+
+    assert not any(n.startswith('old.') for n in os.listdir(cache))
+
+
+def test_stylesheet_without_qdarkstyle(tmp_path):
+
+    env = dict(os.environ, PYTHONPATH=ROOT, QT_QPA_PLATFORM='offscreen')
+
+    def run():
+
+        # the cache is in data/ relative to the working directory
+        result = subprocess.run([sys.executable, '-c', LOAD_STYLESHEET], cwd=tmp_path, env=env,
+                                timeout=60, check=True, capture_output=True, text=True)
+
+        return result.stdout.split()[-2:]
+
+    assert run() == ['True', 'True']
+
+    # the resources are registered from the cached .rcc file
+    assert run() == ['False', 'True']
+
+
+def test_pixmap_and_icon(qapp):
+
+    QPixmapCache.clear()
+
+    pixmap = assets.get_pixmap('app-icon.png', height=32)
+
+    assert pixmap.height() == 32
+    assert assets.get_pixmap('app-icon.png', height=32).cacheKey() == pixmap.cacheKey()
+
+    assert assets.get_pixmap('missing.png').isNull()
+
+    assert assets.get_icon('app-icon.png', 16) is assets.get_icon('app-icon.png', 16)
@@ -0,0 +1,206 @@
+import os
+import threading
+
+import pytest
+
+from gui_template.cache import FileCache, copy_file
+from gui_template.tasks import TaskCancelled
+
+
+def write_source(path, size=4 * 1024 ** 2):
+
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+
+    return path
+
+
+def cancel_after(n):
+
+    calls = []
+
+    def progress(status, remaining, total):
+
+        calls.append(remaining)
+
+        if len(calls) >= n:
+            raise TaskCancelled()
+
+    return progress
+
+
+def test_copy_file(tmp_path):
+
+    src = write_source(tmp_path / 'source.db')
+    dst = tmp_path / 'copy.db'
+
+    copy_file(src, dst)
+
+    assert dst.read_bytes() == src.read_bytes()
+    assert sorted(os.listdir(tmp_path)) == ['copy.db', 'source.db']
+
+
+def test_copy_file_cancelled(tmp_path):
+
+    src = write_source(tmp_path / 'source.db')
+    dst = tmp_path / 'copy.db'
+
+    with pytest.raises(TaskCancelled):
+        copy_file(src, dst, progress=cancel_after(2))
+
+    assert sorted(os.listdir(tmp_path)) == ['source.db']
+
+
+def test_file_cache_cancelled(tmp_path):
+
+    src = write_source(tmp_path / 'source.db')
+    cache = FileCache(tmp_path / 'cache')
+
+    with pytest.raises(TaskCancelled):
+        cache.get(src, progress=cancel_after(2))
+
+    assert os.listdir(tmp_path / 'cache') == []
+
+    local, _ = cache.get(src)
+
+    assert local.read_bytes() == src.read_bytes()
+
+
+def test_file_cache_hit_does_not_write_index(tmp_path):
+
+    src = write_source(tmp_path / 'source.db', size=1024)
+    cache = FileCache(tmp_path / 'cache')
+
+    local, _ = cache.get(src)
+
+    index_stat = os.stat(cache.index_path)
+
+    for _ in range(3):
+        assert cache.get(src)[0] == local
+
+    assert os.stat(cache.index_path).st_mtime_ns == index_stat.st_mtime_ns
+    assert cache.modified
+
+    used = cache.index[next(iter(cache.index))]['last_used']
+
+    cache.save()
+
+    assert not cache.modified
+    assert FileCache(tmp_path / 'cache').load_index()[next(iter(cache.index))]['last_used'] == used
+
+
+def test_adaptive_step(monkeypatch):
+
+    from gui_template import cache
+
+    t = [0.0]
+    monkeypatch.setattr(cache.time, 'perf_counter', lambda: t[0])
+
+    step = cache.AdaptiveStep(1000, 100, 100000, interval=0.1)
+
+    # 1000 units in 0.01 s, the step is at most 4 times larger
+    t[0] += 0.01
+    assert step.update(1000) == 4000
+
+    # 4000 units in 0.02 s, 20000 units take 0.1 s
+    t[0] += 0.02
+    assert step.update(4000) == 16000
+
+    t[0] += 0.1
+    assert step.update(16000) == 16000
+
+    # slow network, at most 4 times smaller and at least the minimum
+    t[0] += 10
+    assert step.update(16000) == 4000
+
+    t[0] += 10
+    assert step.update(4000) == 1000
+
+    t[0] += 10
+    assert step.update(1000) == 250
+
+    t[0] += 10
+    assert step.update(250) == 100
+
+    assert step.total == 1000 + 4000 + 16000 * 2 + 4000 + 1000 + 250
+
+
+def test_file_cache_copy_does_not_block_other_files(tmp_path):
+
+    cached = write_source(tmp_path / 'cached.db')
+    copied = write_source(tmp_path / 'copied.db')
+
+    cache = FileCache(tmp_path / 'cache')
+    cache.get(cached)
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def progress(status, remaining, total):
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=cache.get, args=(copied,), kwargs={'progress': progress})
+    thread.start()
+
+    try:
+        assert started.wait(5)
+
+        # the copy is waiting in progress, the other file can still be used
+        hit = threading.Thread(target=cache.get, args=(cached,))
+        hit.start()
+        hit.join(2)
+
+        assert not hit.is_alive()
+
+    finally:
+        release.set()
+        thread.join(5)
+
+    local, _ = cache.get(copied)
+
+    assert local.read_bytes() == copied.read_bytes()
+    assert len(cache.index) == 2
+
+
+def test_file_cache_same_file_from_threads(tmp_path):
+
+    src = write_source(tmp_path / 'source.db')
+    cache = FileCache(tmp_path / 'cache')
+
+    results = []
+
+    def get():
+        results.append(cache.get(src))
+
+    threads = [threading.Thread(target=get) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join(10)
+
+    assert len(results) == 4
+    assert len({local for local, _ in results}) == 1
+    assert len(cache.index) == 1
+
+    # the temporary copies of the other threads are removed
+    assert sorted(os.listdir(tmp_path / 'cache')) == sorted(['index.json', results[0][0].name])
+    assert results[0][0].read_bytes() == src.read_bytes()
+
+
+def test_file_cache_relative_path(tmp_path, monkeypatch):
+
+    src = write_source(tmp_path / 'source.db', size=1024)
+
+    # the path is resolved when the cache is used, not when it is created
+    cache = FileCache('data/cache')
+
+    monkeypatch.chdir(tmp_path)
+
+    local, _ = cache.get(src)
+
+    assert local.is_absolute()
+    assert local.parent == tmp_path / 'data' / 'cache'
+    assert os.path.isfile(tmp_path / 'data' / 'cache' / 'index.json')
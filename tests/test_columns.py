@@ -0,0 +1,179 @@
+import datetime
+
+import pytest
+
+from gui_template import columns
+from gui_template.columns import convert_column, invert_order, sort_rows
+from gui_template.misc import get_table_value
+
+
+VALUES = {
+    'int': [1, 2, None, -3],
+    'float': [1.5, None, 2.0, -0.25],
+    'numeric str': ['1', ' 2.5 ', None, 'NULL', '', '-3'],
+    'text': ['b', 'a ', None, '[EMPTY]', ' '],
+    'mixed str': ['1', 'a', '2.5', None],
+    'int and float': [1, 2.5, None, 3],
+    'large int': [2 ** 70, 1, None],
+    'datetime': [datetime.datetime(2020, 3, 17, 18, 44, 15), None],
+    'timedelta': [datetime.timedelta(seconds=90), None, datetime.timedelta(days=1)],
+    'mixed types': [1, 'a', datetime.timedelta(seconds=1), None],
+    'null': [None, 'null', '  '],
+}
+
+
+@pytest.fixture(params=['numpy', 'no numpy'])
+def numpy(request, monkeypatch):
+
+    if request.param == 'no numpy':
+        monkeypatch.setattr(columns, 'np', None)
+
+    elif columns.np is None:
+        pytest.skip('numpy is not installed')
+
+    return columns.np
+
+
+@pytest.mark.parametrize('name', VALUES)
+def test_convert_column_same_as_get_table_value(numpy, name):
+
+    values = VALUES[name]
+    column = convert_column(values)
+
+    assert len(column) == len(values)
+
+    for i, value in enumerate(values):
+
+        expected = get_table_value(value)
+
+        if expected is None:
+            assert column.text(i) is None
+            assert column.key(i) is None
+        else:
+            assert column.text(i) == expected[0]
+            assert column.key(i) == expected[1]
+
+
+@pytest.mark.parametrize('name, kind', [('int', 'int'), ('float', 'float'),
+                                        ('numeric str', 'float'), ('text', 'text'),
+                                        ('mixed str', 'mixed'), ('int and float', 'float'),
+                                        ('large int', 'mixed'), ('datetime', 'datetime'),
+                                        ('null', 'null')])
+def test_convert_column_kind(numpy, name, kind):
+    assert convert_column(VALUES[name]).kind == kind
+
+
+@pytest.mark.skipif(columns.np is None, reason='numpy is not installed')
+def test_convert_numpy_array():
+
+    numpy = columns.np
+
+    column = convert_column(numpy.array([1.0, 2.0, 3.0]))
+
+    assert column.kind == 'int'
+    assert [column.text(i) for i in range(3)] == ['1', '2', '3']
+
+    column = convert_column(numpy.array(['a', 'b'], dtype=object))
+
+    assert column.kind == 'text'
+
+
+@pytest.mark.parametrize('first, second, kind', [('int', 'float', 'float'),
+                                                 ('int', 'null', 'int'),
+                                                 ('null', 'text', 'text'),
+                                                 ('int', 'text', 'mixed'),
+                                                 ('large int', 'float', 'mixed')])
+def test_extend(numpy, first, second, kind):
+
+    column = convert_column(VALUES[first])
+    column.extend(convert_column(VALUES[second]))
+
+    values = VALUES[first] + VALUES[second]
+
+    assert column.kind == kind
+    assert len(column) == len(values)
+
+    for i, value in enumerate(values):
+
+        expected = get_table_value(value)
+
+        assert column.text(i) == (expected[0] if expected is not None else None)
+
+
+def sort_key(value, descending=False):
+    """
+    sort key from get_table_value, numbers before text and empty cells last
+    """
+
+    value = get_table_value(value)
+
+    if value is None:
+        return (1, )
+
+    key = (isinstance(value[1], str), value[1])
+
+    return (0, ReverseKey(key) if descending else key)
+
+
+class ReverseKey:
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+@pytest.mark.parametrize('name', VALUES)
+@pytest.mark.parametrize('descending', [False, True])
+def test_sort_rows(numpy, name, descending):
+
+    values = VALUES[name]
+
+    order = sort_rows([convert_column(values)], [(0, descending)])
+
+    expected = sorted(range(len(values)), key=lambda i: sort_key(values[i], descending))
+
+    assert list(order) == expected
+
+
+def test_sort_rows_several_keys(numpy):
+
+    rows = [(1, 'b'), (2, 'a'), (1, None), (1, 'a'), (None, 'a'), (2, 'b')]
+    cols = [convert_column(n) for n in zip(*rows)]
+
+    order = sort_rows(cols, [(0, True), (1, False)])
+
+    assert [rows[i] for i in order] == [(2, 'a'), (2, 'b'), (1, 'a'), (1, 'b'),
+                                        (1, None), (None, 'a')]
+
+    # a new primary key for the previous order, the sort is stable
+    order = sort_rows(cols, [(1, False)], rows=order)
+
+    assert [rows[i] for i in order] == [(2, 'a'), (1, 'a'), (None, 'a'), (2, 'b'),
+                                        (1, 'b'), (1, None)]
+
+    assert sort_rows(cols, []) is None
+
+
+def test_rank_is_reset_by_extend(numpy):
+
+    column = convert_column([3, 1])
+
+    assert list(sort_rows([column], [(0, False)])) == [1, 0]
+
+    column.extend(convert_column([2, None]))
+
+    assert column.rank()[3] == -1
+    assert list(sort_rows([column], [(0, False)])) == [1, 2, 0, 3]
+
+
+def test_invert_order(numpy):
+
+    order = sort_rows([convert_column([3, 1, 2])], [(0, False)])
+
+    assert list(order) == [1, 2, 0]
+    assert list(invert_order(order)) == [2, 0, 1]
@@ -0,0 +1,63 @@
+from PyQt5.QtWidgets import QTableView, QTableWidget
+from PyQt5.QtCore import Qt
+
+from gui_template.helper import populate_table, populate_view
+from gui_template.model import TableModel
+
+
+def test_populate_view_new_view(qapp):
+
+    view = QTableView()
+
+    populate_view(view, ['id', 'name'], [(1, 'a'), (2, 'b')])
+
+    model = view.model()
+
+    assert isinstance(model, TableModel)
+    assert model.rowCount() == 2
+    assert view.isSortingEnabled()
+    assert view.horizontalHeader().sortIndicatorSection() == -1
+    assert view.horizontalHeader().sortIndicatorOrder() == Qt.AscendingOrder
+
+
+def test_populate_view_iterator(qapp):
+
+    view = QTableView()
+
+    populate_view(view, ['n'], iter([(i, ) for i in range(25)]), block_size=10)
+    populate_view(view, ['n'], [(1, )])
+
+    assert view.model().rowCount() == 1
+
+
+def test_populate_table_blocks(qapp):
+
+    table = QTableWidget()
+
+    calls = []
+
+    # total is larger than the number of rows
+    populate_table(table, ['n', 'text'], iter([(i, 'null' if i % 2 else f' {i}') for i in range(25)]),
+                   callback=calls.append, total=30, block_size=10)
+
+    assert table.rowCount() == 25
+    assert table.columnCount() == 2
+    assert table.horizontalHeaderItem(1).text() == 'text'
+
+    assert table.item(24, 0).data(Qt.DisplayRole) == '24'
+    assert table.item(2, 1).data(Qt.DisplayRole) == '2'
+    assert table.item(3, 1) is None
+
+    assert calls[-1] == 100
+    assert calls == sorted(calls)
+
+
+def test_populate_table_sorts_numbers(qapp):
+
+    table = QTableWidget()
+
+    populate_table(table, ['n'], [('10', ), ('9', ), ('b', ), ('a', )])
+
+    table.sortItems(0)
+
+    assert [table.item(i, 0).data(Qt.DisplayRole) for i in range(4)] == ['9', '10', 'a', 'b']
@@ -0,0 +1,212 @@
+import os
+import sys
+import sqlite3
+import subprocess
+
+import pytest
+
+from PyQt5.QtCore import QCoreApplication
+from PyQt5.QtWidgets import QMainWindow
+from PyQt5.QtTest import QTest
+
+
+class Window(QMainWindow):
+
+    def __init__(self, app):
+        """
+        main window with the methods that MyTabWidget uses (see gui.MyMainWindow)
+        """
+
+        super().__init__()
+
+        self.app = app
+        self.status = {}
+
+    def setStatus(self, text, side='left'):
+        self.status[side] = text
+
+
+@pytest.fixture
+def tab(qapp):
+
+    from gui_template.interface import MyTabWidget
+
+    window = Window(qapp)
+    tab = MyTabWidget(window)
+
+    yield tab
+
+    tab.tasks.cancelAll()
+    tab.tasks.waitForDone()
+
+    if tab.watcher is not None:
+        tab.watcher.close()
+    window.deleteLater()
+
+
+def test_log_filter_waits_for_typing(tab, monkeypatch):
+
+    from gui_template import interface
+
+    tab.setupTab(tab.indexOf(tab.ui.LogTab))
+
+    calls = []
+    monkeypatch.setattr(interface.LOG_INDEX, 'search', lambda **kwargs: calls.append(kwargs) or [])
+
+    for text in ('d', 'da', 'dat', 'data'):
+        tab.ui.LogFilterLineEdit.setText(text)
+
+    assert calls == []
+
+    QTest.qWait(interface.LOG_FILTER_DELAY + 200)
+
+    assert [n['text'] for n in calls] == ['data']
+
+
+def test_database_modules_are_not_imported_at_startup():
+
+    code = ('import sys\n'
+            'import gui_template.gui\n'
+            'print(" ".join(n for n in ("columns", "query", "advisor", "profiler", "tasks", "watcher")\n'
+            '               if f"gui_template.{n}" in sys.modules))\n')
+
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            env=dict(os.environ, QT_QPA_PLATFORM='offscreen'))
+
+    assert output.stdout.strip() == ''
+
+
+def create_database(path):
+
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE data (id INTEGER PRIMARY KEY, val TEXT)')
+    connection.execute("INSERT INTO data (val) VALUES ('a')")
+    connection.commit()
+    connection.close()
+
+    return str(path)
+
+
+def load_database(tab, path):
+
+    loaded = []
+    tab.loadDatabase(path, callback=loaded.append)
+
+    assert tab.tasks.waitForDone(5000)
+    QCoreApplication.processEvents()
+
+    assert loaded == [tab.db]
+
+    return tab.db
+
+
+def test_load_database(tab, tmp_path):
+
+    path = create_database(tmp_path / 'data.db')
+
+    load_database(tab, path)
+
+    assert tab.pool.fetchall('SELECT val FROM data') == [('a', )]
+    assert path in tab.watcher.signatures
+
+
+def test_load_database_closes_the_previous_one(tab, tmp_path):
+
+    first = create_database(tmp_path / 'first.db')
+    second = create_database(tmp_path / 'second.db')
+
+    db = load_database(tab, first)
+    pool = tab.pool
+
+    load_database(tab, second)
+
+    assert pool.closed and tab.pool is not pool
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        db.connection.execute('SELECT 1')
+
+    assert first not in tab.watcher.signatures
+    assert tab.pool.fetchall('SELECT val FROM data') == [('a', )]
+
+
+def log_lines(*messages):
+    """
+    logs messages and waits until they are in the in-memory log
+    (the index is the last handler of the log listener)
+    """
+
+    import logging
+
+    from gui_template.logger import LOG_INDEX
+
+    for message in messages:
+        logging.info(message)
+
+    for _ in range(200):
+
+        with LOG_INDEX.lock:
+            if LOG_INDEX.messages[-1:] == [messages[-1]]:
+                return
+
+        QTest.qWait(10)
+
+
+def test_log_tab_reads_new_lines(tab):
+
+    tab.setupTab(tab.indexOf(tab.ui.LogTab))
+    tab.refreshLogTab()
+
+    n = tab.log_model.rowCount()
+
+    log_lines('first test line', 'second test line')
+    tab.refreshLogTab()
+
+    # only the new lines are appended
+    assert tab.log_model.rowCount() == n + 2
+    assert tab.log_model.lines[-1].endswith('INFO     second test line')
+
+    tab.refreshLogTab()
+
+    assert tab.log_model.rowCount() == n + 2
+
+
+def test_log_tab_filter(tab):
+
+    tab.setupTab(tab.indexOf(tab.ui.LogTab))
+
+    log_lines('filtered zebra line', 'other line')
+
+    tab.ui.LogFilterLineEdit.setText('zebra')
+    tab.filterLog()
+
+    assert [n[29:] for n in tab.log_model.lines] == ['filtered zebra line']
+
+    log_lines('another zebra line')
+    tab.refreshLogTab()
+
+    assert [n[29:] for n in tab.log_model.lines] == ['filtered zebra line', 'another zebra line']
+
+
+def test_tabs_are_set_up_when_shown(tab):
+
+    log_tab = tab.indexOf(tab.ui.LogTab)
+
+    # only the current tab is set up
+    assert log_tab in tab.tab_setup
+    assert tab.currentIndex() not in tab.tab_setup
+    assert not hasattr(tab, 'log_model')
+
+    # created when they are used
+    assert tab.task_manager is None
+    assert tab.sql_profiler is None
+    assert tab.watcher is None
+
+    tab.setCurrentIndex(log_tab)
+
+    assert log_tab not in tab.tab_setup
+    assert tab.log_timer.isActive()
+
+    # the watcher is started once the event loop runs
+    QTest.qWait(50)
+
+    assert tab.watcher is not None
@@ -0,0 +1,540 @@
+import os
+import sys
+import sqlite3
+import subprocess
+
+import pytest
+
+from gui_template import io
+from gui_template.cache import FileCache
+from gui_template.io import DatabaseHandler
+
+
+def create_database(path):
+
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE data (id INTEGER PRIMARY KEY, val TEXT)')
+    connection.executemany('INSERT INTO data (val) VALUES (?)', [('a', ), ('b', )])
+    connection.commit()
+    connection.close()
+
+    return path
+
+
+def use_cache(monkeypatch, tmp_path):
+
+    cache = FileCache(tmp_path / 'cache')
+    monkeypatch.setattr(io, 'FILE_CACHE', cache)
+
+    return cache
+
+
+def test_local_path_skips_cache(monkeypatch, tmp_path):
+
+    cache = use_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(io, 'is_local_path', lambda path: True)
+
+    db = DatabaseHandler(create_database(tmp_path / 'local.db'))
+
+    assert db.cache is None
+    assert db.local_path is None
+    assert db.connection.execute('SELECT COUNT(*) FROM data').fetchone() == (2, )
+    assert not (tmp_path / 'cache').exists()
+    assert cache.load_index() == {}
+
+
+def test_remote_path_uses_cache(monkeypatch, tmp_path):
+
+    cache = use_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(io, 'is_local_path', lambda path: False)
+
+    db = DatabaseHandler(create_database(tmp_path / 'remote.db'))
+
+    assert db.cache is cache
+    assert db.local_path.parent == tmp_path / 'cache'
+    assert db.connection.execute('SELECT COUNT(*) FROM data').fetchone() == (2, )
+
+
+def test_cache_argument(monkeypatch, tmp_path):
+
+    cache = use_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(io, 'is_local_path', lambda path: True)
+
+    path = create_database(tmp_path / 'local.db')
+
+    assert DatabaseHandler(path, cache=True).cache is cache
+    assert DatabaseHandler(path, lazy=True).cache is cache
+
+
+def test_save_without_cache(monkeypatch, tmp_path):
+
+    use_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(io, 'is_local_path', lambda path: True)
+
+    path = create_database(tmp_path / 'local.db')
+
+    db = DatabaseHandler(path)
+    db.connection.execute("INSERT INTO data (val) VALUES ('c')")
+    db.connection.commit()
+    db.save()
+
+    assert DatabaseHandler(path).connection.execute('SELECT COUNT(*) FROM data').fetchone() == (3, )
+    assert not (tmp_path / 'cache').exists()
+
+
+def create_large_database(path, rows=2000):
+
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE data (id INTEGER PRIMARY KEY, val TEXT)')
+    connection.executemany('INSERT INTO data (val) VALUES (?)', [('x' * 200, )] * rows)
+    connection.commit()
+    connection.close()
+
+    return path
+
+
+def read_values(path):
+
+    connection = sqlite3.connect(path)
+
+    try:
+        assert connection.execute('PRAGMA integrity_check').fetchone() == ('ok', )
+        return connection.execute('SELECT COUNT(*), SUM(LENGTH(val)) FROM data').fetchone()
+
+    finally:
+        connection.close()
+
+
+def fail_after(n):
+
+    calls = []
+
+    def progress(*args):
+
+        calls.append(args)
+
+        if len(calls) >= n:
+            raise RuntimeError('network error')
+
+    return progress
+
+
+def test_save_delta(tmp_path):
+
+    path = create_large_database(tmp_path / 'data.db')
+
+    db = DatabaseHandler(path)
+    assert db.can_save_delta()
+
+    db.connection.execute("UPDATE data SET val = 'y' WHERE id = 1000")
+
+    writes = []
+    db.save(progress=lambda *args: writes.append(args))
+
+    n_pages = os.path.getsize(path) // db.get_page_size()
+
+    # the first page (file change counter) and the changed page
+    assert 1 <= len(writes) < n_pages // 4
+    assert read_values(path) == (2000, 1999 * 200 + 1)
+    assert not os.path.exists(f'{path}{io.DELTA_JOURNAL_SUFFIX}')
+
+
+def test_failed_save_delta_is_rolled_back(tmp_path):
+
+    path = create_large_database(tmp_path / 'data.db')
+    original = path.read_bytes()
+
+    db = DatabaseHandler(path)
+    db.connection.execute("UPDATE data SET val = 'y' WHERE id IN (1, 1000, 2000)")
+
+    with pytest.raises(RuntimeError):
+        db.save(progress=fail_after(2))
+
+    assert path.read_bytes() == original
+    assert not os.path.exists(f'{path}{io.DELTA_JOURNAL_SUFFIX}')
+
+    db.save()
+
+    assert read_values(path) == (2000, 1997 * 200 + 3)
+    assert read_values(DatabaseHandler(path).path) == (2000, 1997 * 200 + 3)
+
+
+def test_failed_save_delta_then_save_then_reload(monkeypatch, tmp_path):
+
+    path = create_large_database(tmp_path / 'data.db')
+
+    db = DatabaseHandler(path)
+    db.connection.execute("UPDATE data SET val = 'y' WHERE id IN (1, 1000, 2000)")
+
+    # the file cannot be restored, e.g. the network connection was lost
+    def restore(journal_path, f):
+        raise OSError('network error')
+
+    with monkeypatch.context() as m:
+        m.setattr(io, 'restore_delta_journal', restore)
+
+        with pytest.raises(RuntimeError):
+            db.save(progress=fail_after(2))
+
+    assert os.path.exists(f'{path}{io.DELTA_JOURNAL_SUFFIX}')
+
+    db.save()
+
+    assert not os.path.exists(f'{path}{io.DELTA_JOURNAL_SUFFIX}')
+
+    # the journal must not be applied to the saved file
+    DatabaseHandler(path)
+
+    assert read_values(path) == (2000, 1997 * 200 + 3)
+
+
+def test_recover_delta_journal_after_crash(tmp_path):
+
+    path = create_large_database(tmp_path / 'data.db')
+    original = path.read_bytes()
+
+    page_size = 4096
+
+    # the journal is written, then the program crashes while the pages are written
+    with open(path, 'r+b') as f:
+
+        io.write_delta_journal(path, f, len(original), page_size, [0, 10])
+
+        f.seek(10 * page_size)
+        f.write(b'\0' * page_size)
+
+    db = DatabaseHandler(path)
+
+    assert path.read_bytes() == original
+    assert db.connection.execute('SELECT COUNT(*) FROM data').fetchone() == (2000, )
+    assert not os.path.exists(f'{path}{io.DELTA_JOURNAL_SUFFIX}')
+
+
+def test_incomplete_delta_journal_is_ignored(tmp_path):
+
+    path = create_large_database(tmp_path / 'data.db')
+    original = path.read_bytes()
+
+    with open(f'{path}{io.DELTA_JOURNAL_SUFFIX}', 'wb') as f:
+        f.write(io.DELTA_JOURNAL_MAGIC + b'\0' * 10)
+
+    assert not io.recover_delta_journal(path)
+    assert path.read_bytes() == original
+    assert not os.path.exists(f'{path}{io.DELTA_JOURNAL_SUFFIX}')
+
+
+def test_save_delta_keeps_the_file_locked(monkeypatch, tmp_path):
+
+    path = create_large_database(tmp_path / 'data.db')
+
+    db = DatabaseHandler(path)
+    db.connection.execute("UPDATE data SET val = 'y' WHERE id = 1000")
+
+    locked = []
+    remove = io.remove_delta_journal
+
+    # the locks are per process (connections in this process share them)
+    code = ('import sqlite3, sys\n'
+            'try:\n'
+            '    sqlite3.connect(sys.argv[1], timeout=0).execute("SELECT COUNT(*) FROM data")\n'
+            'except sqlite3.OperationalError:\n'
+            '    sys.exit(1)\n')
+
+    # called after all pages are written, before the file is unlocked
+    def remove_delta_journal(journal_path):
+
+        locked.append(subprocess.run([sys.executable, '-c', code, str(path)]).returncode == 1)
+
+        remove(journal_path)
+
+    monkeypatch.setattr(io, 'remove_delta_journal', remove_delta_journal)
+
+    db.save()
+
+    assert locked == [True]
+
+
+def test_page_hashes_are_read_from_the_file(monkeypatch, tmp_path):
+
+    monkeypatch.setattr(io, 'HASH_CHUNK_PAGES', 3)
+
+    path = create_large_database(tmp_path / 'data.db')
+
+    db = DatabaseHandler(path)
+
+    assert db.page_hashes == io.get_page_hashes(db.connection.serialize(), db.get_page_size())
+
+    db.connection.execute("UPDATE data SET val = 'y' WHERE id = 1000")
+    db.save(delta=False)
+
+    assert db.page_hashes == io.get_page_hashes(path.read_bytes(), db.get_page_size())
+    assert db.can_save_delta()
+
+
+def test_save_without_serialize(monkeypatch, tmp_path):
+
+    monkeypatch.setattr(io, 'can_serialize', lambda connection: False)
+
+    path = create_large_database(tmp_path / 'data.db')
+
+    db = DatabaseHandler(path)
+    db.connection.execute('CREATE INDEX auto_idx_data_val ON data (val)')
+    db.auto_indexes.add('auto_idx_data_val')
+    db.connection.execute("UPDATE data SET val = 'y' WHERE id = 1000")
+
+    assert not db.can_save_delta()
+
+    db.save()
+
+    assert read_values(path) == (2000, 1999 * 200 + 1)
+
+    connection = sqlite3.connect(path)
+    assert connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == []
+    connection.close()
+
+    # the index is kept in the in-memory database
+    assert db.connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == \
+        [('auto_idx_data_val', )]
+
+
+def test_progress_arguments_and_rate(monkeypatch, tmp_path):
+
+    use_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(io, 'is_local_path', lambda path: False)
+
+    path = create_large_database(tmp_path / 'data.db')
+
+    calls = []
+    progress = lambda *args: calls.append(args)
+
+    db = DatabaseHandler(path, progress=progress)
+
+    # copied to the cache (bytes), then loaded (pages)
+    assert calls[0][2] == os.path.getsize(path)
+    assert calls[-1][1:] == (0, os.path.getsize(path) // db.get_page_size())
+    assert db.rate > 0
+
+    db.connection.execute("UPDATE data SET val = 'y' WHERE id = 1000")
+
+    for delta in (True, False):
+
+        calls.clear()
+        db.rate = None
+        db.save(delta=delta)
+
+        assert calls and all(len(n) == 3 and n[1] <= n[2] for n in calls)
+        assert calls[-1][1] == 0
+        assert db.rate > 0
+
+
+def test_backup_step_from_measured_throughput(monkeypatch, tmp_path):
+
+    monkeypatch.setattr(io, 'TRANSFER_RATES', {})
+
+    path = create_large_database(tmp_path / 'data.db')
+
+    # the first load uses the default step
+    calls = []
+    db = DatabaseHandler(path, progress=lambda *args: calls.append(args))
+
+    n_pages = calls[0][2]
+    assert len(calls) == -(-n_pages // db.pages)
+    assert str(tmp_path) in io.TRANSFER_RATES
+
+    # the step is chosen from the measured throughput
+    page_size = db.get_page_size()
+    io.TRANSFER_RATES[str(tmp_path)] = 40.5 * page_size / io.STEP_INTERVAL
+
+    calls.clear()
+    db.load(progress=lambda *args: calls.append(args))
+
+    assert [n[1] for n in calls[:2]] == [n_pages - 40, n_pages - 80]
+
+
+def test_close(tmp_path):
+
+    db = DatabaseHandler(create_database(tmp_path / 'data.db'))
+
+    other = sqlite3.connect(db.uri, uri=True)
+    assert other.execute('SELECT COUNT(*) FROM data').fetchone() == (2, )
+    other.close()
+
+    db.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        db.connection.execute('SELECT 1')
+
+    # the in-memory database was deleted with its last connection
+    other = sqlite3.connect(db.uri, uri=True)
+    assert other.execute('SELECT COUNT(*) FROM sqlite_master').fetchone() == (0, )
+    other.close()
+
+
+def test_lazy(monkeypatch, tmp_path):
+
+    use_cache(monkeypatch, tmp_path)
+
+    path = create_database(tmp_path / 'data.db')
+
+    db = DatabaseHandler(path, lazy=True)
+
+    # the local copy is opened instead of reading the file into memory
+    assert db.local_path.parent == tmp_path / 'cache'
+    assert db.uri.endswith('?mode=ro')
+    assert db.connection.execute('SELECT val FROM data ORDER BY id').fetchall() == [('a', ), ('b', )]
+
+    # limited by the maximum that SQLite was compiled with
+    assert db.connection.execute('PRAGMA mmap_size').fetchone()[0] > 0
+
+    with pytest.raises(sqlite3.OperationalError):
+        db.connection.execute("INSERT INTO data (val) VALUES ('c')")
+
+    with pytest.raises(PermissionError):
+        db.save()
+
+    db.close()
+
+
+def test_lazy_load_after_change(monkeypatch, tmp_path):
+
+    use_cache(monkeypatch, tmp_path)
+
+    path = create_database(tmp_path / 'data.db')
+
+    db = DatabaseHandler(path, lazy=True)
+    first = db.local_path
+
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO data (val) VALUES ('c')")
+    connection.commit()
+    connection.close()
+
+    db.load()
+
+    assert db.local_path != first
+    assert not first.exists()
+    assert db.connection.execute('SELECT COUNT(*) FROM data').fetchone() == (3, )
+
+    db.close()
+
+
+JSON_TEXT = '{"name": "café", "values": [1, 2.5, null]}'
+
+
+@pytest.mark.parametrize('encoding', ['utf_8', 'utf_8_sig', 'utf_16', 'utf_16_le', 'utf_16_be',
+                                      'utf_32', 'utf_32_le', 'utf_32_be', 'cp1252'])
+def test_load_json_encodings(tmp_path, encoding):
+
+    path = tmp_path / 'data.json'
+    path.write_bytes(JSON_TEXT.encode(encoding))
+
+    assert io.load_json(path) == {'name': 'café', 'values': [1, 2.5, None]}
+
+
+def test_load_json_invalid(tmp_path):
+
+    path = tmp_path / 'data.json'
+    path.write_bytes(b'{"a": ')
+
+    assert io.load_json(path) is False
+
+    # json accepts NaN, orjson does not
+    path.write_bytes(b'[NaN]')
+
+    assert str(io.load_json(path)) == '[nan]'
+
+
+def test_load_json_cache(monkeypatch, tmp_path):
+
+    monkeypatch.setattr(io, 'JSON_CACHE', {})
+    monkeypatch.setattr(io, 'JSON_CACHE_SIZE', 2)
+
+    path = tmp_path / 'data.json'
+    path.write_text('[1]')
+
+    first = io.load_json(path)
+
+    # the file is not read again
+    assert io.load_json(path) is first
+
+    path.write_text('[1, 2]')
+
+    assert io.load_json(path) == [1, 2]
+
+    for i in range(3):
+        (tmp_path / f'{i}.json').write_text(str(i))
+        assert io.load_json(tmp_path / f'{i}.json') == i
+
+    assert len(io.JSON_CACHE) == 2
+    assert str(path) not in io.JSON_CACHE
+
+
+def create_tree(folder):
+    """
+    folder/a.pdf, b.txt, report_1.pdf, sub/c.pdf, sub/deep/d.pdf, link → sub
+    """
+
+    for name in ('a.pdf', 'b.txt', 'report_1.pdf', 'sub/c.pdf', 'sub/deep/d.pdf'):
+
+        path = folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * len(name))
+
+    os.symlink(folder / 'sub', folder / 'link', target_is_directory=True)
+
+    return folder
+
+
+@pytest.mark.parametrize('workers', [0, 4])
+def test_scan_folder(monkeypatch, tmp_path, workers):
+
+    monkeypatch.setattr(io, 'SCAN_BATCH_SIZE', 2)
+
+    folder = create_tree(tmp_path)
+
+    def scan(**kwargs):
+        return {str(n.path.relative_to(folder)): n.size
+                for n in io.scan_folder(folder, workers=workers, **kwargs)}
+
+    assert scan(ext='.pdf') == {'a.pdf': 5, 'report_1.pdf': 12}
+
+    # symlinks to folders are not followed
+    assert scan(ext=('.pdf', '.txt'), recursive=True) == {
+        'a.pdf': 5, 'b.txt': 5, 'report_1.pdf': 12,
+        os.path.join('sub', 'c.pdf'): 9, os.path.join('sub', 'deep', 'd.pdf'): 14}
+
+    assert scan(pattern='report_*', recursive=True) == {'report_1.pdf': 12}
+
+    entries = list(io.scan_folder(folder, ext='.txt', workers=workers, stat=False))
+
+    assert entries == [io.FileEntry(folder / 'b.txt', None, None)]
+    assert entries[0].path.is_absolute()
+
+
+def test_scan_folder_stop_early(tmp_path):
+
+    for i in range(50):
+        os.makedirs(tmp_path / str(i))
+        (tmp_path / str(i) / 'a.txt').write_text('')
+
+    scan = io.scan_folder(tmp_path, recursive=True, workers=4)
+
+    assert next(scan).path.name == 'a.txt'
+
+    # shuts the thread pool down without waiting for the other folders
+    scan.close()
+
+
+def test_process_input(tmp_path):
+
+    folder = create_tree(tmp_path)
+
+    fnames, result = io.process_input(str(folder), ext='.pdf', recursive=True)
+
+    assert result == folder
+    assert sorted(n.name for n in fnames) == ['a.pdf', 'c.pdf', 'd.pdf', 'report_1.pdf']
+
+    fnames, result = io.process_input((str(folder / 'a.pdf'), str(folder / 'b.txt')), ext='.pdf')
+
+    assert fnames == [folder / 'a.pdf']
+    assert result == folder
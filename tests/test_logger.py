@@ -0,0 +1,150 @@
+import sys
+import json
+import queue
+import logging
+
+from gui_template.logger import (LEVEL_PREFIXES, MESSAGE_PREFIX, TIMESTAMP_PREFIX,
+                                 JsonFormatter, LogFileHandler, LogQueueHandler,
+                                 LogQueueListener, RingBufferHandler, formatter,
+                                 format_log_lines, parse_log_lines)
+
+
+LINES = ['2024-01-02 03:04:05 INFO     loaded 3 rows',
+         '2024-01-02 03:04:06 CRITICAL out of memory',
+         '2024-01-02 03:04:07 ERROR    could not open <data.db> & more',
+         '  File "app.py", line 3, in <module>',
+         '2024-01-02 03:04:08 done in 1.0 s',
+         '']
+
+
+def test_parse_log_lines():
+
+    assert parse_log_lines(LINES) == [('2024-01-02 03:04:05', 'INFO', 'loaded 3 rows'),
+                                      ('2024-01-02 03:04:06', 'CRITICAL', 'out of memory'),
+                                      ('2024-01-02 03:04:07', 'ERROR', 'could not open <data.db> & more'),
+                                      ('', '', '  File "app.py", line 3, in <module>'),
+                                      ('', '', '2024-01-02 03:04:08 done in 1.0 s'),
+                                      ('', '', '')]
+
+
+def test_format_log_lines():
+
+    formatted, counts = format_log_lines(iter(LINES))
+
+    assert formatted == [
+        f'{TIMESTAMP_PREFIX}2024-01-02 03:04:05{LEVEL_PREFIXES["INFO"]}loaded 3 rows</span>',
+        f'{TIMESTAMP_PREFIX}2024-01-02 03:04:06{LEVEL_PREFIXES["CRITICAL"]}out of memory</span>',
+        f'{TIMESTAMP_PREFIX}2024-01-02 03:04:07{LEVEL_PREFIXES["ERROR"]}could not open &lt;data.db&gt; &amp; more</span>',
+        f'{MESSAGE_PREFIX}  File "app.py", line 3, in &lt;module&gt;</span>',
+        f'{MESSAGE_PREFIX}2024-01-02 03:04:08 done in 1.0 s</span>',
+        f'{MESSAGE_PREFIX}</span>']
+
+    assert counts == {'DEBUG': 0, 'INFO': 1, 'WARNING': 0, 'ERROR': 1, 'CRITICAL': 1}
+
+
+def test_format_no_lines():
+    assert format_log_lines([]) == ([], {'DEBUG': 0, 'INFO': 0, 'WARNING': 0, 'ERROR': 0, 'CRITICAL': 0})
+
+
+def make_record(msg, *args, level=logging.INFO, exc_info=None):
+    return logging.LogRecord('test', level, __file__, 1, msg, args, exc_info)
+
+
+def test_ring_buffer():
+
+    buffer = RingBufferHandler(max_lines=4)
+    buffer.setFormatter(logging.Formatter('%(message)s'))
+
+    buffer.handle(make_record('a'))
+    buffer.handle(make_record('b\nc'))
+
+    assert buffer.read() == (['a', 'b', 'c'], 3)
+    assert buffer.read(3) == ([], 3)
+
+    for msg in ('d', 'e', 'f'):
+        buffer.handle(make_record(msg))
+
+    assert buffer.read(3) == (['d', 'e', 'f'], 6)
+
+    # only the last max_lines lines are kept
+    assert buffer.read(0) == (['c', 'd', 'e', 'f'], 6)
+
+
+def test_queue_handler_formats_the_message():
+
+    log_queue = queue.SimpleQueue()
+    handler = LogQueueHandler(log_queue)
+
+    values = [1]
+
+    try:
+        raise ValueError('failed')
+
+    except ValueError:
+        handler.handle(make_record('values %s', values, level=logging.ERROR, exc_info=sys.exc_info()))
+
+    # changed after it was logged
+    values.append(2)
+
+    record = log_queue.get_nowait()
+
+    assert record.getMessage() == 'values [1]'
+    assert record.exc_info is None
+    assert 'ValueError: failed' in record.exc_text
+
+    line = formatter.format(record)
+
+    # the formatted text is reused by the other handlers
+    assert formatter.format(record) is line
+    assert line[29:].startswith('values [1]\nTraceback')
+
+    assert json.loads(JsonFormatter().format(record))['message'].startswith('values [1]\nTraceback')
+
+
+def test_listener_flushes_when_the_queue_is_empty():
+
+    class Handler(logging.Handler):
+
+        def __init__(self):
+            super().__init__()
+            self.events = []
+
+        def emit(self, record):
+            self.events.append(record.getMessage())
+
+        def flush(self):
+            self.events.append('flush')
+
+    handler = Handler()
+
+    log_queue = queue.SimpleQueue()
+
+    for msg in ('a', 'b', 'c'):
+        log_queue.put(make_record(msg))
+
+    listener = LogQueueListener(log_queue, handler)
+    listener.start()
+    listener.stop()
+
+    assert handler.events[:4] == ['a', 'b', 'c', 'flush']
+
+
+def test_file_handler_rotates(tmp_path):
+
+    path = tmp_path / 'log.txt'
+    path.write_text('x' * 50)
+
+    handler = LogFileHandler(str(path), maxBytes=100, backupCount=2, encoding='utf-8', delay=True)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+
+    # the size of the existing file is counted
+    assert handler.size == 50
+
+    for i in range(10):
+        handler.handle(make_record(f'{i:>19}'))
+
+    handler.close()
+
+    assert sorted(n.name for n in tmp_path.iterdir()) == ['log.txt', 'log.txt.1', 'log.txt.2']
+    assert all(n.stat().st_size <= 100 for n in tmp_path.iterdir())
+    assert path.read_text().splitlines()[-1].strip() == '9'
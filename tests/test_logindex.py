@@ -0,0 +1,165 @@
+from gui_template import logindex
+from gui_template.logindex import LogIndex, query_tokens
+
+
+def make_index():
+
+    index = LogIndex()
+
+    for i in range(50):
+        index.add(1000.0 + i, 'INFO', f'loaded message {i} from the database')
+
+    index.add(2000.0, 'ERROR', 'could not open mydatabase.db')
+    index.add(2001.0, 'WARNING', 'mymessage 42 was skipped')
+
+    return index
+
+
+def brute_force(index, text):
+
+    text = text.lower()
+
+    return [n for n in range(len(index)) if text in index.record(n)[2].lower()]
+
+
+def test_query_tokens():
+
+    assert query_tokens('datab') == (set(), None, None, 'datab')
+    assert query_tokens('message 4') == (set(), '4', 'message', None)
+    assert query_tokens('loaded message 4 from') == ({'message', '4'}, 'from', 'loaded', None)
+    assert query_tokens(' from the datab') == ({'from', 'the'}, 'datab', None, None)
+
+
+def test_search_partial_word():
+
+    index = make_index()
+
+    assert len(index.search(text='datab')) == 51
+    assert index.search(text='datab') == brute_force(index, 'datab')
+
+    # the middle of a word
+    assert index.search(text='atabas') == brute_force(index, 'atabas')
+
+
+def test_search_multiple_words():
+
+    index = make_index()
+
+    for text in ('message 4', 'message 42', 'loaded message 4', 'e 4',
+                 'message 4 from the', 'from the datab', '.db', 'MESSAGE 1'):
+        assert index.search(text=text) == brute_force(index, text), text
+
+    assert len(index.search(text='message 4')) == 12
+
+
+def test_search_prefix_after_new_words():
+
+    index = make_index()
+
+    assert index.search(text=' datab') == brute_force(index, ' datab')
+
+    index.add(3000.0, 'INFO', 'a new databasefile')
+
+    assert index.search(text=' datab') == brute_force(index, ' datab')
+    assert index.search(text=' datab', levels=['INFO']) == list(range(50)) + [52]
+
+
+def test_search_whole_words_and_levels():
+
+    index = make_index()
+
+    assert index.search(levels=['ERROR']) == [50]
+    assert index.search(levels=['INFO', 'WARNING'], text='skipped') == [51]
+    assert index.search(text='nothing like this') == []
+
+
+def test_search_single_word_uses_the_index(monkeypatch):
+
+    index = make_index()
+
+    for text in ('datab', 'atabas', 'ydatabase', 'MyMessage', '4', 'db', 'nothing'):
+        assert index.search(text=text) == brute_force(index, text), text
+
+    # the messages are not compared
+    monkeypatch.setattr(index, 'messages', [''] * len(index))
+
+    assert index.search(text='ydatab') == [50]
+    assert index.search(text='kippe', levels=['WARNING']) == [51]
+    assert index.search(text='oade') == list(range(50))
+
+
+def test_search_end_of_word():
+
+    index = make_index()
+
+    for text in ('ssage 4', 'e 42', 'database.', 'ydatabase.db', 'x 1'):
+        assert index.search(text=text) == brute_force(index, text), text
+
+
+def test_search_many_matching_words(monkeypatch):
+
+    index = make_index()
+    index.update_tokens()
+
+    # the postings are not merged, the messages are compared instead
+    monkeypatch.setattr(logindex, 'MAX_PREFIX_TOKENS', 2)
+    assert index.find_part('1') is None
+    assert index.search(text='1') == brute_force(index, '1')
+
+    monkeypatch.setattr(logindex, 'MAX_PREFIX_TOKENS', 1000)
+    monkeypatch.setattr(logindex, 'MAX_MERGE_RATIO', 0.01)
+    assert index.find_part('1') is None
+    assert index.search(text='1') == brute_force(index, '1')
+
+
+def test_search_after_drop():
+
+    index = LogIndex(max_records=10)
+
+    for i in range(25):
+        index.add(1000.0 + i, 'INFO', f'message {i}')
+
+    assert len(index) == 10
+    assert index.search(text='ssage') == list(range(10))
+    assert index.search(text='24') == [9]
+    assert index.line(9).endswith('message 24')
+
+
+def test_search_time_range_and_first():
+
+    index = make_index()
+
+    assert index.search(start=1010.0, end=1013.0) == [10, 11, 12]
+    assert index.search(levels=['INFO'], start=1048.0) == [48, 49]
+    assert index.search(text='message', first=49) == [49, 51]
+
+
+def test_load_structured_log(tmp_path):
+
+    import logging
+
+    from gui_template.logger import JsonFormatter, formatter
+
+    records = [logging.LogRecord('test', level, __file__, 1, msg, None, None)
+               for level, msg in [(logging.INFO, 'loaded data.db'),
+                                  (logging.ERROR, 'could not save data.db'),
+                                  (logging.INFO, 'multi\nline "message"')]]
+
+    path = tmp_path / 'log.jsonl'
+
+    with open(path, 'w', encoding='utf-8') as f:
+
+        for record in records:
+            f.write(JsonFormatter().format(record) + '\n')
+
+        f.write('not json\n')
+
+    index = LogIndex.load(path)
+
+    assert len(index) == 3
+    assert index.count('ERROR') == 1
+    assert index.search(levels=['ERROR'], text='data.db') == [1]
+    assert index.search(text='"message"') == [2]
+
+    # the same lines as in data/log.txt
+    assert [index.line(n) for n in range(3)] == [formatter.format(n) for n in records]
@@ -0,0 +1,267 @@
+import datetime
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer, Qt
+
+from gui_template.model import LogModel, TableModel, TablePopulator
+
+
+class FailingRows:
+
+    def __init__(self, n):
+        """
+        cursor-like source that returns full batches and raises
+        once at least n rows have been returned
+        """
+
+        self.n = n
+        self.closed = False
+
+    def fetchmany(self, size):
+
+        if self.n <= 0:
+            raise ValueError('cursor failed')
+
+        self.n -= size
+
+        return [(i, ) for i in range(size)]
+
+    def close(self):
+        self.closed = True
+
+
+def get_column(model, j) -> list:
+    return [model.data(model.index(i, j)) for i in range(model.rowCount())]
+
+
+def run_populator(rows, first=10):
+
+    model = TableModel(['n'], [])
+    populator = TablePopulator(model, rows, first=first)
+
+    result = []
+    loop = QEventLoop()
+
+    def finished(stats):
+        result.append(stats)
+        loop.quit()
+
+    populator.finished.connect(finished)
+
+    # in case finished is never emitted
+    QTimer.singleShot(5000, loop.quit)
+
+    populator.start()
+
+    if not result:
+        loop.exec_()
+
+    return model, result
+
+
+def test_populator_all_rows(qapp):
+
+    model, result = run_populator(iter([(i, ) for i in range(1000)]))
+
+    assert len(result) == 1
+    assert result[0]['rows'] == 1000
+    assert result[0]['error'] is None
+    assert model.rowCount() == 1000
+
+
+def test_populator_source_raises(qapp):
+
+    rows = FailingRows(250)
+
+    model, result = run_populator(rows)
+
+    assert len(result) == 1
+    assert result[0]['error'] == 'cursor failed'
+    assert result[0]['rows'] >= 250
+    assert model.rowCount() == result[0]['rows']
+    assert rows.closed
+
+
+def test_populator_generator_raises_in_first_batch(qapp):
+
+    def rows():
+        yield (1, )
+        raise ValueError('bad row')
+
+    model, result = run_populator(rows())
+
+    assert len(result) == 1
+    assert result[0]['error'] == 'bad row'
+    assert result[0]['total'] is not None
+
+
+def test_table_model_display_values(qapp):
+
+    vals = [(1, '2.0', 'a ', None, datetime.datetime(2020, 3, 17, 18, 44, 15)),
+            (2, '2.5', 'null', '', None)]
+
+    model = TableModel(['n', 'x', 'text', 'empty', 'date'], vals)
+
+    assert model.rowCount() == 2
+    assert model.columnCount() == 5
+
+    assert [model.headerData(j, Qt.Horizontal) for j in range(5)] == \
+        ['n', 'x', 'text', 'empty', 'date']
+    assert model.headerData(0, Qt.Vertical) == '1'
+
+    # the same strings as helper.populate_table, None for empty cells
+    assert get_column(model, 0) == ['1', '2']
+    assert get_column(model, 1) == ['2', '2.5']
+    assert get_column(model, 2) == ['a', None]
+    assert get_column(model, 3) == [None, None]
+    assert get_column(model, 4) == ['17-03-2020 18:44:15', None]
+
+    assert model.data(model.index(0, 0), Qt.EditRole) is None
+
+
+def test_table_model_empty_table(qapp):
+
+    model = TableModel(['a', 'b'], [])
+
+    assert model.rowCount() == 0
+    assert model.columnCount() == 2
+
+    model.appendRows([(1, 'x')])
+
+    assert get_column(model, 1) == ['x']
+
+
+def test_table_model_append_rows_with_other_types(qapp):
+
+    model = TableModel(['n'], [(1, ), (2, )])
+
+    model.appendRows([('b', ), (None, ), (1.5, )])
+
+    assert model.rowCount() == 5
+    assert get_column(model, 0) == ['1', '2', 'b', None, '1.5']
+
+
+def test_table_model_set_table(qapp):
+
+    model = TableModel(['n'], [(1, ), (2, )])
+    model.sort(0, Qt.DescendingOrder)
+
+    model.setTable(['a', 'b'], [(3, 4)])
+
+    assert model.sort_keys == []
+    assert model.columnCount() == 2
+    assert get_column(model, 0) == ['3']
+
+
+def test_table_model_sort(qapp):
+
+    model = TableModel(['n', 'text'], [(2, 'b'), (1, 'c'), (None, 'a'), (1, 'a')])
+
+    model.sort(0, Qt.AscendingOrder)
+
+    assert get_column(model, 0) == ['1', '1', '2', None]
+    assert get_column(model, 1) == ['c', 'a', 'b', 'a']
+
+    # the previous key is kept as secondary key
+    model.sort(1, Qt.DescendingOrder)
+
+    assert model.sort_keys == [(1, True), (0, False)]
+    assert get_column(model, 1) == ['c', 'b', 'a', 'a']
+    assert get_column(model, 0) == ['1', '2', '1', None]
+
+    # the original order
+    model.sort(-1)
+
+    assert model.order is None
+    assert get_column(model, 0) == ['2', '1', None, '1']
+
+
+def test_table_model_sort_moves_persistent_indices(qapp):
+
+    from PyQt5.QtCore import QPersistentModelIndex
+
+    model = TableModel(['n'], [(3, ), (1, ), (2, )])
+
+    index = QPersistentModelIndex(model.index(0, 0))
+
+    model.sort(0, Qt.AscendingOrder)
+
+    assert index.row() == 2
+    assert model.data(model.index(index.row(), 0)) == '3'
+
+    model.sort(0, Qt.DescendingOrder)
+
+    assert index.row() == 0
+
+
+def test_populator_cursor(qapp):
+
+    import sqlite3
+
+    connection = sqlite3.connect(':memory:')
+    cursor = connection.execute('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+                                'SELECT i + 1 FROM n WHERE i < 500) SELECT i FROM n')
+
+    model, result = run_populator(cursor)
+
+    assert result[0]['rows'] == 500
+    assert get_column(model, 0)[-1] == '500'
+
+
+def test_populator_cancel(qapp):
+
+    model = TableModel(['n'], [])
+    populator = TablePopulator(model, iter([(i, ) for i in range(100000)]), first=10)
+
+    result = []
+    populator.finished.connect(result.append)
+
+    # the first batch is added by start, the others by the timer
+    populator.start()
+    populator.cancel()
+    populator.cancel()
+
+    QCoreApplication.processEvents()
+
+    assert len(result) == 1
+    assert result[0]['cancelled']
+    assert result[0]['rows'] == 10
+    assert model.rowCount() == 10
+    assert not populator.timer.isActive()
+
+
+def test_log_model_drops_the_oldest_lines(qapp):
+
+    model = LogModel(max_lines=5)
+
+    removed = []
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+    model.appendLines(['1', '2', '3'])
+    model.appendLines(['4', '5', '6', '7'])
+
+    assert removed == [(0, 1)]
+    assert list(model.lines) == ['3', '4', '5', '6', '7']
+    assert model.data(model.index(0, 0)) == '3'
+
+    # more lines than max_lines
+    model.appendLines([str(i) for i in range(10)])
+
+    assert list(model.lines) == ['5', '6', '7', '8', '9']
+
+    model.clear()
+
+    assert model.rowCount() == 0
+
+
+def test_log_model_colors(qapp):
+
+    model = LogModel(colors={'ERROR': '#ff0000'})
+
+    model.appendLines(['2020-01-01 12:00:00 ERROR    failed',
+                       '2020-01-01 12:00:00 INFO     loaded',
+                       'Traceback'])
+
+    colors = [model.data(model.index(i, 0), Qt.ForegroundRole) for i in range(3)]
+
+    assert colors[0].color().name() == '#ff0000'
+    assert colors[1:] == [None, None]
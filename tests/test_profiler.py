@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+from gui_template.profiler import SQLProfiler, normalize_statement, percentile
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT * FROM data WHERE id IN (1, 2, 3) AND name = 'x'",
+     'SELECT * FROM data WHERE id IN (?) AND name = ?'),
+    ('SELECT  "col 1"\n FROM t2 WHERE x > 1.5e3',
+     'SELECT "col 1" FROM t2 WHERE x > ?'),
+    ("INSERT INTO data VALUES (1, 'a'), (2, 'it''s')",
+     'INSERT INTO data VALUES (?)'),
+])
+def test_normalize_statement(sql, expected):
+    assert normalize_statement(sql) == expected
+
+
+def test_percentile():
+
+    assert percentile([], 95) == 0.0
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile([3, 1, 2], 50) == 2
+
+
+def test_trace_and_record():
+
+    profiler = SQLProfiler()
+
+    connection = sqlite3.connect(':memory:')
+    connection.set_trace_callback(profiler.trace)
+
+    connection.execute('CREATE TABLE data (id INTEGER PRIMARY KEY, val INTEGER)')
+    connection.executemany('INSERT INTO data (val) VALUES (?)', [(i, ) for i in range(10)])
+
+    for i in range(3):
+        connection.execute('SELECT * FROM data WHERE val = ?', (i, )).fetchall()
+        profiler.record('SELECT * FROM data WHERE val = ?', 0.01 * (i + 1), rows=1, params=(i, ))
+
+    report = {n['sql']: n for n in profiler.report()}
+
+    select = report['SELECT * FROM data WHERE val = ?']
+
+    assert select['calls'] == 3
+    assert select['rows'] == 3
+    assert select['total'] == pytest.approx(0.06)
+    assert select['mean'] == pytest.approx(0.02)
+    assert select['p95'] == pytest.approx(0.03)
+
+    # executemany is traced once for each row
+    assert report['INSERT INTO data (val) VALUES (?)']['calls'] == 10
+
+    # the statement that took the most time is first
+    assert profiler.report()[0]['sql'] == select['sql']
+
+    profiler.reset()
+
+    assert profiler.report() == []
+
+
+def test_explain_slowest():
+
+    profiler = SQLProfiler()
+
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE data (id INTEGER PRIMARY KEY, val INTEGER)')
+
+    profiler.record('SELECT * FROM data WHERE val > ? ORDER BY val', 0.2, params=(1, ))
+    profiler.record('SELECT * FROM data WHERE id = ?', 0.1, params=(1, ))
+    profiler.record('SELECT * FROM missing', 0.05, params=())
+
+    profiler.trace('PRAGMA page_size')
+
+    result = profiler.explain_slowest(connection, n=3)
+
+    assert [row['sql'] for row, _ in result] == ['SELECT * FROM data WHERE val > ? ORDER BY val',
+                                                 'SELECT * FROM data WHERE id = ?',
+                                                 'SELECT * FROM missing']
+
+    scan, search, missing = [plan for _, plan in result]
+
+    assert scan[0].startswith('SCAN data')
+    assert any('TEMP B-TREE' in n for n in scan)
+    assert search[0].startswith('SEARCH data USING INTEGER PRIMARY KEY')
+    assert missing[0].startswith('could not explain')
+
+    # statements that were only traced are not timed
+    assert profiler.explain(connection, 'PRAGMA page_size') == []
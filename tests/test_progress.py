@@ -0,0 +1,114 @@
+import pytest
+
+from PyQt5.QtWidgets import QWidget
+
+from gui_template import progress
+from gui_template.progress import MyProgressBar, ProgressThrottle
+
+
+class Clock:
+
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+
+class Parent(QWidget):
+
+    def __init__(self, app):
+        """
+        the part of the main window that MyProgressBar uses,
+        counts the calls to app.processEvents
+        """
+
+        super().__init__()
+
+        self.app = self
+        self.qapp = app
+        self.events = 0
+
+    def processEvents(self):
+        self.events += 1
+        self.qapp.processEvents()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+
+    clock = Clock()
+    monkeypatch.setattr(progress.time, 'perf_counter', clock)
+
+    return clock
+
+
+def test_throttle(clock):
+
+    throttle = ProgressThrottle(min_interval=0.05, max_interval=0.25)
+
+    # the first update is always shown
+    assert throttle(0)
+
+    # too soon
+    clock.t += 0.01
+    assert not throttle(5)
+
+    # the same integer percentage
+    clock.t += 0.1
+    assert not throttle(0.5)
+
+    assert throttle(5)
+
+    # shown at least every max_interval seconds
+    clock.t += 0.3
+    assert throttle(5.1)
+
+
+def test_throttle_rate_and_eta(clock):
+
+    throttle = ProgressThrottle()
+
+    assert throttle.eta is None
+
+    clock.t += 10
+    throttle(25)
+
+    assert throttle.elapsed == pytest.approx(10)
+    assert throttle.rate == pytest.approx(2.5)
+    assert throttle.eta == pytest.approx(30)
+
+
+def test_progress_bar_processes_events_when_due(qapp, clock):
+
+    parent = Parent(qapp)
+    pb = MyProgressBar(parent)
+
+    # one loop of 100000 iterations in 1 s
+    for i in range(100000):
+
+        clock.t += 1e-5
+
+        pb.setValue(100 * i / 100000)
+        pb.update()
+
+    pb.finish()
+
+    assert pb.currval == pytest.approx(100 * 99999 / 100000)
+    assert 1 <= parent.events <= 1 / progress.MIN_INTERVAL + 1
+
+
+def test_progress_bar_cancel(qapp):
+
+    parent = Parent(qapp)
+    cancelled = []
+
+    pb = MyProgressBar(parent, cancel=lambda: cancelled.append(True))
+    pb.cancelButton.click()
+
+    assert cancelled == [True]
+
+    pb = MyProgressBar(parent, cancel=lambda: cancelled.append(True))
+    pb.finish()
+
+    assert cancelled == [True]
@@ -0,0 +1,220 @@
+import sqlite3
+import threading
+
+import pytest
+
+from gui_template.cache import FileCache
+from gui_template.io import DatabaseHandler
+from gui_template.query import ConnectionPool, RowStream, fetch_blocks, get_columns, normalize_sql
+
+
+def create_database(path, rows=100):
+
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE data (id INTEGER PRIMARY KEY, val INTEGER)')
+    connection.executemany('INSERT INTO data (val) VALUES (?)', [(i, ) for i in range(rows)])
+    connection.commit()
+    connection.close()
+
+    return path
+
+
+@pytest.fixture
+def db(tmp_path):
+
+    db = DatabaseHandler(create_database(tmp_path / 'data.db'), cache=False)
+
+    yield db
+
+    db.close()
+
+
+@pytest.fixture
+def pool(db):
+
+    pool = ConnectionPool(db, size=2)
+
+    yield pool
+
+    pool.close()
+
+
+def test_normalize_sql():
+
+    assert normalize_sql('SELECT *\n    FROM data\n\tWHERE val = ?  ') == \
+        'SELECT * FROM data WHERE val = ?'
+
+    # literals, quoted names and comments are kept
+    assert normalize_sql("SELECT 'a  b', \"c  d\" -- x  y\nFROM data") == \
+        "SELECT 'a  b', \"c  d\" -- x  y\n FROM data"
+
+
+def test_read_and_write(pool):
+
+    assert pool.fetchone('SELECT COUNT(*) FROM data') == (100, )
+
+    assert pool.write('UPDATE data SET val = ? WHERE id = ?', (-1, 1)) == 1
+    assert pool.executemany('INSERT INTO data (val) VALUES (?)', [(1000, ), (1001, )]) == 2
+
+    # the pool connections read the in-memory database that the writes went to
+    assert pool.fetchall('SELECT val FROM data WHERE id = 1 OR val > 999') == \
+        [(-1, ), (1000, ), (1001, )]
+
+
+def test_pool_connections_are_read_only(pool):
+
+    with pool.connection() as connection:
+        with pytest.raises(sqlite3.OperationalError):
+            connection.execute('DELETE FROM data')
+
+    assert pool.fetchone('SELECT COUNT(*) FROM data') == (100, )
+
+
+def test_failed_write_is_rolled_back(pool):
+
+    rows = [(1000, ), (1001, ), ('x', 'y')]
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        pool.executemany('INSERT INTO data (val) VALUES (?)', rows)
+
+    assert pool.fetchone('SELECT COUNT(*) FROM data') == (100, )
+    assert not pool.db.connection.in_transaction
+
+
+def test_reads_from_threads(pool):
+
+    results = []
+
+    def read(i):
+        results.append(pool.fetchone('SELECT val FROM data WHERE id = ?', (i + 1, )))
+
+    threads = [threading.Thread(target=read, args=(i, )) for i in range(20)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join(10)
+
+    assert sorted(results) == [(i, ) for i in range(20)]
+
+    # at most size connections are created
+    assert pool.idle.qsize() <= 2
+
+
+def test_wait_for_a_free_connection(pool):
+
+    connections = [pool.acquire(), pool.acquire()]
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pool.fetchone('SELECT 1')))
+    thread.start()
+    thread.join(0.2)
+
+    assert thread.is_alive()
+
+    pool.release(connections.pop())
+    thread.join(5)
+
+    assert result == [(1, )]
+
+    pool.release(connections.pop())
+
+
+def test_close(pool):
+
+    connection = pool.acquire()
+
+    pool.close()
+
+    # the connection that is used is closed when it is returned
+    pool.release(connection)
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute('SELECT 1')
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        pool.fetchall('SELECT 1')
+
+
+def test_lazy_database_is_read_only(monkeypatch, tmp_path):
+
+    from gui_template import io
+
+    monkeypatch.setattr(io, 'FILE_CACHE', FileCache(tmp_path / 'cache'))
+
+    db = DatabaseHandler(create_database(tmp_path / 'data.db'), lazy=True)
+    pool = ConnectionPool(db)
+
+    assert pool.fetchone('SELECT COUNT(*) FROM data') == (100, )
+
+    with pytest.raises(PermissionError):
+        pool.write('DELETE FROM data')
+
+    with pytest.raises(PermissionError):
+        pool.bulk_insert('data', ['val'], [(1, )])
+
+    pool.close()
+    db.close()
+
+
+def free_connections(pool) -> int:
+
+    n = 0
+
+    while pool.available.acquire(blocking=False):
+        n += 1
+
+    for _ in range(n):
+        pool.available.release()
+
+    return n
+
+
+@pytest.mark.parametrize('rows', [list(range(25)), tuple(range(25)), iter(range(25))])
+def test_fetch_blocks(rows):
+    assert [len(n) for n in fetch_blocks(rows, 10)] == [10, 10, 5]
+
+
+def test_row_stream(db):
+
+    closed = []
+
+    stream = RowStream(db.connection.execute('SELECT id, val FROM data'), size=30,
+                       on_close=lambda: closed.append(True))
+
+    assert get_columns(stream) == ['id', 'val']
+    assert [len(n) for n in stream.blocks()] == [30, 30, 30, 10]
+    assert stream.rows == 100
+
+    # on_close is called once
+    stream.close()
+
+    assert closed == [True]
+    assert stream.fetchmany() == []
+
+
+def test_pool_stream_returns_the_connection(pool):
+
+    with pool.stream('SELECT val FROM data', size=40) as rows:
+
+        assert rows.cols == ['val']
+        assert next(iter(rows)) == (0, )
+
+        # the connection is used until the stream is closed
+        assert free_connections(pool) == 1
+
+    assert free_connections(pool) == 2
+
+    rows = pool.stream('SELECT val FROM data')
+
+    assert len(list(rows)) == 100
+    assert free_connections(pool) == 2
+
+
+def test_pool_stream_error_returns_the_connection(pool):
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.stream('SELECT missing FROM data')
+
+    assert free_connections(pool) == 2
@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+
+from gui_template import sql
+from gui_template.sql import (build_insert, build_update, build_upsert, bulk_insert,
+                              bulk_update, bulk_upsert, quote_identifier)
+
+
+@pytest.fixture
+def connection():
+
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE "my data" (id INTEGER PRIMARY KEY, "na""me" TEXT, val REAL)')
+
+    yield connection
+
+    connection.close()
+
+
+def read_rows(connection):
+    return connection.execute('SELECT * FROM "my data" ORDER BY id').fetchall()
+
+
+def test_build_statements():
+
+    assert quote_identifier('a"b') == '"a""b"'
+
+    assert build_insert('data', ['id', 'name'], rows=2) == \
+        'INSERT INTO "data" ("id", "name") VALUES (?, ?), (?, ?)'
+
+    assert build_insert('data', ['id'], replace=True) == 'INSERT OR REPLACE INTO "data" ("id") VALUES (?)'
+
+    assert build_update('data', ['name', 'val'], ['id']) == \
+        'UPDATE "data" SET "name" = ?, "val" = ? WHERE "id" = ?'
+
+    assert build_upsert('data', ['id', 'name'], ['id']) == \
+        'INSERT INTO "data" ("id", "name") VALUES (?, ?) ON CONFLICT ("id") DO UPDATE SET "name" = excluded."name"'
+
+    assert build_upsert('data', ['id'], ['id']).endswith('ON CONFLICT ("id") DO NOTHING')
+
+
+@pytest.mark.parametrize('n', [0, 1, 499, 500, 501, 2345])
+@pytest.mark.parametrize('chunk_size', [None, 1000])
+def test_bulk_insert(connection, n, chunk_size):
+
+    # values that would break a statement with the values in the SQL text
+    rows = [(i, f"it's {i}; DROP TABLE x; --", i / 3) for i in range(n)]
+
+    written = []
+
+    assert bulk_insert(connection, 'my data', ['id', 'na"me', 'val'], iter(rows),
+                       chunk_size=chunk_size, progress=written.append) == n
+
+    assert read_rows(connection) == rows
+
+    if n:
+        assert written[-1] == n
+
+
+def test_bulk_insert_small_variable_limit(connection, monkeypatch):
+
+    monkeypatch.setattr(sql, 'get_max_variables', lambda connection: 7)
+
+    rows = [(i, 'a', None) for i in range(10)]
+
+    assert bulk_insert(connection, 'my data', ['id', 'na"me', 'val'], rows) == 10
+    assert read_rows(connection) == rows
+
+
+def test_bulk_insert_replace(connection):
+
+    bulk_insert(connection, 'my data', ['id', 'na"me'], [(1, 'a'), (2, 'b')])
+
+    with pytest.raises(sqlite3.IntegrityError):
+        bulk_insert(connection, 'my data', ['id', 'na"me'], [(3, 'c'), (1, 'x')])
+
+    # the failed chunk is rolled back
+    assert read_rows(connection) == [(1, 'a', None), (2, 'b', None)]
+
+    bulk_insert(connection, 'my data', ['id', 'na"me'], [(3, 'c'), (1, 'x')], replace=True)
+
+    assert read_rows(connection) == [(1, 'x', None), (2, 'b', None), (3, 'c', None)]
+
+
+def test_bulk_update_and_upsert(connection):
+
+    bulk_insert(connection, 'my data', ['id', 'na"me'], [(i, 'a') for i in range(5)])
+
+    assert bulk_update(connection, 'my data', ['na"me'], ['id'], [('b', 1), ('c', 3), ('d', 9)],
+                       chunk_size=2) == 2
+
+    assert bulk_upsert(connection, 'my data', ['id', 'na"me', 'val'], ['id'],
+                       [(4, 'e', 1.5), (5, 'f', 2.5)]) == 2
+
+    assert read_rows(connection) == [(0, 'a', None), (1, 'b', None), (2, 'a', None),
+                                     (3, 'c', None), (4, 'e', 1.5), (5, 'f', 2.5)]
+
+
+def test_bulk_update_keeps_committed_chunks(connection):
+
+    bulk_insert(connection, 'my data', ['id', 'na"me'], [(i, 'a') for i in range(4)])
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        bulk_update(connection, 'my data', ['na"me'], ['id'], [('b', 0), ('b', 1), ('b', )],
+                    chunk_size=2)
+
+    assert [n[1] for n in read_rows(connection)] == ['b', 'b', 'a', 'a']
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from gui_template import startup
+from gui_template.startup import StartupProfiler
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+
+    # setHeadless changes QT_QPA_PLATFORM
+    monkeypatch.setenv('QT_QPA_PLATFORM', os.environ.get('QT_QPA_PLATFORM', ''))
+
+    profiler = StartupProfiler()
+
+    yield profiler
+
+    if profiler.import_timer is not None:
+        profiler.import_timer.stop()
+
+
+@pytest.mark.parametrize('argv, environ, path, headless', [
+    ([], {}, None, False),
+    (['--profile-startup'], {}, startup.DEFAULT_PROFILE_PATH, False),
+    (['--profile-startup', 'out.json', '--headless'], {}, 'out.json', True),
+    (['--profile-startup', '--headless'], {startup.PROFILE_ENV: 'env.txt'}, 'env.txt', True),
+    ([], {startup.PROFILE_ENV: 'env.txt', startup.HEADLESS_ENV: '1'}, 'env.txt', True),
+    ([], {startup.HEADLESS_ENV: '0'}, None, False),
+])
+def test_configure(profiler, argv, environ, path, headless):
+
+    profiler.configure(argv, environ)
+
+    assert profiler.enabled == (path is not None)
+    assert profiler.path == path
+    assert profiler.headless == headless
+
+
+def test_spans_and_imports(profiler, tmp_path, monkeypatch):
+
+    (tmp_path / 'startup_test_outer.py').write_text('import startup_test_inner\n')
+    (tmp_path / 'startup_test_inner.py').write_text('import time\ntime.sleep(0.02)\n')
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    profiler.enable(str(tmp_path / 'startup.txt'))
+
+    with profiler.span('outer'):
+        with profiler.span('inner'):
+            import startup_test_outer  # noqa: F401
+
+    profiler.finish()
+
+    monkeypatch.delitem(sys.modules, 'startup_test_outer')
+    monkeypatch.delitem(sys.modules, 'startup_test_inner')
+
+    assert [(n[0], n[3]) for n in profiler.spans] == [('inner', 1), ('outer', 0)]
+
+    imports = {n[0]: n for n in profiler.imports}
+
+    # the time of the nested import is not included in the self time
+    assert imports['startup_test_inner'][3] >= 0.02
+    assert imports['startup_test_outer'][2] - imports['startup_test_outer'][1] >= 0.02
+    assert imports['startup_test_outer'][3] < 0.02
+
+    report = (tmp_path / 'startup.txt').read_text()
+
+    assert report.startswith('time to interactive:')
+    assert 'ms    inner' in report
+    assert 'startup_test_inner' in report
+
+    # the import hook is removed
+    assert profiler.import_timer not in sys.meta_path
+
+
+def test_trace(profiler, tmp_path):
+
+    path = str(tmp_path / 'startup.json')
+
+    profiler.enable(path)
+
+    with profiler.span('phase'):
+        pass
+
+    profiler.finish()
+
+    with open(path, encoding='utf-8') as f:
+        trace = json.load(f)
+
+    events = {n['name']: n for n in trace['traceEvents']}
+
+    assert events['phase']['ph'] == 'X'
+    assert events['interactive']['ph'] == 'i'
+    assert events['interactive']['ts'] >= events['phase']['ts'] + events['phase']['dur']
+
+
+def test_disabled_profiler_records_nothing(profiler):
+
+    with profiler.span('phase'):
+        pass
+
+    assert profiler.spans == []
+
+
+def test_profile_app_startup(tmp_path):
+
+    path = tmp_path / 'startup.json'
+
+    subprocess.run([sys.executable, 'app.py', '--headless', '--profile-startup', str(path)],
+                   cwd=ROOT, timeout=60, check=True, capture_output=True)
+
+    with open(path, encoding='utf-8') as f:
+        names = {n['name'] for n in json.load(f)['traceEvents']}
+
+    assert {'get_app', 'interactive', 'PyQt5.QtWidgets'} <= names
@@ -0,0 +1,145 @@
+import threading
+
+from PyQt5.QtCore import QCoreApplication
+
+from gui_template.tasks import Task, TaskManager
+
+
+def run_tasks(qapp, cancellable):
+
+    manager = TaskManager()
+    started = threading.Event()
+    results = []
+
+    def func(n, callback):
+
+        started.set()
+
+        for i in range(n):
+            callback(100 * i / n)
+            threading.Event().wait(0.001)
+
+        return n
+
+    task = Task(func, 200, cancellable=cancellable)
+    task.signals.result.connect(results.append)
+    task.signals.cancelled.connect(lambda: results.append('cancelled'))
+
+    manager.start(task)
+    started.wait(5)
+
+    manager.cancelAll()
+
+    assert manager.waitForDone(5000)
+
+    QCoreApplication.processEvents()
+
+    return results
+
+
+def test_cancel_all(qapp):
+    assert run_tasks(qapp, cancellable=True) == ['cancelled']
+
+
+def test_cancel_all_skips_tasks_that_are_not_cancellable(qapp):
+    assert run_tasks(qapp, cancellable=False) == [200]
+
+
+def test_kwargs_are_passed_to_func(qapp):
+
+    manager = TaskManager()
+    results = []
+
+    task = Task(lambda a, b=None, callback=None: (a, b), 1, b=2)
+    task.signals.result.connect(results.append)
+
+    manager.start(task)
+    manager.waitForDone()
+
+    QCoreApplication.processEvents()
+
+    assert task.cancellable
+    assert results == [(1, 2)]
+
+
+def run_task(task, manager=None) -> list:
+    """
+    runs task and returns the signals that were received (name, args)
+    """
+
+    manager = manager or TaskManager()
+    received = []
+
+    for name in ('progress', 'result', 'error', 'cancelled', 'finished'):
+        getattr(task.signals, name).connect(lambda *args, name=name: received.append((name, args)))
+
+    manager.start(task)
+
+    assert manager.waitForDone(5000)
+
+    QCoreApplication.processEvents()
+
+    return received
+
+
+def test_result_in_worker_thread(qapp):
+
+    def func(callback):
+        callback(50)
+        return threading.get_ident()
+
+    received = run_task(Task(func))
+
+    assert [n[0] for n in received] == ['progress', 'result', 'finished']
+    assert received[0][1] == (50.0, )
+    assert received[1][1][0] != threading.get_ident()
+
+
+def test_error(qapp):
+
+    def func(callback):
+        raise ValueError('failed')
+
+    received = run_task(Task(func))
+
+    assert [n[0] for n in received] == ['error', 'finished']
+
+    error, trace = received[0][1]
+
+    assert isinstance(error, ValueError)
+    assert 'ValueError: failed' in trace
+
+
+def test_finished_tasks_are_released(qapp):
+
+    manager = TaskManager()
+
+    run_task(Task(lambda callback: None), manager)
+
+    assert not manager.tasks
+
+
+def test_max_tasks(qapp):
+
+    manager = TaskManager(max_tasks=2)
+
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def func(callback):
+
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+
+        threading.Event().wait(0.02)
+
+        with lock:
+            running[0] -= 1
+
+    for _ in range(6):
+        manager.start(Task(func))
+
+    assert manager.waitForDone(5000)
+
+    assert running[1] == 2
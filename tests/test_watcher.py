@@ -0,0 +1,170 @@
+import os
+
+import pytest
+
+from PyQt5.QtCore import QEventLoop, QTimer
+
+from gui_template import watcher
+from gui_template.io import has_changed
+from gui_template.cache import get_file_signature
+from gui_template.watcher import FileWatcher
+
+
+@pytest.fixture(params=['inotify', 'polling'])
+def watch(request, qapp, monkeypatch):
+    """
+    returns a function that watches a path, and a list with
+    the lists of paths from the changed signals
+    """
+
+    monkeypatch.setattr(watcher, 'COALESCE_INTERVAL', 20)
+
+    file_watcher = FileWatcher(interval=0.02)
+
+    if request.param == 'inotify' and file_watcher.inotify is None:
+        pytest.skip('inotify is not available')
+
+    received = []
+    file_watcher.changed.connect(received.append)
+
+    def watch(path):
+        file_watcher.watch(path, polling=request.param == 'polling')
+
+    yield file_watcher, watch, received
+
+    file_watcher.close()
+
+
+def wait(received, timeout=2000) -> list:
+    """
+    runs the event loop until a changed signal is received (or timeout ms)
+    and for a bit longer to see whether there are more
+    """
+
+    loop = QEventLoop()
+    timer = QTimer()
+    timer.timeout.connect(lambda: loop.quit() if received else None)
+    timer.start(10)
+
+    QTimer.singleShot(timeout, loop.quit)
+    loop.exec_()
+
+    # changes that would be sent separately
+    loop = QEventLoop()
+    QTimer.singleShot(150, loop.quit)
+    loop.exec_()
+
+    return received
+
+
+def replace(path, content):
+
+    with open(f'{path}.tmp', 'w') as f:
+        f.write(content)
+
+    os.replace(f'{path}.tmp', path)
+
+
+def test_changes_are_sent_once(tmp_path, watch):
+
+    file_watcher, watch, received = watch
+
+    path = tmp_path / 'settings.txt'
+    path.write_text('a')
+
+    watch(path)
+
+    # other files in the folder are not reported
+    (tmp_path / 'other.txt').write_text('x')
+
+    with open(path, 'a') as f:
+        f.write('b')
+
+    replace(path, 'abc')
+
+    assert wait(received) == [[str(path)]]
+
+
+def test_created_and_removed(tmp_path, watch):
+
+    file_watcher, watch, received = watch
+
+    path = tmp_path / 'data.db'
+
+    watch(path)
+
+    path.write_text('a')
+
+    assert wait(received) == [[str(path)]]
+
+    received.clear()
+    os.remove(path)
+
+    assert wait(received) == [[str(path)]]
+
+
+def test_not_changed(tmp_path, watch):
+
+    file_watcher, watch, received = watch
+
+    path = tmp_path / 'data.db'
+    path.write_text('a')
+
+    watch(path)
+
+    # opened for writing, nothing is written
+    open(path, 'a').close()
+
+    assert wait(received, timeout=300) == []
+
+
+def test_suspend(tmp_path, watch):
+
+    file_watcher, watch, received = watch
+
+    path = tmp_path / 'data.db'
+    path.write_text('a')
+
+    watch(path)
+
+    file_watcher.suspend(path)
+    replace(path, 'saved')
+
+    assert wait(received, timeout=300) == []
+
+    file_watcher.resume(path)
+
+    assert wait(received, timeout=300) == []
+
+    replace(path, 'changed by another program')
+
+    assert wait(received) == [[str(path)]]
+
+
+def test_unwatch(tmp_path, watch):
+
+    file_watcher, watch, received = watch
+
+    path = tmp_path / 'data.db'
+    path.write_text('a')
+
+    watch(path)
+    file_watcher.unwatch(path)
+
+    replace(path, 'abc')
+
+    assert wait(received, timeout=300) == []
+
+
+def test_has_changed(tmp_path):
+
+    path = tmp_path / 'data.db'
+    path.write_text('a')
+
+    signature = get_file_signature(path)
+
+    assert not has_changed(path, signature)
+
+    path.write_text('ab')
+
+    assert has_changed(path, signature)